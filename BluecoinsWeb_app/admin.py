@@ -1,3 +1,10 @@
 from django.contrib import admin
 
+from .models import UserBackup
+
+
 # Register your models here.
+@admin.register(UserBackup)
+class UserBackupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'directory', 'updated_at')
+    search_fields = ('user__username', 'directory')
@@ -0,0 +1,264 @@
+# bluecoins_app/analytics.py
+"""
+Columnar in-memory copy of the transactions, for analytics.
+
+The transactions of the active backup are loaded once per backup (and per
+process) into compact typed arrays, one per column, sorted by date: about
+55 bytes per transaction instead of a model instance with 35 fields. Group-by
+month and category, label filters and running balances are then computed over
+those arrays: with NumPy when it is installed, with plain loops over the
+`array` columns otherwise.
+
+Days and months are those of the dates as stored, read as UTC, like the
+monthly rollups (see rollups.py). The ORM filters (reports.filter_transactions)
+make the day boundaries aware in the current time zone instead: with a
+TIME_ZONE other than 'UTC', the columnar reports are not shifted by its offset.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import accumulate
+
+from django.conf import settings
+
+from .backups import bluecoins_connection
+from .caching import backup_fingerprint
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional
+    numpy = None
+
+# Code of a NULL category, account or type, and month of an undated transaction
+NULL_CODE = -1
+
+LOAD_SQL = """
+    SELECT transactionsTableID,
+           CAST(strftime('%s', date) AS INTEGER),
+           CAST(substr(date, 1, 4) AS INTEGER) * 12 + CAST(substr(date, 6, 2) AS INTEGER) - 1,
+           COALESCE(amount, 0),
+           COALESCE(categoryID, -1),
+           COALESCE(accountID, -1),
+           COALESCE(transactionTypeID, -1),
+           transferGroupID IS NOT NULL
+    FROM TRANSACTIONSTABLE
+    ORDER BY 2 IS NULL, 2, 1
+"""
+
+LABELS_SQL = """
+    SELECT labelName, transactionIDLabels FROM LABELSTABLE
+    WHERE labelName IS NOT NULL AND labelName != ''
+"""
+
+
+def _epoch(day):
+    return int(datetime.combine(day, time.min, tzinfo=timezone.utc).timestamp())
+
+
+def month_key(month):
+    """
+    'YYYY-MM' of a month code (year * 12 + month - 1).
+    """
+    return f'{month // 12:04d}-{month % 12 + 1:02d}'
+
+
+class ColumnStore:
+    """
+    The transactions of one backup as parallel arrays, sorted by date (undated ones last).
+
+    select() returns an opaque selection of rows (a NumPy boolean mask, or a list
+    of row numbers without NumPy) that the group-by methods take.
+    """
+
+    def __init__(self, fingerprint, use_numpy=True):
+        self.fingerprint = fingerprint
+        self.use_numpy = use_numpy and numpy is not None
+        self.ids = array('q')
+        self.dates = array('q')  # Seconds since the epoch, UTC
+        self.months = array('i')
+        self.amounts = array('q')  # Micro-units
+        # IDs are SQLite integers (64-bit)
+        self.categories = array('q')
+        self.accounts = array('q')
+        self.types = array('q')
+        self.transfers = array('b')
+        self.dated = 0  # Number of rows with a date: they come first
+        self.label_rows = {}  # Label name -> row numbers, in date order
+
+    @classmethod
+    def load(cls, fingerprint, use_numpy=True):
+        store = cls(fingerprint, use_numpy)
+        columns = (store.ids, store.dates, store.months, store.amounts,
+                   store.categories, store.accounts, store.types, store.transfers)
+        with bluecoins_connection().cursor() as cursor:
+            cursor.execute(LOAD_SQL)
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                for row in rows:
+                    if row[1] is None:
+                        # Undated (or unparseable date): sorted last
+                        row = (row[0], 0, NULL_CODE, *row[3:])
+                    else:
+                        store.dated += 1
+                    for column, value in zip(columns, row):
+                        column.append(value)
+
+            row_of = {tx_id: n for n, tx_id in enumerate(store.ids)}
+            label_rows = {}
+            cursor.execute(LABELS_SQL)
+            for name, tx_id in cursor.fetchall():
+                row = row_of.get(tx_id)
+                if row is not None:
+                    label_rows.setdefault(name, set()).add(row)
+        store.label_rows = {name: array('q', sorted(rows)) for name, rows in label_rows.items()}
+
+        if store.use_numpy:
+            # Zero-copy views of the same buffers
+            for name, dtype in (('ids', numpy.int64), ('dates', numpy.int64), ('months', numpy.int32),
+                                ('amounts', numpy.int64), ('categories', numpy.int64),
+                                ('accounts', numpy.int64), ('types', numpy.int64), ('transfers', numpy.int8)):
+                setattr(store, name, numpy.frombuffer(getattr(store, name), dtype=dtype))
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """
+        Approximate memory used by the columns and the label index.
+        """
+        columns = (self.ids, self.dates, self.months, self.amounts,
+                   self.categories, self.accounts, self.types, self.transfers)
+        return (sum(len(column) * column.itemsize for column in columns)
+                + sum(len(rows) * rows.itemsize for rows in self.label_rows.values()))
+
+    def _date_bounds(self, start=None, end=None):
+        """
+        Row range [first, last) of the transactions dated from `start` to `end` (inclusive).
+        """
+        if start is None and end is None:
+            return 0, len(self)
+        first = bisect_left(self.dates, _epoch(start), 0, self.dated) if start else 0
+        # date.max has no next day: every dated row is before its end
+        last = (bisect_left(self.dates, _epoch(end + timedelta(days=1)), 0, self.dated) if end and end < date.max
+                else self.dated)
+        return first, max(first, last)
+
+    def select(self, start=None, end=None, account=None, label=None, exclude_transfers=True):
+        """
+        Rows dated from `start` to `end` (inclusive; undated rows only when both are
+        None), optionally of one account and with one label, transfers excluded by default.
+        """
+        first, last = self._date_bounds(start, end)
+        if self.use_numpy:
+            mask = numpy.zeros(len(self), dtype=bool)
+            if label is None:
+                mask[first:last] = True
+            elif label in self.label_rows:
+                rows = numpy.asarray(self.label_rows[label])
+                mask[rows[(rows >= first) & (rows < last)]] = True
+            if exclude_transfers:
+                mask &= self.transfers == 0
+            if account is not None:
+                mask &= self.accounts == account
+            return mask
+
+        if label is None:
+            rows = range(first, last)
+        else:
+            label_rows = self.label_rows.get(label, ())
+            rows = label_rows[bisect_left(label_rows, first):bisect_left(label_rows, last)]
+        transfers, accounts = self.transfers, self.accounts
+        return [row for row in rows
+                if not (exclude_transfers and transfers[row])
+                and (account is None or accounts[row] == account)]
+
+    def _group(self, keys, selection):
+        """
+        {key: (income, expense, count)} of the selected rows, grouped by the `keys` column.
+        """
+        if self.use_numpy:
+            amounts = self.amounts[selection]
+            codes, inverse = numpy.unique(keys[selection], return_inverse=True)
+            income = numpy.zeros(len(codes), dtype=numpy.int64)
+            expense = numpy.zeros(len(codes), dtype=numpy.int64)
+            numpy.add.at(income, inverse, numpy.where(amounts > 0, amounts, 0))
+            numpy.add.at(expense, inverse, numpy.where(amounts < 0, amounts, 0))
+            counts = numpy.bincount(inverse, minlength=len(codes))
+            return {int(code): (int(income[n]), int(expense[n]), int(counts[n]))
+                    for n, code in enumerate(codes)}
+
+        groups = {}
+        amounts = self.amounts
+        for row in selection:
+            group = groups.get(keys[row])
+            if group is None:
+                group = groups[keys[row]] = [0, 0, 0]
+            amount = amounts[row]
+            if amount > 0:
+                group[0] += amount
+            else:
+                group[1] += amount
+            group[2] += 1
+        return {key: tuple(group) for key, group in groups.items()}
+
+    def group_by_month(self, selection):
+        """
+        {'YYYY-MM': (income, expense, count)}; undated rows are left out.
+        """
+        return {month_key(month): totals for month, totals in self._group(self.months, selection).items()
+                if month != NULL_CODE}
+
+    def group_by_category(self, selection):
+        """
+        {category_id: (income, expense, count)}, None for transactions without category.
+        """
+        return {(None if code == NULL_CODE else code): totals
+                for code, totals in self._group(self.categories, selection).items()}
+
+    def running_balance(self, selection):
+        """
+        (transaction IDs, balances): the cumulative sum of the selected amounts, in date order.
+        """
+        if self.use_numpy:
+            return self.ids[selection].tolist(), numpy.cumsum(self.amounts[selection]).tolist()
+        return [self.ids[row] for row in selection], list(accumulate(self.amounts[row] for row in selection))
+
+
+# Fingerprint -> ColumnStore, least recently used first
+_stores = OrderedDict()
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    ColumnStore of the active backup, loaded on first use and again when the backup changes.
+    Only the last one is kept, or BLUECOINS_MAX_OPEN_BACKUPS with multi-tenant backups.
+    """
+    fingerprint = backup_fingerprint()
+    store = _stores.get(fingerprint)
+    if store is None:
+        with _store_lock:
+            store = _stores.get(fingerprint)
+            if store is None:
+                store = _stores[fingerprint] = ColumnStore.load(fingerprint)
+                keep = settings.BLUECOINS_MAX_OPEN_BACKUPS if settings.BLUECOINS_TENANTS else 1
+                while len(_stores) > keep:
+                    _stores.popitem(last=False)
+    with _store_lock:
+        if fingerprint in _stores:
+            _stores.move_to_end(fingerprint)
+    return store
+
+
+def clear_store():
+    """
+    Drops the loaded stores, so the next get_store() reloads them.
+    """
+    with _store_lock:
+        _stores.clear()
@@ -0,0 +1,272 @@
+# bluecoins_app/api.py
+"""
+Read-only JSON API, version 1 (/api/v1/).
+
+Every response is plain data: amounts are integers in micro-units, as stored
+in the `amount` column, and dates ISO 8601 in UTC. Lists of transactions use
+the same cursor (keyset) pagination and filters as the transaction list
+(see filters.py), and `?fields=a,b` returns only the given fields; for the
+transactions only their columns are read.
+
+`?format=ndjson` (or `Accept: application/x-ndjson`) streams every matching
+transaction as one JSON object per line, read in batches of NDJSON_BATCH_SIZE
+rows by keyset, so the memory used does not grow with the backup.
+
+The ETag of a response is built from the backup fingerprint and the request
+(see caching.request_validators), so a client that sends it back in
+If-None-Match gets a 304 before any query runs.
+"""
+
+from collections import defaultdict
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.timezone import localdate
+from django.views.decorators.http import require_GET
+
+from .balances import balance_timeline
+from .caching import cached, request_validators
+from .filters import TransactionFilter
+from .labels import label_catalog
+from .models import Child_category_table, Labels_table, Transactions_table
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, rows_after
+from .reports import category_report, monthly_report, parse_report_filters
+
+# Transactions per page: ?limit= up to API_MAX_PAGE_SIZE
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+# Transactions read per query by the NDJSON stream
+NDJSON_BATCH_SIZE = 500
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# API field -> lookup of Transactions_table. 'labels' come from LABELSTABLE, one query per page.
+TRANSACTION_FIELDS = {
+    'id': 'transactions_table_id',
+    'date': 'date',
+    'amount': 'amount',
+    'currency': 'transaction_currency',
+    'conversion_rate': 'conversion_rate_new',
+    'notes': 'notes',
+    'item': 'item_id__item_name',
+    'category_id': 'category_id',
+    'category': 'category_id__child_category_name',
+    'parent_category_id': 'category_id__parent_category_id',
+    'account_id': 'account_id',
+    'account': 'account_id__account_name',
+    'type_id': 'transaction_type_id',
+    'type': 'transaction_type_id__transaction_type_name',
+    'transfer_group_id': 'transfer_group_id',
+    'labels': None,
+}
+
+_JSON_SEPARATORS = (',', ':')
+
+
+class BadRequest(ValueError):
+    """An invalid parameter, returned as a 400 with its message."""
+
+
+def api_view(view):
+    """
+    GET-only API endpoint: answers 304 when If-None-Match has the current ETag
+    (also with ConditionalGetMiddleware disabled), adds the ETag to successful
+    responses and turns BadRequest into a 400.
+    """
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag, _ = request_validators(request)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                response = view(request, *args, **kwargs)
+            except (BadRequest, InvalidCursor) as e:
+                return json_response({'error': str(e)}, status=400)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        return response
+    return wrapper
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'separators': _JSON_SEPARATORS})
+
+
+def requested_fields(request, available):
+    """
+    Fields of `?fields=a,b` in the order of `available`, or all of them. Raises BadRequest for unknown ones.
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields.difference(available)
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in available if field in fields]
+
+
+def only_fields(rows, fields):
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def page_size(request):
+    value = request.GET.get('limit')
+    if not value:
+        return API_PAGE_SIZE
+    if not value.isdigit() or not 1 <= int(value) <= API_MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    return int(value)
+
+
+def wants_ndjson(request):
+    return request.GET.get('format') == 'ndjson' or NDJSON_CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def transaction_rows(queryset, fields, cursor=None, limit=1, filters=None):
+    """
+    The first `limit` transactions of `queryset` after `cursor`, newest first,
+    with `filters` applied (see pagination.rows_after), as dicts with `fields`
+    (plus 'id' and 'date', needed by the cursor): one query, and one more for
+    their labels if requested.
+    """
+    names = [field for field in TRANSACTION_FIELDS if field in {'id', 'date', *fields} - {'labels'}]
+    queryset = queryset.values_list(*(TRANSACTION_FIELDS[field] for field in names))
+    rows = [dict(zip(names, values))
+            for values in rows_after(queryset, cursor, limit, pk_field='transactions_table_id', filters=filters)]
+    if 'labels' in fields and rows:
+        labels = defaultdict(list)
+        for tx_id, name in (Labels_table.objects
+                            .filter(transaction_id_labels__in=[row['id'] for row in rows])
+                            .order_by('label_name').values_list('transaction_id_labels', 'label_name')):
+            labels[tx_id].append(name)
+        for row in rows:
+            row['labels'] = labels.get(row['id'], [])
+    return rows
+
+
+def stream_transactions(queryset, fields, cursor, filters=None):
+    """
+    NDJSON lines of every transaction of `queryset` after `cursor`, newest first, with `filters` applied.
+    """
+    encoder = DjangoJSONEncoder(separators=_JSON_SEPARATORS)
+    while True:
+        rows = transaction_rows(queryset, fields, cursor, NDJSON_BATCH_SIZE, filters)
+        if rows:
+            yield ''.join(encoder.encode({field: row[field] for field in fields}) + '\n' for row in rows)
+        if len(rows) < NDJSON_BATCH_SIZE:
+            return
+        cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+
+
+@api_view
+def transactions(request):
+    """
+    Transactions matching the filters of filters.py, newest first.
+    GET: the filters, cursor, limit, fields and format=ndjson.
+        {'transactions': [...], 'next_cursor'}
+    """
+    fields = requested_fields(request, TRANSACTION_FIELDS)
+    filters = TransactionFilter.from_query(request.GET).apply
+    queryset = Transactions_table.objects.all()
+    cursor = request.GET.get('cursor')
+    if wants_ndjson(request):
+        if cursor:
+            decode_cursor(cursor)  # Invalid cursors fail here, not in the middle of the stream
+        return StreamingHttpResponse(stream_transactions(queryset, fields, cursor, filters),
+                                     content_type=NDJSON_CONTENT_TYPE)
+
+    limit = page_size(request)
+    rows = transaction_rows(queryset, fields, cursor, limit + 1, filters)
+    next_cursor = encode_cursor(rows[limit - 1]['date'], rows[limit - 1]['id']) if len(rows) > limit else None
+    return json_response({'transactions': only_fields(rows[:limit], fields), 'next_cursor': next_cursor})
+
+
+@api_view
+def transaction(request, pk):
+    fields = requested_fields(request, TRANSACTION_FIELDS)
+    rows = transaction_rows(Transactions_table.objects.filter(pk=pk), fields)
+    if not rows:
+        return json_response({'error': f"Transaction {pk} not found"}, status=404)
+    return json_response(only_fields(rows, fields)[0])
+
+
+@api_view
+def accounts(request):
+    """
+    Every account with its balance today, in its currency and in the default one.
+    """
+    rows = balance_timeline().account_balances(localdate())
+    return json_response({'accounts': only_fields(rows, requested_fields(
+        request, ('id', 'name', 'currency', 'balance', 'default_currency_balance')))})
+
+
+@api_view
+def categories(request):
+    """
+    Child categories with their parent category and group.
+    """
+    rows = [
+        {'id': row[0], 'name': row[1], 'parent_id': row[2], 'parent': row[3], 'group_id': row[4], 'group': row[5]}
+        for row in Child_category_table.objects.order_by('category_table_id').values_list(
+            'category_table_id', 'child_category_name',
+            'parent_category_id', 'parent_category_id__parent_category_name',
+            'parent_category_id__category_group_id', 'parent_category_id__category_group_id__category_group_name')
+    ]
+    fields = requested_fields(request, ('id', 'name', 'parent_id', 'parent', 'group_id', 'group'))
+    return json_response({'categories': only_fields(rows, fields)})
+
+
+@api_view
+def labels(request):
+    """
+    The label catalog: transactions and date span of every label.
+    """
+    rows = [{'name': label['name'], 'count': label['count'],
+             'first_date': label['first_date'], 'last_date': label['last_date']}
+            for label in label_catalog()]
+    fields = requested_fields(request, ('name', 'count', 'first_date', 'last_date'))
+    return json_response({'labels': only_fields(rows, fields)})
+
+
+@api_view
+def monthly_totals(request):
+    """
+    Income, expense, net and count per month. GET filters of the reports.
+    """
+    start, end, account, label = parse_report_filters(request)
+    report = cached('monthly_report', (start, end, account, label),
+                    lambda: monthly_report(start=start, end=end, account=account, label=label))
+    rows = [{'month': month['month'].strftime('%Y-%m'), 'income': month['income'], 'expense': month['expense'],
+             'net': month['net'], 'count': month['count']} for month in report]
+    fields = requested_fields(request, ('month', 'income', 'expense', 'net', 'count'))
+    return json_response({'months': only_fields(rows, fields)})
+
+
+def _category_node(node, children):
+    return {'id': node['id'], 'name': node['name'], 'total': node['total_amount'], 'count': node['count'],
+            **({children: []} if children else {})}
+
+
+@api_view
+def category_totals(request):
+    """
+    Totals by group, parent and child category. GET filters of the reports.
+    """
+    start, end, account, label = parse_report_filters(request)
+    report = cached('category_report', (start, end, account, label),
+                    lambda: category_report(start=start, end=end, account=account, label=label))
+    groups = []
+    for group in report:
+        groups.append(_category_node(group, 'parents'))
+        for parent in group['parents']:
+            groups[-1]['parents'].append(_category_node(parent, 'categories'))
+            groups[-1]['parents'][-1]['categories'].extend(_category_node(child, None) for child in parent['children'])
+    return json_response({'groups': groups})
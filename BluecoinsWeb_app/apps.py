@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class BluecoinsAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "BluecoinsWeb_app"
+
+    def ready(self):
+        from . import labels, rollups, search, sidecar
+
+        # Every sidecar gets the monthly rollups, the search index and the label catalog of its backup
+        for step in (rollups.build_rollup_table, search.build_search_index, labels.build_label_catalog_table):
+            if step not in sidecar.build_steps:
+                sidecar.build_steps.append(step)
+        for step in (rollups.update_rollup_table, search.update_search_index, labels.update_label_catalog_table):
+            if step not in sidecar.update_steps:
+                sidecar.update_steps.append(step)
@@ -0,0 +1,259 @@
+# bluecoins_app/backups.py
+
+import glob
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent when the watcher repoints the Bluecoins database to another backup.
+# Arguments: old_path, new_path, generation
+backup_changed = Signal()
+
+BLUECOINS_ALIAS = 'bluecoins'
+
+# Watcher of the backup served to the current request or thread, when it is not
+# the main one (see serving() and tenants.py)
+_serving = ContextVar('bluecoins_watcher', default=None)
+
+
+def _file_signature(path):
+    """
+    (inode, mtime, size) of a file, or None if it does not exist. A backup copied
+    over the same name changes its inode or mtime, so it is detected as a new one.
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def backup_fingerprint(path, source=None):
+    """
+    Short fingerprint of a Bluecoins backup: its path, mtime and size. A new or
+    replaced backup gets a new fingerprint. `source` is the file to stat when
+    it is not at `path` yet (an upload before it is renamed, see ingest.py).
+    """
+    path = str(path)
+    try:
+        st = os.stat(source or path)
+        raw = f'{path}|{st.st_mtime_ns}|{st.st_size}'
+    except OSError:
+        # In-memory test databases have no file
+        raw = path
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def find_latest_backup(directory, pattern):
+    """
+    Returns the most recently modified file matching `pattern` in `directory`, or None.
+    """
+    matching_files = glob.glob(os.path.join(directory, pattern))
+    if not matching_files:
+        return None
+    return max(matching_files, key=os.path.getmtime)
+
+
+def find_previous_backup(path, directory, pattern):
+    """
+    Returns the most recently modified file matching `pattern` in `directory`
+    that is older than `path`, or None.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    older = [(os.path.getmtime(other), other) for other in glob.glob(os.path.join(directory, pattern))
+             if os.path.getmtime(other) < mtime]
+    return max(older)[1] if older else None
+
+
+class BackupWatcher:
+    """
+    Detects new Bluecoins backups at runtime and repoints the `bluecoins`
+    connection to the newest one, without restarting the workers.
+
+    check() is rate-limited: at most once per `interval` seconds it stats the
+    backups directory and the active file (two stat() calls). The directory is
+    only globbed when one of them changed, so requests never cause a glob+stat storm.
+
+    With `use_sidecar`, the connection reads the indexed sidecar copy of the
+    backup (see sidecar.py) as soon as it has been built.
+
+    `alias` is the database alias it repoints: `bluecoins`, or the alias of a
+    user's backups (see tenants.py).
+    """
+
+    def __init__(self, path, directory, pattern, interval, enabled=True, use_sidecar=False, alias=BLUECOINS_ALIAS):
+        self.alias = alias
+        self.enabled = enabled
+        self.use_sidecar = use_sidecar
+        self.directory = str(directory)
+        self.pattern = pattern
+        self.interval = interval
+        self.path = str(path)
+        # File the connection actually opens: the backup or its sidecar
+        self.database_path = self.path
+        # Bumped on every switch; each thread's connection compares it with its own
+        self.generation = 0
+        self._signature = _file_signature(self.path)
+        self._dir_signature = _file_signature(self.directory)
+        self._next_check = time.monotonic() + interval
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            path=connections[BLUECOINS_ALIAS].settings_dict['NAME'],
+            directory=settings.BLUECOINS_DB_DIR,
+            pattern=settings.BLUECOINS_DB_PATTERN,
+            interval=settings.BLUECOINS_DB_CHECK_INTERVAL,
+            # The test runner's in-memory database must never be swapped for a real backup
+            enabled=not connections[BLUECOINS_ALIAS].is_in_memory_db(),
+            use_sidecar=settings.BLUECOINS_SIDECAR,
+        )
+
+    def check(self, force=False):
+        """
+        Switches to a newer backup if there is one. Returns the active path.
+        `force` skips the rate limit and always looks for the newest backup.
+        """
+        if not self.enabled or (not force and time.monotonic() < self._next_check):
+            return self.path
+        # Another thread is already checking: keep serving the current backup
+        if not self._lock.acquire(blocking=force):
+            return self.path
+        try:
+            self._next_check = time.monotonic() + self.interval
+            dir_signature = _file_signature(self.directory)
+            signature = _file_signature(self.path)
+            if force or dir_signature != self._dir_signature or signature != self._signature:
+                self._dir_signature = dir_signature
+                latest = find_latest_backup(self.directory, self.pattern)
+                if latest is None:
+                    # Keep the current file rather than pointing at nothing
+                    logger.warning("No Bluecoins backup found in %s, keeping %s", self.directory, self.path)
+                    self._signature = signature
+                elif latest != self.path or signature != self._signature:
+                    self._switch(latest)
+
+            if self.use_sidecar and self.database_path == self.path:
+                self._attach_sidecar()
+            return self.path
+        finally:
+            self._lock.release()
+
+    def _attach_sidecar(self):
+        """
+        Reads from the sidecar if it exists (maybe built by another worker),
+        otherwise starts building it in the background.
+        """
+        from . import sidecar
+
+        sidecar_path = sidecar.find_sidecar(self.path)
+        if sidecar_path is None:
+            sidecar.build_in_background(self.path)
+            return
+        self.database_path = sidecar_path
+        self.generation += 1
+        logger.info("Bluecoins database %s now read from sidecar %s (generation %d, pid %d)",
+                    self.path, sidecar_path, self.generation, os.getpid())
+
+    def _switch(self, new_path):
+        old_path = self.path
+        self.path = new_path
+        self.database_path = new_path
+        self._signature = _file_signature(new_path)
+        self.generation += 1
+        logger.info("Bluecoins backup switched: %s -> %s (generation %d, pid %d)",
+                    old_path, new_path, self.generation, os.getpid())
+        backup_changed.send(sender=self.__class__, old_path=old_path, new_path=new_path,
+                            generation=self.generation)
+
+    def pin(self, path, database_path=None):
+        """
+        Serves `path` (read from `database_path`, e.g. its sidecar) from now on
+        and stops looking for newer backups. Used by the benchmarks.
+        """
+        self.enabled = False
+        self._switch(str(path))
+        self.database_path = str(database_path or path)
+
+    def activate(self):
+        """
+        Makes the current thread's connection to `alias` use the active backup.
+        A connection opened on a previous backup is closed, and the next query
+        reconnects. Requests already running in other threads keep their own
+        connection until they finish.
+        """
+        connection = connections[self.alias]
+        if getattr(connection, 'backup_generation', 0) != self.generation:
+            connection.close()
+            connection.settings_dict['NAME'] = self.database_path
+            connection.backup_generation = self.generation
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher():
+    """
+    BackupWatcher of the backup being served: the one set by serving(), or
+    the per-process watcher of the `bluecoins` alias.
+    """
+    global _watcher
+    watcher = _serving.get()
+    if watcher is not None:
+        return watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = BackupWatcher.from_settings()
+    return _watcher
+
+
+def active_alias():
+    """
+    Database alias of the backup being served. The router sends the Bluecoins models to it.
+    """
+    watcher = _serving.get()
+    return BLUECOINS_ALIAS if watcher is None else watcher.alias
+
+
+def bluecoins_connection():
+    """
+    Connection to the backup being served, for raw SQL.
+    """
+    return connections[active_alias()]
+
+
+@contextmanager
+def serving(watcher):
+    """
+    Serves the backup of `watcher` (and its alias) in the current context, e.g.
+    a request of one user or an export thread, instead of the main backup.
+    """
+    token = _serving.set(watcher)
+    try:
+        watcher.activate()
+        yield watcher
+    finally:
+        _serving.reset(token)
+
+
+def get_active_backup_path():
+    """
+    Path of the Bluecoins backup being served (the current user's, in multi-tenant mode).
+    """
+    return get_watcher().path
@@ -0,0 +1,205 @@
+# bluecoins_app/balances.py
+"""
+Running balances of every account and the net worth over time.
+
+One ordered pass over the transactions, grouped by day and account, builds a
+checkpoint per day with activity: the balance of every account at the end of
+that day. The checkpoints are cached once per backup, so the balances at any
+date are one bisection away, and at any moment one checkpoint plus a delta
+query over the rows of that same day.
+
+Amounts are converted to the default currency with the transaction's
+conversionRateNew (units of the default currency per unit of the transaction
+currency), and back to each account's currency with its accountConversionRateNew.
+A missing or zero rate counts as 1.
+"""
+
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+
+from .backups import bluecoins_connection
+from .caching import cached
+
+# Net worth points returned by one series
+MAX_SERIES_POINTS = 5000
+
+SERIES_INTERVALS = ('day', 'week', 'month')
+
+# Undated transactions sort first (NULL day) and count as opening balances
+DAILY_TOTALS_SQL = """
+    SELECT substr(date, 1, 10) AS day, accountID,
+           CAST(ROUND(SUM(amount * COALESCE(NULLIF(conversionRateNew, 0), 1))) AS INTEGER)
+    FROM TRANSACTIONSTABLE
+    WHERE accountID IS NOT NULL {conditions}
+    GROUP BY 1, 2
+    ORDER BY 1
+"""
+
+ACCOUNTS_SQL = """
+    SELECT accountsTableID, accountName, accountCurrency,
+           COALESCE(NULLIF(accountConversionRateNew, 0), 1)
+    FROM ACCOUNTSTABLE
+    ORDER BY accountsTableID
+"""
+
+
+class BalanceTimeline:
+    """
+    Daily balance checkpoints of every account, in micro-units of the default currency.
+
+    `days` are the 'YYYY-MM-DD' days with transactions, in order, and
+    `checkpoints[n]` the balances (one per account of `account_ids`) at the end of `days[n]`.
+    """
+
+    def __init__(self, accounts, days, checkpoints, opening):
+        self.accounts = accounts  # {account_id: (name, currency, conversion_rate)}
+        self.account_ids = tuple(accounts)
+        self.days = days
+        self.checkpoints = checkpoints
+        self.opening = opening
+        self.net_worth = [sum(balances) for balances in checkpoints]
+
+    @classmethod
+    def load(cls):
+        with bluecoins_connection().cursor() as cursor:
+            cursor.execute(ACCOUNTS_SQL)
+            accounts = {account_id: (name, currency, rate) for account_id, name, currency, rate in cursor.fetchall()}
+            cursor.execute(DAILY_TOTALS_SQL.format(conditions=''))
+            rows = cursor.fetchall()
+
+        # Accounts only referenced by transactions
+        for _, account_id, _ in rows:
+            if account_id not in accounts:
+                accounts[account_id] = (None, None, 1)
+        column = {account_id: n for n, account_id in enumerate(accounts)}
+
+        running = [0] * len(accounts)
+        opening = None
+        days, checkpoints = [], []
+        for day, account_id, amount in rows:
+            if day is None:
+                running[column[account_id]] += amount
+                continue
+            if opening is None:
+                opening = tuple(running)
+            running[column[account_id]] += amount
+            if days and days[-1] == day:
+                checkpoints[-1] = tuple(running)
+            else:
+                days.append(day)
+                checkpoints.append(tuple(running))
+        return cls(accounts, days, checkpoints, opening if opening is not None else tuple(running))
+
+    def _checkpoint_before(self, day):
+        """
+        Balances at the end of the last day with transactions before `day` ('YYYY-MM-DD').
+        """
+        n = bisect_left(self.days, day)
+        return self.checkpoints[n - 1] if n else self.opening
+
+    def _checkpoint_at(self, day):
+        """
+        Balances at the end of `day` ('YYYY-MM-DD').
+        """
+        n = bisect_right(self.days, day)
+        return self.checkpoints[n - 1] if n else self.opening
+
+    def balances_at(self, when):
+        """
+        {account_id: balance in the default currency} at the end of date `when`,
+        or at the aware datetime `when` (one query for the rows of its day).
+        """
+        if not isinstance(when, datetime):
+            return dict(zip(self.account_ids, self._checkpoint_at(when.isoformat())))
+
+        moment = when.astimezone(timezone.utc)
+        day = moment.date().isoformat()
+        balances = dict(zip(self.account_ids, self._checkpoint_before(day)))
+        with bluecoins_connection().cursor() as cursor:
+            cursor.execute(DAILY_TOTALS_SQL.format(conditions='AND date >= %s AND date <= %s'),
+                           [f'{day} 00:00:00', moment.strftime('%Y-%m-%d %H:%M:%S.%f')])
+            for _, account_id, amount in cursor.fetchall():
+                balances[account_id] = balances.get(account_id, 0) + amount
+        return balances
+
+    def account_balances(self, when):
+        """
+        Balances of every account at `when` (see balances_at), in its own currency
+        and in the default one:
+            [{'id', 'name', 'currency', 'balance', 'default_currency_balance'}]
+        """
+        accounts = []
+        for account_id, balance in self.balances_at(when).items():
+            name, currency, rate = self.accounts.get(account_id, (None, None, 1))
+            accounts.append({'id': account_id, 'name': name, 'currency': currency,
+                             'balance': round(balance / rate), 'default_currency_balance': balance})
+        return accounts
+
+    def net_worth_at(self, day):
+        """
+        Sum of the balances of every account at the end of `day` (a date).
+        """
+        n = bisect_right(self.days, day.isoformat())
+        return self.net_worth[n - 1] if n else sum(self.opening)
+
+    def first_day(self):
+        return date.fromisoformat(self.days[0]) if self.days else None
+
+    def last_day(self):
+        return date.fromisoformat(self.days[-1]) if self.days else None
+
+
+def balance_timeline():
+    """
+    BalanceTimeline of the active backup, built once per backup.
+    """
+    return cached('account_balances', (), BalanceTimeline.load)
+
+
+def period_ends(start, end, interval='month', limit=None):
+    """
+    Last day of every day, week (7 days from `start`) or month between `start`
+    and `end`, the last period ending on `end`.
+    Raises ValueError for an unknown interval or more than `limit` periods,
+    counted while they are generated.
+    """
+    if interval not in SERIES_INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    ends = []
+    day = start
+    while day < end:
+        if interval == 'day':
+            last = day
+        elif interval == 'week':
+            # Never stepping past `end`, which may be date.max
+            last = day + timedelta(days=min(6, (end - day).days))
+        else:
+            last = min(date(day.year, day.month, calendar.monthrange(day.year, day.month)[1]), end)
+        ends.append(last)
+        if limit is not None and len(ends) > limit:
+            raise ValueError(f"More than {limit} points")
+        if last == end:
+            break
+        day = last + timedelta(days=1)
+    if not ends or ends[-1] != end:
+        ends.append(end)
+    if limit is not None and len(ends) > limit:
+        raise ValueError(f"More than {limit} points")
+    return ends
+
+
+def net_worth_series(start=None, end=None, interval='month'):
+    """
+    Net worth in the default currency at the end of each period from `start` to
+    `end` (by default the first and last days with transactions):
+        [(date, net_worth), ...]
+    Raises ValueError for an unknown interval or more than MAX_SERIES_POINTS points.
+    """
+    timeline = balance_timeline()
+    start = start or timeline.first_day()
+    end = end or timeline.last_day()
+    if start is None or end is None or start > end:
+        return []
+    ends = period_ends(start, end, interval, limit=MAX_SERIES_POINTS)
+    return [(day, timeline.net_worth_at(day)) for day in ends]
@@ -0,0 +1,143 @@
+# bluecoins_app/caching.py
+
+import hashlib
+import os
+from datetime import datetime, time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+from django.utils.timezone import get_current_timezone, localdate
+from django.utils.translation import get_language
+
+from .backups import backup_fingerprint as _backup_fingerprint, get_active_backup_path
+
+CACHE_ALIAS = 'bluecoins'
+
+# Namespaces whose hits and misses are counted by cached()
+CACHE_NAMESPACES = ('monthly_rollups', 'category_report', 'monthly_report', 'label_catalog',
+                    'transactions_page', 'label_report', 'account_balances')
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def backup_fingerprint(path=None):
+    """
+    Fingerprint of the active backup (or `path`). A new or replaced backup gets
+    a new fingerprint, which invalidates every cache key built from the old one.
+    """
+    return _backup_fingerprint(path or get_active_backup_path())
+
+
+@lru_cache(maxsize=None)
+def release_mtime():
+    """
+    Newest modification time of the app's code, templates and static files.
+    A deploy changes it, so pages rendered by the previous release are not reused.
+    """
+    return max(path.stat().st_mtime for path in Path(__file__).resolve().parent.rglob('*')
+               if path.is_file() and '__pycache__' not in path.parts)
+
+
+def request_validators(request):
+    """
+    (ETag, Last-Modified timestamp) of a GET request's response on the active
+    backup. The response only depends on the backup, the release, the request
+    (path, parameters, AJAX and Accept headers, language) and, for the balances
+    at "today", the date; none of these needs a query.
+    """
+    today = localdate()
+    parts = (backup_fingerprint(), settings.BLUECOINS_RELEASE or release_mtime(), request.path,
+             sorted(request.GET.lists()), request.headers.get('X-Requested-With', ''),
+             request.headers.get('Accept', ''), get_language(), today.isoformat())
+    try:
+        backup_mtime = os.stat(get_active_backup_path()).st_mtime
+    except (OSError, TypeError):
+        backup_mtime = 0
+    midnight = datetime.combine(today, time.min, tzinfo=get_current_timezone()).timestamp()
+    last_modified = int(max(backup_mtime, release_mtime(), midnight))
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest()), last_modified
+
+
+def versioned_key(namespace, *parts):
+    """
+    Cache key for `namespace` and `parts` on the active backup.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'bc:{backup_fingerprint()}:{namespace}:{digest}'
+
+
+def _count(namespace, outcome):
+    cache = get_cache()
+    key = f'bc:stats:{namespace}:{outcome}'
+    # add() only creates the counter if it does not exist yet. incr() is atomic in the local-memory backend,
+    # but a get-then-set in the file backend: concurrent workers can lose counts, the stats are approximate
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, 1, timeout=None)
+
+
+def lookup(namespace, parts, default=None):
+    """
+    Returns the cached value for `namespace` and `parts` on the active backup,
+    or `default`. Counts a hit or a miss.
+    """
+    value = get_cache().get(versioned_key(namespace, *parts), _MISSING)
+    if value is _MISSING:
+        _count(namespace, 'misses')
+        return default
+    _count(namespace, 'hits')
+    return value
+
+
+def store(namespace, parts, value, timeout=None):
+    """
+    Stores `value` for `namespace` and `parts` on the active backup. `timeout`
+    defaults to the cache's TIMEOUT.
+    """
+    key = versioned_key(namespace, *parts)
+    if timeout is None:
+        get_cache().set(key, value)
+    else:
+        get_cache().set(key, value, timeout)
+
+
+def cached(namespace, parts, compute, timeout=None):
+    """
+    Returns the cached value of `compute()` for `namespace` and `parts` on the
+    active backup, computing and storing it on a miss.
+    """
+    value = lookup(namespace, parts, default=_MISSING)
+    if value is _MISSING:
+        value = compute()
+        store(namespace, parts, value, timeout)
+    return value
+
+
+def cache_stats():
+    """
+    Hit and miss counters per namespace, plus the fingerprint of the active backup.
+    With the local-memory backend each gunicorn worker has its own counters;
+    with the file backend they are shared but approximate (see _count).
+    """
+    cache = get_cache()
+    stats = {}
+    for namespace in CACHE_NAMESPACES:
+        hits = cache.get(f'bc:stats:{namespace}:hits', 0)
+        misses = cache.get(f'bc:stats:{namespace}:misses', 0)
+        total = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None,
+        }
+    return {'fingerprint': backup_fingerprint(), 'pid': os.getpid(), 'namespaces': stats}
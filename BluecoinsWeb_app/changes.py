@@ -0,0 +1,178 @@
+# bluecoins_app/changes.py
+"""
+Changes between consecutive backups: the transactions inserted, updated and deleted.
+
+Each new backup is usually the previous one plus a few dozen transactions.
+compare_backups() matches the transactions of two backups, attached to one
+SQLite connection, by transactionsTableID: a transaction is updated when a
+column of its row or one of its rows of LABELSTABLE differs. The comparison
+runs in SQLite, column by column, so nothing is loaded into Python.
+
+The sidecar of a new backup is a copy of the previous sidecar with the
+changed transactions replaced (apply_changes, see sidecar.py); the derived
+tables (rollups, search index, label catalog) then update only what these
+transactions touch. The changes stay in the sidecar's CHANGES_TABLE, read by
+the "changes since the last backup" page.
+"""
+
+import sqlite3
+
+from django.db import connections
+
+from .backups import active_alias, find_previous_backup, get_watcher
+from .caching import cached
+from .db_backend.base import database_uri
+
+CHANGES_TABLE = 'web_changes'
+INSERTED, UPDATED, DELETED = 'inserted', 'updated', 'deleted'
+
+# The tables whose rows are compared one by one; the others are small and copied whole
+TRANSACTIONS, LABELS = 'TRANSACTIONSTABLE', 'LABELSTABLE'
+
+
+def table_columns(connection, schema, table):
+    return [row[1] for row in connection.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def backup_tables(connection, schema):
+    return [row[0] for row in connection.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def same_schema(connection, old, new):
+    """
+    Whether every table of `new` exists in `old` with the same columns.
+    """
+    return all(table_columns(connection, old, table) == table_columns(connection, new, table)
+               for table in backup_tables(connection, new))
+
+
+def _differs(columns):
+    return ' OR '.join(f'n.{column} IS NOT o.{column}' for column in columns)
+
+
+def compare_backups(connection, old='previous', new='backup', target='main'):
+    """
+    Fills {target}.CHANGES_TABLE with the transactions of schema `new` that
+    were inserted, updated or deleted since schema `old`, with the date,
+    amount, item and notes they had in `old` (NULL for inserted ones).
+    Returns the number of changes of each kind.
+    """
+    tx_columns = table_columns(connection, new, TRANSACTIONS)
+    label_columns = table_columns(connection, new, LABELS)
+    connection.execute('CREATE TEMP TABLE web_changed_ids (id INTEGER PRIMARY KEY)')
+    # Rows of TRANSACTIONSTABLE: new or different, and gone
+    connection.execute(f"""
+        INSERT OR IGNORE INTO web_changed_ids
+        SELECT n.transactionsTableID FROM {new}.{TRANSACTIONS} n
+        LEFT JOIN {old}.{TRANSACTIONS} o ON o.transactionsTableID = n.transactionsTableID
+        WHERE o.transactionsTableID IS NULL OR {_differs(tx_columns[1:])}
+    """)
+    connection.execute(f"""
+        INSERT OR IGNORE INTO web_changed_ids
+        SELECT o.transactionsTableID FROM {old}.{TRANSACTIONS} o
+        WHERE NOT EXISTS (SELECT 1 FROM {new}.{TRANSACTIONS} n WHERE n.transactionsTableID = o.transactionsTableID)
+    """)
+    # Rows of LABELSTABLE, by labelsTableID: the transactions they belong to before and after
+    connection.execute(f"""
+        INSERT OR IGNORE INTO web_changed_ids
+        SELECT n.transactionIDLabels FROM {new}.{LABELS} n
+        LEFT JOIN {old}.{LABELS} o ON o.labelsTableID = n.labelsTableID
+        WHERE n.transactionIDLabels IS NOT NULL AND (o.labelsTableID IS NULL OR {_differs(label_columns[1:])})
+    """)
+    connection.execute(f"""
+        INSERT OR IGNORE INTO web_changed_ids
+        SELECT o.transactionIDLabels FROM {old}.{LABELS} o
+        LEFT JOIN {new}.{LABELS} n ON n.labelsTableID = o.labelsTableID
+        WHERE o.transactionIDLabels IS NOT NULL AND (n.labelsTableID IS NULL OR {_differs(label_columns[1:])})
+    """)
+
+    connection.execute(f'DROP TABLE IF EXISTS {target}.{CHANGES_TABLE}')
+    connection.execute(f"""
+        CREATE TABLE {target}.{CHANGES_TABLE} (
+            id INTEGER PRIMARY KEY, change TEXT NOT NULL, date TEXT, amount INTEGER, item TEXT, notes TEXT)
+    """)
+    connection.execute(f"""
+        INSERT INTO {target}.{CHANGES_TABLE}
+        SELECT c.id,
+               CASE WHEN o.transactionsTableID IS NULL THEN '{INSERTED}'
+                    WHEN n.transactionsTableID IS NULL THEN '{DELETED}' ELSE '{UPDATED}' END,
+               o.date, o.amount, i.itemName, o.notes
+        FROM temp.web_changed_ids c
+        LEFT JOIN {old}.{TRANSACTIONS} o ON o.transactionsTableID = c.id
+        LEFT JOIN {new}.{TRANSACTIONS} n ON n.transactionsTableID = c.id
+        LEFT JOIN {old}.ITEMTABLE i ON i.itemTableID = o.itemID
+        -- Labels of transactions that exist in neither backup
+        WHERE o.transactionsTableID IS NOT NULL OR n.transactionsTableID IS NOT NULL
+    """)
+    connection.execute('DROP TABLE temp.web_changed_ids')
+    counts = {INSERTED: 0, UPDATED: 0, DELETED: 0}
+    counts.update(connection.execute(f'SELECT change, COUNT(*) FROM {target}.{CHANGES_TABLE} GROUP BY change'))
+    return counts
+
+
+def apply_changes(connection):
+    """
+    Brings `main`, a copy of the previous sidecar, up to date with the
+    `backup` schema: the changed transactions and their labels are replaced
+    (CHANGES_TABLE must be filled), the other tables copied whole.
+    """
+    before = f"SELECT id FROM {CHANGES_TABLE} WHERE change != '{INSERTED}'"
+    after = f"SELECT id FROM {CHANGES_TABLE} WHERE change != '{DELETED}'"
+    connection.execute(f'DELETE FROM main.{LABELS} WHERE transactionIDLabels IN ({before})')
+    connection.execute(f'DELETE FROM main.{TRANSACTIONS} WHERE transactionsTableID IN ({before})')
+    connection.execute(f'INSERT INTO main.{TRANSACTIONS} SELECT * FROM backup.{TRANSACTIONS} '
+                       f'WHERE transactionsTableID IN ({after})')
+    connection.execute(f'INSERT OR REPLACE INTO main.{LABELS} SELECT * FROM backup.{LABELS} '
+                       f'WHERE transactionIDLabels IN ({after})')
+    for table in backup_tables(connection, 'backup'):
+        if table not in (TRANSACTIONS, LABELS):
+            connection.execute(f'DELETE FROM main.{table}')
+            connection.execute(f'INSERT INTO main.{table} SELECT * FROM backup.{table}')
+
+
+def _read_changes(connection, schema):
+    rows = connection.execute(
+        f'SELECT id, change, date, amount, item, notes FROM {schema}.{CHANGES_TABLE} ORDER BY id DESC')
+    return [{'id': row[0], 'change': row[1], 'date': row[2], 'amount': row[3], 'item': row[4], 'notes': row[5]}
+            for row in rows]
+
+
+def _compare_files(old_path, new_path):
+    connection = sqlite3.connect(':memory:', uri=True)
+    try:
+        connection.execute('ATTACH ? AS previous', [database_uri(old_path)])
+        connection.execute('ATTACH ? AS backup', [database_uri(new_path)])
+        compare_backups(connection, target='temp')
+        return _read_changes(connection, 'temp')
+    finally:
+        connection.close()
+
+
+def _load_changes():
+    from . import sidecar
+
+    connection = connections[active_alias()]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if CHANGES_TABLE in tables and sidecar.SIDECAR_META_TABLE in tables:
+        # Stored by the incremental build of the sidecar
+        return {'previous': sidecar.read_meta(connection.connection).get('previous_backup'),
+                'changes': _read_changes(connection.connection, 'main')}
+
+    # No sidecar, or built from scratch: compare the two newest backups
+    watcher = get_watcher()
+    previous = find_previous_backup(watcher.path, watcher.directory, watcher.pattern)
+    if previous is None:
+        return None
+    return {'previous': previous, 'changes': _compare_files(previous, watcher.path)}
+
+
+def backup_changes():
+    """
+    Changes of the backup being served since the previous one, or None if it
+    is the first: {'previous': path, 'changes': [{'id', 'change', 'date',
+    'amount', 'item', 'notes'}, ...]}, newest transactions first. The date,
+    amount, item and notes are those before the change (None if inserted).
+    """
+    return cached('backup_changes', (), _load_changes)
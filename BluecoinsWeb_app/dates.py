@@ -0,0 +1,94 @@
+# bluecoins_app/dates.py
+"""
+Day headings of the transaction list, in the language of the request.
+
+Month and day names come from Django's translations (django.utils.formats),
+activated per request by LocaleMiddleware, so Spanish and English pages can be
+rendered at the same time by the threads of one process. The C library locale
+(locale.setlocale) is global to the process and is never changed.
+
+Formatting a date is the expensive part and a page has far fewer days than
+rows: group_by_day() converts each row's datetime to the current time zone and
+looks its local day up in day_heading(), memoized per (day, language) with a
+bounded LRU cache. day_keys() does the same for the compact infinite-scroll
+pages, whose rows are grouped by the browser.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.formats import date_format
+from django.utils.text import capfirst
+from django.utils.timezone import get_current_timezone, localtime
+
+# Format of the day headings per language (django.utils.dateformat syntax)
+DAY_FORMATS = {
+    'es': 'D, d \\d\\e F \\d\\e Y',
+    'en': 'D, F j, Y',
+}
+
+UNDATED = {
+    'es': 'Sin fecha',
+    'en': 'No date',
+}
+
+# Distinct (day, language) headings kept: several years of days in both languages
+DAY_HEADINGS_CACHED = 8192
+
+
+def current_language():
+    """
+    The active language among DAY_FORMATS ('es-ar' -> 'es'), or the one of LANGUAGE_CODE.
+    """
+    for code in (translation.get_language(), settings.LANGUAGE_CODE):
+        language = (code or '').split('-')[0].lower()
+        if language in DAY_FORMATS:
+            return language
+    return 'es'
+
+
+@lru_cache(maxsize=DAY_HEADINGS_CACHED)
+def day_heading(day, language):
+    """
+    Heading of the local date `day` (None for undated rows) in `language`.
+    """
+    if day is None:
+        return UNDATED[language]
+    with translation.override(language):
+        return capfirst(date_format(day, DAY_FORMATS[language], use_l10n=True))
+
+
+def group_by_day(rows, field='date'):
+    """
+    Groups `rows` by the local day of their datetime `field`, in order:
+        {heading: [row, ...], ...}
+    """
+    language = current_language()
+    timezone = get_current_timezone()
+    groups = {}
+    for row in rows:
+        value = getattr(row, field)
+        day = localtime(value, timezone).date() if value else None
+        groups.setdefault(day_heading(day, language), []).append(row)
+    return groups
+
+
+def day_keys(rows, field='date'):
+    """
+    The local day of each row's datetime `field` ('YYYY-MM-DD', '' for undated
+    rows) and the heading of each distinct day:
+        (['2025-03-02', ...], {'2025-03-02': heading, ...})
+    """
+    language = current_language()
+    timezone = get_current_timezone()
+    keys = []
+    headings = {}
+    for row in rows:
+        value = getattr(row, field)
+        day = localtime(value, timezone).date() if value else None
+        key = day.isoformat() if day else ''
+        if key not in headings:
+            headings[key] = day_heading(day, language)
+        keys.append(key)
+    return keys, headings
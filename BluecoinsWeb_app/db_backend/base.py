@@ -0,0 +1,63 @@
+# bluecoins_app/db_backend/base.py
+"""
+SQLite backend for the `bluecoins` alias, tuned for reading a backup.
+
+Extra OPTIONS (all optional):
+    read_only  Open the file with mode=ro and PRAGMA query_only (default True)
+    immutable  Tell SQLite the file never changes, so it skips locking and
+               change detection (default: same as read_only)
+    pragmas    PRAGMAs run on every new connection, merged over DEFAULT_PRAGMAS
+
+In-memory databases (the test runner's) are opened as usual, without any of them.
+"""
+
+from urllib.parse import quote
+
+from django.db.backends.sqlite3 import base
+
+# Each gunicorn worker keeps one persistent connection, so these are paid once per worker
+DEFAULT_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,  # Read pages straight from the OS page cache
+    'cache_size': -64 * 1024,  # 64 MiB of page cache (negative values are KiB)
+    'temp_store': 'MEMORY',  # Sorts and GROUP BY temporary tables in memory
+}
+
+
+def database_uri(path, immutable=True):
+    """
+    URI that opens `path` read-only.
+    """
+    uri = f"file:{quote(str(path))}?mode=ro"
+    return f"{uri}&immutable=1" if immutable else uri
+
+
+def connection_pragmas(read_only=True, pragmas=None):
+    """
+    PRAGMA statements run on a new connection.
+    """
+    merged = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+    if read_only:
+        merged['query_only'] = 'ON'
+    return [f'PRAGMA {name} = {value}' for name, value in merged.items()]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        read_only = kwargs.pop('read_only', True)
+        immutable = kwargs.pop('immutable', read_only)
+        pragmas = kwargs.pop('pragmas', None)
+
+        self.tuned_pragmas = []
+        if not self.is_in_memory_db():
+            if read_only:
+                kwargs['database'] = database_uri(kwargs['database'], immutable)
+            self.tuned_pragmas = connection_pragmas(read_only, pragmas)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma in self.tuned_pragmas:
+            conn.execute(pragma)
+        return conn
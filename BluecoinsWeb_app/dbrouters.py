@@ -1,31 +1,38 @@
+from .backups import BLUECOINS_ALIAS, active_alias
+
+
 class BluecoinsDBRouter:
     """
-    Router for any 'BluecoinsWeb_app' model to use the 'bluecoins' DB.
-    All other models will use the default DB.
+    Router for any 'BluecoinsWeb_app' model to use the 'bluecoins' DB, or the
+    alias of the current user's backups (see tenants.py).
+    All other models, and the app's own registry models, will use the default DB.
     """
     route_app_labels = {'BluecoinsWeb_app'}  # the name of your app
+    default_models = {'userbackup'}  # Models of the app managed in the default DB
+
+    def _routed(self, model):
+        return model._meta.app_label in self.route_app_labels and model._meta.model_name not in self.default_models
 
     def db_for_read(self, model, **hints):
+        if self._routed(model):
+            return active_alias()  # 'bluecoins' unless a user's backups are being served
         if model._meta.app_label in self.route_app_labels:
-            return 'bluecoins'  # Name of the DB defined in settings.py
+            return 'default'
         return None
 
     def db_for_write(self, model, **hints):
-        if model._meta.app_label in self.route_app_labels:
-            return 'bluecoins'
-        return None
+        return self.db_for_read(model, **hints)
 
     def allow_relation(self, obj1, obj2, **hints):
-        # Allow relationships if both objects are in 'BluecoinsWeb_app'
-        if (
-            obj1._meta.app_label in self.route_app_labels and
-            obj2._meta.app_label in self.route_app_labels
-        ):
+        # Allow relationships if both objects are in the Bluecoins backup
+        if self._routed(type(obj1)) and self._routed(type(obj2)):
             return True
         return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        # Avoid migrations in the 'bluecoins' database
         if app_label in self.route_app_labels:
-            return db == 'bluecoins'  # Normally you can set it to False to block
+            if model_name in self.default_models:
+                return db == 'default'
+            # Avoid migrations in the 'bluecoins' database
+            return db == BLUECOINS_ALIAS  # Normally you can set it to False to block
         return None
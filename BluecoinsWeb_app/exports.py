@@ -0,0 +1,100 @@
+# bluecoins_app/exports.py
+
+from django.utils.formats import date_format
+from django.utils.translation import get_language
+from openpyxl import Workbook
+
+from .models import Transactions_table
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+LABEL_REPORT_HEADER = ['ID Transaction', 'Date', 'Transaction name', 'Income', 'Expense', 'Transaction type']
+
+# Rows fetched from SQLite per round trip while streaming the export
+EXPORT_CHUNK_SIZE = 2000
+
+# Label reports up to this size are kept in the cache; bigger ones are always streamed
+LABEL_REPORT_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+
+def label_report_filename(filters=None):
+    labels = filters.labels if filters else ()
+    return f"report_by_label_{'_'.join(labels) or 'all'}.xlsx"
+
+
+def label_report_parts(filters):
+    """
+    Cache key parts of the label report of a TransactionFilter: its sheets
+    are named after the months in the active language.
+    """
+    return filters.cache_parts(), get_language()
+
+
+def label_report_queryset(filters=None):
+    """
+    Transactions of the label report matching a TransactionFilter (all of them
+    without one), oldest first.
+    """
+    qs = Transactions_table.objects.all()
+    if filters:
+        qs = filters.apply(qs)
+    return qs.order_by('date', 'transactions_table_id')
+
+
+def write_label_report(fileobj, filters=None, progress=None):
+    """
+    Writes the label report to `fileobj` as an .xlsx file with one sheet per month.
+
+    The workbook is write-only, so openpyxl streams every sheet to disk instead of
+    keeping cells in memory, and the rows come from a chunked cursor with the item
+    and transaction type names already joined. Memory stays flat whatever the
+    number of transactions. Returns the number of transactions written.
+
+    `progress(rows, total)` is called every EXPORT_CHUNK_SIZE rows; the total
+    costs one COUNT query, only made when `progress` is given.
+    """
+    # For transfers, include only the negative record
+    qs = label_report_queryset(filters).exclude_transfer_mirrors()
+    total = qs.count() if progress else None
+
+    rows = qs.values_list(
+        'transactions_table_id', 'date', 'amount', 'item_id',
+        'item_id__item_name', 'transaction_type_id', 'transaction_type_id__transaction_type_name',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    wb = Workbook(write_only=True)
+    ws = None
+    month = False
+    written = 0
+    for tx_id, date, amount, item_id, item_name, type_id, type_name in rows:
+        # Rows are sorted by date, so each month is a contiguous run of rows, named once
+        row_month = (date.year, date.month) if date else None
+        if row_month != month:
+            month = row_month
+            ws = wb.create_sheet(title=date_format(date, 'F Y') if date else 'Undated')
+            # Header row
+            ws.append(LABEL_REPORT_HEADER)
+
+        # Convert amount from micro-units
+        amt = (amount or 0) / 1000000
+        income = amt if amt > 0 else ''
+        expense = -amt if amt < 0 else ''
+        # Same fallbacks as the models' __str__
+        transaction_name = (item_name or f"Item {item_id}") if item_id else ''
+        transaction_type = f'{type_name}' if type_id else ''
+
+        ws.append([
+            tx_id,
+            date.strftime('%d/%m/%Y') if date else '',
+            transaction_name,
+            income,
+            expense,
+            transaction_type,
+        ])
+        written += 1
+        if progress and not written % EXPORT_CHUNK_SIZE:
+            progress(written, total)
+
+    if written:
+        wb.save(fileobj)
+    return written
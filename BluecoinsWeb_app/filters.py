@@ -0,0 +1,171 @@
+# bluecoins_app/filters.py
+"""
+Filters of the transactions, shared by the list view, the Excel report and the JSON endpoints.
+
+A TransactionFilter is parsed from the GET parameters and compiled into
+WHERE clauses of the same query: labels become subqueries over LABELSTABLE
+(indexed in the sidecar, see label_condition), the other filters plain
+column comparisons. No list of IDs is ever built in Python,
+so the result keeps the keyset ordering of the caller.
+
+GET parameters (all optional, repeatable ones may also be comma-separated):
+    label       label name, repeatable
+    label_mode  'any' (default) or 'all' of the labels
+    start, end  dates, YYYY-MM-DD, inclusive
+    min_amount, max_amount  signed amounts in currency units, inclusive
+    category    child category IDs        parent  parent category IDs
+    account     account IDs               type    transaction type IDs
+"""
+
+from decimal import Decimal, DecimalException
+
+from django.db.models import Exists, OuterRef, Q
+
+from .labels import label_catalog
+from .models import Labels_table
+from .reports import SQLITE_INTEGER_MAX, SQLITE_INTEGER_MIN, filter_transactions, parse_report_date
+
+LABEL_MODES = ('any', 'all')
+
+# Labels with up to this many transactions are read from the label index first
+LABEL_SCAN_ROWS = 5000
+
+# Largest amount in currency units whose micro-units fit in a SQLite integer
+MAX_AMOUNT = Decimal(SQLITE_INTEGER_MAX).scaleb(-6)
+
+
+def _values(query, name):
+    """
+    Every non-empty value of a repeatable parameter: ?x=1&x=2 or ?x=1,2.
+    Label names may contain commas, so only repeating works for them.
+    """
+    values = query.getlist(name) if hasattr(query, 'getlist') else [query.get(name)]
+    if name != 'label':
+        values = [part for value in values if value for part in value.split(',')]
+    return [value.strip() for value in values if value and value.strip()]
+
+
+def _is_sqlite_integer(value):
+    return SQLITE_INTEGER_MIN <= value <= SQLITE_INTEGER_MAX
+
+
+def _ids(query, name):
+    ids = {int(value) for value in _values(query, name) if value.lstrip('-').isdigit()}
+    return sorted(value for value in ids if _is_sqlite_integer(value))
+
+
+def _micro_amount(value):
+    """
+    Amount in currency units ('12.5') as micro-units, or None if invalid
+    (not a number, infinite or beyond the range of SQLite integers).
+    """
+    try:
+        amount = Decimal(value) if value else None
+        # Compared before scaling: huge exponents overflow or take ages to convert
+        if amount is None or not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+            return None
+        amount = int(amount.scaleb(6))
+    except (DecimalException, ValueError):
+        return None
+    return amount if _is_sqlite_integer(amount) else None
+
+
+class TransactionFilter:
+    """
+    Composable filters of TRANSACTIONSTABLE. Invalid values are ignored, as the
+    report filters do. An empty filter matches every transaction.
+    """
+
+    def __init__(self, labels=(), label_mode='any', start=None, end=None, min_amount=None, max_amount=None,
+                 categories=(), parents=(), accounts=(), types=()):
+        self.labels = tuple(labels)
+        self.label_mode = label_mode if label_mode in LABEL_MODES else 'any'
+        self.start = start
+        self.end = end
+        self.min_amount = min_amount  # Micro-units
+        self.max_amount = max_amount
+        self.categories = tuple(categories)
+        self.parents = tuple(parents)
+        self.accounts = tuple(accounts)
+        self.types = tuple(types)
+
+    @classmethod
+    def from_query(cls, query):
+        """
+        Filter of a request's GET parameters (a QueryDict or a plain dict).
+        """
+        return cls(
+            labels=dict.fromkeys(_values(query, 'label')),
+            label_mode=query.get('label_mode', 'any'),
+            start=parse_report_date(query.get('start')),
+            end=parse_report_date(query.get('end')),
+            min_amount=_micro_amount(query.get('min_amount')),
+            max_amount=_micro_amount(query.get('max_amount')),
+            categories=_ids(query, 'category'),
+            parents=_ids(query, 'parent'),
+            accounts=_ids(query, 'account'),
+            types=_ids(query, 'type'),
+        )
+
+    def __bool__(self):
+        return bool(self.labels or self.start or self.end or self.min_amount is not None
+                    or self.max_amount is not None or self.categories or self.parents or self.accounts or self.types)
+
+    def __eq__(self, other):
+        return isinstance(other, TransactionFilter) and self.cache_parts() == other.cache_parts()
+
+    def __repr__(self):
+        return f'TransactionFilter{self.cache_parts()!r}'
+
+    def cache_parts(self):
+        """
+        Hashable and stable description of the filter, for cache keys.
+        """
+        return (self.labels, self.label_mode if len(self.labels) > 1 else 'any', self.start, self.end,
+                self.min_amount, self.max_amount, self.categories, self.parents, self.accounts, self.types)
+
+    def label_condition(self):
+        """
+        Conditions of the label filter: one for 'any', one per label for 'all'.
+
+        A rare label (at most LABEL_SCAN_ROWS transactions, per the label catalog)
+        is an `IN (subquery)`, so SQLite starts from the label index and sorts the
+        few matches. A common one is a correlated EXISTS, so SQLite walks the date
+        index and stops after one page. In 'all' mode only the rarest label drives.
+        """
+        if not self.labels:
+            return []
+        counts = {label['name']: label['count'] for label in label_catalog()}
+        labels = Labels_table.objects.filter(transaction_id_labels=OuterRef('pk'))
+
+        def condition(names):
+            if sum(counts.get(name, 0) for name in names) <= LABEL_SCAN_ROWS:
+                return Q(transactions_table_id__in=Labels_table.objects.filter(label_name__in=names)
+                         .values('transaction_id_labels'))
+            return Exists(labels.filter(label_name__in=names))
+
+        if self.label_mode == 'all':
+            rarest = min(self.labels, key=lambda name: counts.get(name, 0))
+            return [condition([rarest])] + [Exists(labels.filter(label_name=name))
+                                             for name in self.labels if name != rarest]
+        return [condition(self.labels)]
+
+    def apply(self, queryset):
+        """
+        `queryset` (of Transactions_table) with the filters as WHERE clauses.
+        """
+        queryset = filter_transactions(queryset, self.start, self.end)
+        conditions = {}
+        if self.min_amount is not None:
+            conditions['amount__gte'] = self.min_amount
+        if self.max_amount is not None:
+            conditions['amount__lte'] = self.max_amount
+        if self.categories:
+            conditions['category_id__in'] = self.categories
+        if self.parents:
+            conditions['category_id__parent_category_id__in'] = self.parents
+        if self.accounts:
+            conditions['account_id__in'] = self.accounts
+        if self.types:
+            conditions['transaction_type_id__in'] = self.types
+        return queryset.filter(*self.label_condition(), **conditions)
@@ -0,0 +1,215 @@
+# bluecoins_app/ingest.py
+"""
+Uploads of new Bluecoins backups (the upload page and the ingest_backup command).
+
+The backup is streamed to a temporary file in the backups directory, chunk by
+chunk, and never held in memory. It is checked while it arrives: the SQLite
+header as soon as its first HEADER_SIZE bytes are in, the size limit
+(BLUECOINS_UPLOAD_MAX_BYTES) on every chunk. The complete file must pass
+`PRAGMA quick_check`, have the tables of the models and the Room identity hash
+of the Bluecoins version they describe.
+
+Its sidecar is then built from the temporary file, and the file is renamed
+into place as the newest bluecoins_upload_<timestamp>.fydb: an atomic rename
+on the same filesystem, so readers see the old backup or the complete new one.
+Finally warm_up() switches to it and computes the rollups, label catalog and
+balances that every page reads, so the first request after an upload is not
+the one that pays for them.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from .backups import get_watcher
+from .balances import balance_timeline
+from .db_backend.base import database_uri
+from .labels import label_catalog
+from .rollups import monthly_rollups
+from .sidecar import build_sidecar
+from .tenants import get_pool
+
+logger = logging.getLogger(__name__)
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+HEADER_SIZE = 100
+
+# Bytes read per chunk from the request or the file
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Tables read by the app: every Bluecoins backup has them
+EXPECTED_TABLES = {
+    'ACCOUNTINGGROUPTABLE', 'ACCOUNTSTABLE', 'ACCOUNTTYPETABLE', 'CATEGORYGROUPTABLE', 'CHILDCATEGORYTABLE',
+    'ITEMTABLE', 'LABELSTABLE', 'PARENTCATEGORYTABLE', 'TRANSACTIONSTABLE', 'TRANSACTIONTYPETABLE',
+    'room_master_table',
+}
+
+# room_master_table.identity_hash of the Bluecoins schema described by models.py
+ROOM_IDENTITY_HASHES = {'be183e46451dc3214c731b0649d935a4'}
+
+
+class InvalidBackup(ValueError):
+    """The upload is not a usable Bluecoins backup."""
+
+
+def check_header(header):
+    """
+    Checks the first HEADER_SIZE bytes of a SQLite file. Returns its page size.
+    """
+    if len(header) < HEADER_SIZE or not header.startswith(SQLITE_HEADER):
+        raise InvalidBackup("Not a SQLite database")
+    page_size = int.from_bytes(header[16:18], 'big')
+    page_size = 65536 if page_size == 1 else page_size
+    if page_size < 512 or page_size & (page_size - 1):
+        raise InvalidBackup(f"Invalid SQLite page size {page_size}")
+    # Maximum and minimum embedded payload fractions, fixed by the file format
+    if header[21:24] != b'\x40\x20\x20':
+        raise InvalidBackup("Invalid SQLite header")
+    return page_size
+
+
+def check_database(path):
+    """
+    Checks a complete backup file. Returns its number of transactions.
+    """
+    connection = sqlite3.connect(database_uri(path), uri=True)
+    try:
+        problems = [row[0] for row in connection.execute('PRAGMA quick_check')]
+        if problems != ['ok']:
+            raise InvalidBackup(f"Damaged database: {'; '.join(problems[:3])}")
+
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = EXPECTED_TABLES - tables
+        if missing:
+            raise InvalidBackup(f"Not a Bluecoins backup, missing tables: {', '.join(sorted(missing))}")
+        row = connection.execute('SELECT identity_hash FROM room_master_table WHERE id = 42').fetchone()
+        if row is None or row[0] not in ROOM_IDENTITY_HASHES:
+            raise InvalidBackup(f"Unsupported Bluecoins version (schema {row[0] if row else 'unknown'})")
+
+        return connection.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise InvalidBackup(f"Damaged database: {e}") from e
+    finally:
+        connection.close()
+
+
+def backup_name():
+    """
+    Name of a new upload: matches BLUECOINS_DB_PATTERN and sorts after the previous ones.
+    """
+    return f"bluecoins_upload_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S_%f')}.fydb"
+
+
+class BackupReceiver:
+    """
+    Writes an upload into a temporary file of `directory` as its chunks arrive.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = Path(directory)
+        self.max_bytes = settings.BLUECOINS_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self.page_size = None
+        self._header = b''
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, self.partial = tempfile.mkstemp(prefix='.upload-', suffix='.part', dir=self.directory)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise InvalidBackup(f"The backup is larger than {self.max_bytes} bytes")
+        if self.page_size is None:
+            self._header += chunk[:HEADER_SIZE - len(self._header)]
+            if len(self._header) == HEADER_SIZE:
+                self.page_size = check_header(self._header)
+        self._file.write(chunk)
+
+    def finish(self):
+        """
+        Checks the complete upload. Returns its number of transactions.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self.page_size is None:
+            check_header(self._header)
+        if self.size % self.page_size:
+            raise InvalidBackup("Truncated database")
+        return check_database(self.partial)
+
+    def abort(self):
+        self._file.close()
+        Path(self.partial).unlink(missing_ok=True)
+
+
+def _sync_directory(directory):
+    # Makes the rename durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def ingest_backup(chunks, directory, max_bytes=None):
+    """
+    Writes the backup in `chunks` (bytes) into `directory`, checks it, builds
+    its sidecar and renames it into place. Raises InvalidBackup, and leaves
+    nothing behind, if it is not a usable backup.
+    Returns {'path', 'size', 'transactions', 'seconds'}.
+    """
+    started = time.perf_counter()
+    receiver = BackupReceiver(directory, max_bytes)
+    try:
+        for chunk in chunks:
+            receiver.write(chunk)
+        transactions = receiver.finish()
+        path = receiver.directory / backup_name()
+        if settings.BLUECOINS_SIDECAR:
+            # The rename keeps the mtime and size, hence the fingerprint, of the file
+            build_sidecar(path, source=receiver.partial)
+        os.replace(receiver.partial, path)
+    except BaseException:
+        receiver.abort()
+        raise
+    _sync_directory(receiver.directory)
+
+    seconds = time.perf_counter() - started
+    logger.info("Bluecoins backup uploaded: %s (%d bytes, %d transactions) in %.2fs",
+                path, receiver.size, transactions, seconds)
+    return {'path': str(path), 'size': receiver.size, 'transactions': transactions, 'seconds': seconds}
+
+
+def warm_up(user_backup=None):
+    """
+    Switches to the newest backup, of the main directory or of a UserBackup,
+    and computes what every page reads first.
+    """
+    if user_backup is None:
+        _warm_up(get_watcher())
+        return
+    pool = get_pool()
+    watcher = pool.acquire(user_backup)
+    with pool.serving(watcher):
+        _warm_up(watcher)
+
+
+def _warm_up(watcher):
+    started = time.perf_counter()
+    watcher.check(force=True)
+    watcher.activate()
+    monthly_rollups()
+    label_catalog()
+    balance_timeline()
+    if settings.BLUECOINS_ANALYTICS == 'columnar':
+        from .analytics import get_store
+
+        get_store()
+    logger.info("Bluecoins backup %s warmed up in %.2fs", watcher.path, time.perf_counter() - started)
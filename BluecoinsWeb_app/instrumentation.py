@@ -0,0 +1,163 @@
+# bluecoins_app/instrumentation.py
+"""
+Per-request metrics: total time, SQL queries and time per database alias, the
+slowest statements, repeated statements (N+1 patterns) and template render time.
+
+InstrumentationMiddleware (middleware.py) creates a RequestMetrics for each
+request and installs it as an execute wrapper on every connection. Templates
+report their render time through the template backend in this module.
+"""
+
+import heapq
+import re
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+
+# Statements kept per request, slowest first
+SLOWEST_STATEMENTS = 5
+
+# Characters of SQL kept in logs
+SQL_PREVIEW_LENGTH = 200
+
+_current = ContextVar('bluecoins_request_metrics', default=None)
+
+_NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+def sql_shape(sql):
+    """
+    `sql` without its literals and with IN lists collapsed, so the same query
+    with different values has the same shape.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def current_metrics():
+    """
+    RequestMetrics of the request being served, or None.
+    """
+    return _current.get()
+
+
+class RequestMetrics:
+    """
+    Collects the metrics of one request. Used as an execute wrapper
+    (connection.execute_wrapper(metrics)) on every database alias.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.sql_time = defaultdict(float)
+        self.shapes = Counter()
+        self.slowest = []  # min-heap of (duration, sequence, alias, sql)
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            alias = context['connection'].alias
+            self.queries[alias] += 1
+            self.sql_time[alias] += duration
+            self.shapes[(alias, sql_shape(sql))] += 1
+            entry = (duration, sum(self.queries.values()), alias, sql)
+            if len(self.slowest) < SLOWEST_STATEMENTS:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def repeated_statements(self, threshold):
+        """
+        Statement shapes run more than `threshold` times: likely N+1 queries.
+        """
+        return [
+            {'alias': alias, 'count': count, 'sql': shape[:SQL_PREVIEW_LENGTH]}
+            for (alias, shape), count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+    def slowest_statements(self):
+        return [
+            {'alias': alias, 'ms': round(duration * 1000, 2), 'sql': sql[:SQL_PREVIEW_LENGTH]}
+            for duration, _, alias, sql in sorted(self.slowest, reverse=True)
+        ]
+
+    def server_timing(self):
+        """
+        Value of the Server-Timing header.
+        """
+        metrics = [f'total;dur={self.elapsed() * 1000:.1f}']
+        for alias in sorted(self.queries):
+            metrics.append(f'db-{alias};dur={self.sql_time[alias] * 1000:.1f};desc="{self.queries[alias]} queries"')
+        if self.template_time:
+            metrics.append(f'template;dur={self.template_time * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.elapsed() * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'db': {alias: {'queries': self.queries[alias], 'ms': round(self.sql_time[alias] * 1000, 2)}
+                   for alias in sorted(self.queries)},
+            'slowest': self.slowest_statements(),
+        }
+
+
+class TimedTemplate:
+    """
+    Template of the Django backend that adds its render time to the current request.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics()
+        if metrics is None:
+            return self.template.render(context, request)
+        # Templates rendered while rendering another one are already counted
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """
+    The Django template backend, with the render time of each template
+    recorded in the request metrics.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
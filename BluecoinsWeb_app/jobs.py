@@ -0,0 +1,245 @@
+# bluecoins_app/jobs.py
+"""
+Background export jobs.
+
+Big Excel reports take seconds to write, too long for the few gunicorn sync
+workers. A request submits a job instead and the report is written by a
+thread pool of the same process (BLUECOINS_EXPORT_WORKERS threads), while the
+browser polls its status and then downloads the finished file.
+
+The state of every job is a JSON file in BLUECOINS_EXPORT_DIR, next to its
+result, so every worker process sees every job. The job ID is a hash of the
+backup fingerprint, the kind of job and its parameters: identical requests,
+from any worker, find the same job instead of starting another one. Jobs are
+deleted BLUECOINS_EXPORT_TTL seconds after their last update, and a job left
+unfinished by a process that died is started again by the next request.
+With BLUECOINS_TENANTS a job is written from, and only visible to, the
+backups of the user who requested it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import translation
+
+from .backups import BLUECOINS_ALIAS, active_alias, get_watcher
+from .caching import backup_fingerprint
+from .exports import label_report_parts, write_label_report
+from .tenants import get_pool
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, EMPTY, FAILED = 'queued', 'running', 'done', 'empty', 'failed'
+FINISHED = (DONE, EMPTY, FAILED)
+
+# Seconds between two progress updates of the state file
+PROGRESS_INTERVAL = 0.5
+
+_JOB_ID = re.compile(r'^[0-9a-f]{20}$')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def jobs_dir():
+    path = Path(settings.BLUECOINS_EXPORT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def state_path(job_id):
+    return jobs_dir() / f'{job_id}.json'
+
+
+def result_path(job_id):
+    return jobs_dir() / f'{job_id}.xlsx'
+
+
+def job_id_for(kind, parts):
+    """
+    ID of the job of `kind` with `parts` (hashable parameters) on the backup being served.
+    """
+    return hashlib.sha1(repr((kind, active_alias(), backup_fingerprint(), parts)).encode()).hexdigest()[:20]
+
+
+def _write_state(state):
+    """
+    Replaces the state file atomically, so readers never see half of it.
+    """
+    state['updated'] = time.time()
+    path = state_path(state['id'])
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def get_job(job_id):
+    """
+    State of a job of the backup being served ({'id', 'status', 'progress',
+    'rows', 'total', 'filename', ...}), or None if it does not exist, has
+    expired or belongs to another user's backups.
+    """
+    if not _JOB_ID.match(job_id or ''):
+        return None
+    try:
+        state = json.loads(state_path(job_id).read_text())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # Created an instant ago by another process, not written yet
+        return {'id': job_id, 'status': QUEUED, 'progress': 0}
+    return state if state.get('alias', BLUECOINS_ALIAS) == active_alias() else None
+
+
+def _is_orphan(state):
+    """
+    Whether an unfinished job belongs to a process that no longer exists.
+    """
+    if state['status'] in FINISHED:
+        return False
+    try:
+        os.kill(state['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except (KeyError, TypeError, PermissionError):
+        return False
+    return False
+
+
+def cleanup_jobs(ttl=None):
+    """
+    Deletes the jobs (state and result) not updated in the last `ttl` seconds
+    (BLUECOINS_EXPORT_TTL by default). Returns the number of jobs deleted.
+    """
+    ttl = settings.BLUECOINS_EXPORT_TTL if ttl is None else ttl
+    expired = time.time() - ttl
+    deleted = 0
+    directory = jobs_dir()
+    for path in directory.glob('*.json'):
+        try:
+            if path.stat().st_mtime >= expired:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        result_path(path.stem).unlink(missing_ok=True)
+        deleted += 1
+    # Leftovers of processes killed while writing
+    for path in (*directory.glob('*.part'), *directory.glob('*.tmp')):
+        try:
+            if path.stat().st_mtime < expired:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def _executor_for_process():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.BLUECOINS_EXPORT_WORKERS,
+                                               thread_name_prefix='bluecoins-export')
+    return _executor
+
+
+def submit_label_report(filters, filename):
+    """
+    State of the label report job of a TransactionFilter, started if there is
+    none yet (or the previous one failed or was orphaned). With
+    BLUECOINS_EXPORT_WORKERS = 0 the report is written before returning.
+    """
+    cleanup_jobs()
+    job_id = job_id_for('label_report', label_report_parts(filters))
+    previous = get_job(job_id)
+    if previous is not None and previous['status'] != FAILED and not _is_orphan(previous):
+        return previous
+
+    state = {'id': job_id, 'kind': 'label_report', 'status': QUEUED, 'progress': 0, 'rows': 0, 'total': None,
+             'filename': filename, 'alias': active_alias(), 'language': translation.get_language(), 'pid': os.getpid(),
+             'created': time.time(), 'error': None}
+    if previous is None:
+        if not _create_state(state):
+            # Another request created it in the meantime
+            return get_job(job_id)
+    else:
+        # Retry a failed or orphaned job
+        _write_state(state)
+
+    if settings.BLUECOINS_EXPORT_WORKERS:
+        _executor_for_process().submit(_run_in_thread, state, filters, get_watcher())
+    else:
+        _run_label_report(state, filters)
+    return get_job(job_id)
+
+
+def _create_state(state):
+    """
+    Creates the state file if it does not exist. False if another request created it first.
+    """
+    state['updated'] = time.time()
+    try:
+        fd = os.open(state_path(state['id']), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps(state))
+    return True
+
+
+def _run_in_thread(state, filters, watcher):
+    try:
+        if watcher.alias == BLUECOINS_ALIAS:
+            watcher.activate()
+            _run_label_report(state, filters)
+        else:
+            # The backup of the user who requested it (see tenants.py)
+            pool = get_pool()
+            pool.hold(watcher)
+            with pool.serving(watcher):
+                _run_label_report(state, filters)
+    finally:
+        # The thread's connections are not closed by any request
+        connections.close_all()
+
+
+def _run_label_report(state, filters):
+    state.update(status=RUNNING)
+    _write_state(state)
+    last_update = time.monotonic()
+
+    def progress(rows, total):
+        nonlocal last_update
+        state.update(rows=rows, total=total, progress=round(rows / total, 3) if total else 0)
+        if time.monotonic() - last_update >= PROGRESS_INTERVAL:
+            _write_state(state)
+            last_update = time.monotonic()
+
+    path = result_path(state['id'])
+    partial = path.with_name(f'{path.name}.{os.getpid()}.part')
+    started = time.perf_counter()
+    try:
+        # The thread has no request: the sheets are named in the language of the one that started the job
+        with open(partial, 'wb') as f, translation.override(state.get('language')):
+            written = write_label_report(f, filters, progress=progress)
+        if written:
+            os.replace(partial, path)
+        else:
+            partial.unlink()
+        state.update(status=DONE if written else EMPTY, rows=written, progress=1)
+        logger.info("Export %s: %d rows in %.1fs", state['id'], written, time.perf_counter() - started)
+    except Exception as e:
+        partial.unlink(missing_ok=True)
+        state.update(status=FAILED, error=str(e))
+        logger.exception("Export %s failed", state['id'])
+    _write_state(state)
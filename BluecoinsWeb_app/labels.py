@@ -0,0 +1,112 @@
+# bluecoins_app/labels.py
+
+from datetime import timezone
+
+from django.db.models import Count, Max, Min
+from django.utils.dateparse import parse_datetime
+
+from .backups import bluecoins_connection
+from .caching import cached
+from .changes import CHANGES_TABLE
+from .models import Labels_table
+
+LABEL_CATALOG_TABLE = 'web_label_catalog'
+
+# The same rows as the ORM query of _query_label_catalog
+LABEL_CATALOG_SQL = """
+    SELECT l.labelName, COUNT(DISTINCT l.transactionIDLabels), MIN(t.date), MAX(t.date)
+    FROM LABELSTABLE l
+    LEFT JOIN TRANSACTIONSTABLE t ON t.transactionsTableID = l.transactionIDLabels
+    WHERE l.labelName IS NOT NULL AND l.labelName != '' {conditions}
+    GROUP BY l.labelName
+"""
+
+
+def build_label_catalog_table(connection):
+    """
+    Sidecar build step: the label catalog, one row per label name.
+    """
+    connection.execute(f"""
+        CREATE TABLE {LABEL_CATALOG_TABLE} (
+            name TEXT PRIMARY KEY, count INTEGER NOT NULL, first_date TEXT, last_date TEXT
+        ) WITHOUT ROWID
+    """)
+    connection.execute(f'INSERT INTO {LABEL_CATALOG_TABLE} {LABEL_CATALOG_SQL.format(conditions="")}')
+
+
+def update_label_catalog_table(connection):
+    """
+    Sidecar update step: recomputes the labels of the changed transactions, before and after.
+    """
+    connection.execute(f"""
+        CREATE TEMP TABLE web_changed_labels AS
+        SELECT labelName AS name FROM previous.LABELSTABLE WHERE transactionIDLabels IN (SELECT id FROM {CHANGES_TABLE})
+        UNION
+        SELECT labelName FROM main.LABELSTABLE WHERE transactionIDLabels IN (SELECT id FROM {CHANGES_TABLE})
+    """)
+    conditions = 'AND l.labelName IN (SELECT name FROM temp.web_changed_labels)'
+    connection.execute(f'DELETE FROM {LABEL_CATALOG_TABLE} WHERE name IN (SELECT name FROM temp.web_changed_labels)')
+    connection.execute(f'INSERT INTO {LABEL_CATALOG_TABLE} {LABEL_CATALOG_SQL.format(conditions=conditions)}')
+    connection.execute('DROP TABLE temp.web_changed_labels')
+
+
+def _parse_date(value):
+    value = parse_datetime(value) if value else None
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _query_label_catalog():
+    """
+    One grouped pass over LABELSTABLE joined to TRANSACTIONSTABLE.
+    """
+    rows = (Labels_table.objects
+            .exclude(label_name__isnull=True)
+            .exclude(label_name='')
+            .values('label_name')
+            .annotate(count=Count('transaction_id_labels', distinct=True),
+                      first_date=Min('transaction_id_labels__date'),
+                      last_date=Max('transaction_id_labels__date'))
+            .order_by('label_name'))
+    return [
+        {'name': row['label_name'], 'count': row['count'],
+         'first_date': row['first_date'], 'last_date': row['last_date']}
+        for row in rows
+    ]
+
+
+def _build_label_catalog():
+    connection = bluecoins_connection()
+    with connection.cursor() as cursor:
+        if LABEL_CATALOG_TABLE in connection.introspection.table_names(cursor):
+            cursor.execute(f'SELECT name, count, first_date, last_date FROM {LABEL_CATALOG_TABLE} ORDER BY name')
+            return [{'name': name, 'count': count, 'first_date': _parse_date(first_date),
+                     'last_date': _parse_date(last_date)}
+                    for name, count, first_date, last_date in cursor.fetchall()]
+    # Backup without sidecar (still being built, or disabled)
+    return _query_label_catalog()
+
+
+def label_catalog():
+    """
+    Distinct label names, sorted by name, with the number of transactions and
+    the date span of each one:
+        [{'name', 'count', 'first_date', 'last_date'}, ...]
+    Computed once per backup version and then served from the cache.
+    """
+    return cached('label_catalog', (), _build_label_catalog)
+
+
+def label_names():
+    return [label['name'] for label in label_catalog()]
+
+
+def get_label(name):
+    """
+    The catalog entry of label `name`, or None if no transaction has it.
+    """
+    for label in label_catalog():
+        if label['name'] == name:
+            return label
+    return None
@@ -0,0 +1,101 @@
+# bluecoins_app/management/commands/benchmark_connections.py
+
+import multiprocessing
+import sqlite3
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from BluecoinsWeb_app.backups import find_latest_backup
+from BluecoinsWeb_app.db_backend.base import connection_pragmas, database_uri
+
+# The queries of a transactions list request: first page, its labels and a category report
+REQUEST_SQL = [
+    """SELECT t.transactionsTableID, t.date, t.amount, i.itemName, c.childCategoryName, a.accountName
+        FROM TRANSACTIONSTABLE t
+        LEFT JOIN ITEMTABLE i ON i.itemTableID = t.itemID
+        LEFT JOIN CHILDCATEGORYTABLE c ON c.categoryTableID = t.categoryID
+        LEFT JOIN ACCOUNTSTABLE a ON a.accountsTableID = t.accountID
+        ORDER BY t.date DESC, t.transactionsTableID DESC LIMIT 51""",
+    """SELECT transactionIDLabels, labelName FROM LABELSTABLE
+        WHERE transactionIDLabels IN (SELECT transactionsTableID FROM TRANSACTIONSTABLE
+                                      ORDER BY date DESC, transactionsTableID DESC LIMIT 51)""",
+    """SELECT categoryID, SUM(amount), COUNT(*) FROM TRANSACTIONSTABLE
+        WHERE transferGroupID IS NULL GROUP BY categoryID""",
+]
+
+PROFILES = ('default', 'tuned')
+
+
+def _connect(path, profile):
+    if profile == 'tuned':
+        connection = sqlite3.connect(database_uri(path), uri=True, check_same_thread=False)
+        for pragma in connection_pragmas():
+            connection.execute(pragma)
+    else:
+        # What Django's sqlite3 backend does on every request with CONN_MAX_AGE = 0
+        connection = sqlite3.connect(path, check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        connection.execute('PRAGMA foreign_keys = ON')
+        connection.execute('PRAGMA legacy_alter_table = OFF')
+    return connection
+
+
+def run_worker(args):
+    """
+    One gunicorn sync worker: serves `requests` requests one after the other.
+    Returns the latency of each one, in seconds.
+    """
+    path, profile, requests = args
+    persistent = _connect(path, profile) if profile == 'tuned' else None
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection = persistent or _connect(path, profile)
+        for sql in REQUEST_SQL:
+            connection.execute(sql).fetchall()
+        if persistent is None:
+            connection.close()
+        latencies.append(time.perf_counter() - started)
+    if persistent is not None:
+        persistent.close()
+    return latencies
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Compares the per-request latency of the default SQLite connection (a new read-write "
+            "connection per request) with the tuned read-only profile, under several worker processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', nargs='?', help="Path of the .fydb backup or sidecar")
+        parser.add_argument('--workers', type=int, default=3, help="Worker processes (gunicorn --workers)")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per worker")
+
+    def handle(self, *args, **options):
+        backup = options['backup'] or find_latest_backup(settings.BLUECOINS_DB_DIR, settings.BLUECOINS_DB_PATTERN)
+        if not backup:
+            raise CommandError(f"No Bluecoins backup found in {settings.BLUECOINS_DB_DIR}")
+        workers = options['workers']
+        self.stdout.write(f"{backup}: {workers} workers x {options['requests']} requests")
+
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            # Warm the OS page cache, so both profiles read the file from memory
+            pool.map(run_worker, [(backup, 'default', 1)] * workers)
+            for profile in PROFILES:
+                started = time.perf_counter()
+                results = pool.map(run_worker, [(backup, profile, options['requests'])] * workers)
+                elapsed = time.perf_counter() - started
+                latencies = [latency for worker in results for latency in worker]
+                self.stdout.write(
+                    f"{profile:>8}: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+                    f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+                    f"mean {statistics.mean(latencies) * 1000:.2f} ms, "
+                    f"{len(latencies) / elapsed:.0f} requests/s"
+                )
@@ -0,0 +1,191 @@
+# bluecoins_app/management/commands/benchmark_views.py
+
+import json
+import os
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from BluecoinsWeb_app.backups import BLUECOINS_ALIAS, find_latest_backup, get_watcher
+from BluecoinsWeb_app.caching import get_cache
+from BluecoinsWeb_app.sidecar import build_sidecar
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+COMPACT = {'format': 'compact'}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def fetch(client, url, params, headers):
+    """
+    One request, with its body read to the end (streamed responses included).
+    Returns the response and the size of its body.
+    """
+    response = client.get(url, params, **headers)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return response, size
+
+
+class Command(BaseCommand):
+    help = ("Times the main views on a backup (p50/p95 latency, queries, peak memory) "
+            "and stores the results as JSON, to compare them between commits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', nargs='?', help="Backup to benchmark (the newest one by default)")
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per scenario")
+        parser.add_argument('--no-sidecar', action='store_true', help="Read the backup itself, not its sidecar")
+        parser.add_argument('--warm', action='store_true',
+                            help="Keep the response cache between requests (cold by default)")
+        parser.add_argument('--output', help="JSON file (default: benchmarks/results/<commit>.json)")
+        parser.add_argument('--compare', help="Previous JSON results to compare with")
+
+    def scenarios(self):
+        """
+        (name, url, GET params, headers) of every timed request.
+        """
+        with connections[BLUECOINS_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT labelName FROM LABELSTABLE GROUP BY labelName ORDER BY COUNT(*) DESC LIMIT 1')
+            label = (cursor.fetchone() or [''])[0]
+            cursor.execute('SELECT transactionsTableID FROM TRANSACTIONSTABLE ORDER BY date DESC LIMIT 1 OFFSET 100')
+            detail_pk = (cursor.fetchone() or [0])[0]
+            cursor.execute("SELECT MAX(date) FROM TRANSACTIONSTABLE")
+            last = (cursor.fetchone()[0] or '2025-01-01')[:10]
+        year_start = f'{int(last[:4]) - 1}{last[4:8]}15'
+
+        list_url = reverse('transactions_list')
+        page_2, _ = fetch(self.client, list_url, {}, AJAX)
+        cursor_token = json.loads(page_2.content).get('next_cursor') or ''
+        compact_page, _ = fetch(self.client, list_url, COMPACT, AJAX)
+        labels_version = json.loads(compact_page.content).get('labels_version') or ''
+        return [
+            ('list_html', list_url, {}, {}),
+            ('list_ajax', list_url, {}, AJAX),
+            ('list_ajax_page_2', list_url, {'cursor': cursor_token}, AJAX),
+            ('list_compact', list_url, COMPACT, AJAX),
+            # A later page: the browser already has the label names
+            ('list_compact_page_2', list_url, {**COMPACT, 'cursor': cursor_token, 'labels_version': labels_version},
+             AJAX),
+            ('list_label_html', list_url, {'label': label}, {}),
+            ('list_label_ajax', list_url, {'label': label}, AJAX),
+            ('list_search_ajax', list_url, {'q': label}, AJAX),
+            ('category_report', reverse('report_by_category'), {}, {}),
+            ('category_report_range', reverse('report_by_category'), {'start': year_start, 'end': last}, {}),
+            ('month_report', reverse('report_by_month'), {}, {}),
+            ('label_excel', reverse('report_by_label'), {'label': label}, {}),
+            ('detail', reverse('transaction_detail', args=[detail_pk]), {}, {}),
+            ('api_page', reverse('api_transactions'), {'limit': 500}, {}),
+            ('api_label_page', reverse('api_transactions'), {'label': label, 'fields': 'id,date,amount'}, {}),
+        ]
+
+    def run_scenario(self, url, params, headers, repeat, warm):
+        cache = get_cache()
+        connection = connections[BLUECOINS_ALIAS]
+        latencies = []
+        queries = status = size = None
+        for _ in range(repeat):
+            if not warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response, size = fetch(self.client, url, params, headers)
+                latencies.append(time.perf_counter() - started)
+            queries, status = len(captured), response.status_code
+
+        # Peak memory in a separate request: tracemalloc slows the timed ones down
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        fetch(self.client, url, params, headers)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'status': status,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'queries': queries,
+            'bytes': size,
+            'peak_memory_kb': round(peak / 1024),
+        }
+
+    def handle(self, *args, **options):
+        backup = options['backup'] or find_latest_backup(settings.BLUECOINS_DB_DIR, settings.BLUECOINS_DB_PATTERN)
+        if not backup or not os.path.exists(backup):
+            raise CommandError(f"Backup not found: {backup}")
+        database_path = backup if options['no_sidecar'] else build_sidecar(backup)
+        watcher = get_watcher()
+        watcher.pin(backup, database_path)
+        watcher.activate()
+
+        results = {}
+        # Django's test client needs 'testserver' in ALLOWED_HOSTS
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            self.client = Client()
+            scenarios = self.scenarios()
+            for name, url, params, headers in scenarios:
+                results[name] = self.run_scenario(url, params, headers, options['repeat'], options['warm'])
+                result = results[name]
+                self.stdout.write(f"{name:>22}: p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                                  f"{result['queries']:>3} queries  {result['bytes']:>9} bytes  "
+                                  f"{result['peak_memory_kb']:>7} KB  "
+                                  f"[{result['status']}]")
+
+        with connections[BLUECOINS_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE')
+            transactions = cursor.fetchone()[0]
+        commit = git_commit()
+        report = {
+            'commit': commit,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'backup': {'path': str(backup), 'size': os.path.getsize(backup), 'transactions': transactions},
+            'sidecar': not options['no_sidecar'],
+            'warm': options['warm'],
+            'repeat': options['repeat'],
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'results': results,
+        }
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', 'results', f'{commit}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)
+        self.stdout.write(f"Compared with {previous.get('commit')} (p50):")
+        for name, result in results.items():
+            before = previous.get('results', {}).get(name)
+            if not before or not before['p50_ms']:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            line = (f"{name:>22}: {before['p50_ms']:>9.2f} -> {result['p50_ms']:>9.2f} ms ({change:+.0f}%), "
+                    f"queries {before['queries']} -> {result['queries']}")
+            self.stdout.write(self.style.ERROR(line) if change > 20 else line)
@@ -0,0 +1,61 @@
+# bluecoins_app/management/commands/build_sidecar.py
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from BluecoinsWeb_app.backups import find_latest_backup
+from BluecoinsWeb_app.db_backend.base import database_uri
+from BluecoinsWeb_app.sidecar import build_sidecar
+
+# The label filter of TransactionsListView, as SQL
+LABEL_FILTER_SQL = """
+    SELECT t.transactionsTableID FROM TRANSACTIONSTABLE t
+    WHERE t.transactionsTableID IN (SELECT transactionIDLabels FROM LABELSTABLE WHERE labelName = ?)
+    ORDER BY t.date DESC, t.transactionsTableID DESC LIMIT 51
+"""
+
+
+def time_label_filters(path, repeat):
+    """
+    Average seconds to run the label filter once for every label of the database.
+    """
+    connection = sqlite3.connect(database_uri(path, immutable=False), uri=True)
+    try:
+        labels = [row[0] for row in connection.execute('SELECT DISTINCT labelName FROM LABELSTABLE')]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for label in labels:
+                connection.execute(LABEL_FILTER_SQL, (label,)).fetchall()
+        return (time.perf_counter() - started) / repeat
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Builds the indexed sidecar copy of a Bluecoins backup (the newest one by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', nargs='?', help="Path of the .fydb backup")
+        parser.add_argument('--force', action='store_true', help="Rebuild even if the sidecar exists")
+        parser.add_argument('--benchmark', action='store_true',
+                            help="Compare the label filter on the backup and on the sidecar")
+        parser.add_argument('--repeat', type=int, default=20, help="Benchmark repetitions")
+
+    def handle(self, *args, **options):
+        backup = options['backup'] or find_latest_backup(settings.BLUECOINS_DB_DIR, settings.BLUECOINS_DB_PATTERN)
+        if not backup:
+            raise CommandError(f"No Bluecoins backup found in {settings.BLUECOINS_DB_DIR}")
+
+        started = time.monotonic()
+        path = build_sidecar(backup, force=options['force'])
+        self.stdout.write(f"Sidecar of {backup}: {path} ({time.monotonic() - started:.2f}s)")
+
+        if options['benchmark']:
+            before = time_label_filters(backup, options['repeat'])
+            after = time_label_filters(path, options['repeat'])
+            self.stdout.write(f"Label filters on the backup:  {before * 1000:.2f} ms")
+            self.stdout.write(f"Label filters on the sidecar: {after * 1000:.2f} ms")
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {before / after:.1f}x" if after else "Speedup: n/a"))
@@ -0,0 +1,268 @@
+# bluecoins_app/management/commands/generate_backup.py
+
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Tables copied as they are from the template: lookups and Room's metadata
+REFERENCE_TABLES = [
+    'android_metadata', 'room_master_table', 'SETTINGSTABLE', 'ACCOUNTINGGROUPTABLE',
+    'ACCOUNTTYPETABLE', 'CATEGORYGROUPTABLE', 'TRANSACTIONTYPETABLE',
+]
+
+# Rows created by the app itself ("(No Account)", "(New Account)", "Transfer", ...)
+SYSTEM_ROWS = {
+    'ACCOUNTSTABLE': 'accountsTableID <= 0',
+    'PARENTCATEGORYTABLE': 'parentCategoryTableID <= 2',
+    'CHILDCATEGORYTABLE': 'categoryTableID <= 2',
+    'ITEMTABLE': 'itemTableID <= 2',
+}
+
+# Transaction types and category groups of Bluecoins
+NEW_ACCOUNT, EXPENSE, INCOME, TRANSFER = 2, 3, 4, 5
+TRANSFER_GROUP, INCOME_GROUP, EXPENSE_GROUP = 1, 2, 3
+NEW_ACCOUNT_CATEGORY = 2
+
+TRANSACTION_COLUMNS = [
+    'transactionsTableID', 'itemID', 'uidPairID', 'amount', 'transactionCurrency', 'conversionRateNew',
+    'date', 'transactionTypeID', 'categoryID', 'accountID', 'accountPairID', 'notes', 'status',
+    'accountReference', 'deletedTransaction', 'transferGroupID', 'reminderTransaction',
+]
+
+# Rows inserted per executemany() call
+BATCH_SIZE = 10000
+
+
+def copy_schema(template, target):
+    """
+    Creates the tables and indexes of `template` in `target`, with the same SQL.
+    """
+    for sql, in template.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type = 'index'"):
+        target.execute(sql)
+
+
+def copy_rows(template, target, table, where='1'):
+    rows = template.execute(f'SELECT * FROM {table} WHERE {where}').fetchall()
+    if rows:
+        target.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" * len(rows[0]))})', rows)
+
+
+def batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BackupGenerator:
+    """
+    Random Bluecoins data with the shape of a real backup: accounts with an
+    opening balance, expense and income categories in parents and groups,
+    payees, transfers as two legs linked by transferGroupID and uidPairID,
+    and labels with a skewed popularity.
+    """
+
+    def __init__(self, connection, options):
+        self.connection = connection
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.end = datetime(2025, 6, 30, 23, 59, 59)
+        self.start = self.end - timedelta(days=365 * options['years'])
+
+    def next_id(self, table, column):
+        return self.connection.execute(f'SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}').fetchone()[0]
+
+    def create_accounts(self):
+        first = self.next_id('ACCOUNTSTABLE', 'accountsTableID')
+        self.accounts = list(range(first, first + self.options['accounts']))
+        self.connection.executemany(
+            'INSERT INTO ACCOUNTSTABLE (accountsTableID, accountName, accountTypeID, accountHidden, '
+            'accountCurrency, accountConversionRateNew, creditLimit, cutOffDa, creditCardDueDate, '
+            'cashBasedAccounts, accountSelectorVisibility) VALUES (?, ?, ?, 0, ?, 1.0, 0, 1, 1, 1, 0)',
+            [(pk, f'Account {n + 1}', self.random.choice([3, 3, 4, 5, 8]), 'USD')
+             for n, pk in enumerate(self.accounts)])
+
+    def create_categories(self):
+        parents = max(2, self.options['categories'] // 5)
+        parent_id = self.next_id('PARENTCATEGORYTABLE', 'parentCategoryTableID')
+        child_id = self.next_id('CHILDCATEGORYTABLE', 'categoryTableID')
+        self.categories = {EXPENSE: [], INCOME: [], TRANSFER: []}
+        parent_rows, child_rows = [], []
+
+        def add_parent(name, group):
+            nonlocal parent_id
+            parent_rows.append((parent_id, name, 0, 1, group, 0))
+            parent_id += 1
+            return parent_id - 1
+
+        def add_child(name, parent, kind):
+            nonlocal child_id
+            child_rows.append((child_id, name, 0, 0, 3, 'AutoMirrored.Outlined.List', 0, parent))
+            self.categories[kind].append(child_id)
+            child_id += 1
+
+        income_parents = max(1, parents // 5)
+        parent_ids = ([(add_parent(f'Income {n + 1}', INCOME_GROUP), INCOME) for n in range(income_parents)]
+                      + [(add_parent(f'Expense {n + 1}', EXPENSE_GROUP), EXPENSE)
+                         for n in range(parents - income_parents)])
+        for n in range(self.options['categories']):
+            parent, kind = parent_ids[n % len(parent_ids)]
+            add_child(f'Category {n + 1}', parent, kind)
+        add_child('Transfer', add_parent('Transfer', TRANSFER_GROUP), TRANSFER)
+
+        self.connection.executemany(
+            'INSERT INTO PARENTCATEGORYTABLE (parentCategoryTableID, parentCategoryName, '
+            'budgetAmountCategoryParent, budgetEnabledCategoryParent, categoryGroupID, '
+            'budgetPeriodCategoryParent) VALUES (?, ?, ?, ?, ?, ?)', parent_rows)
+        self.connection.executemany(
+            'INSERT INTO CHILDCATEGORYTABLE (categoryTableID, childCategoryName, budgetAmount, '
+            'budgetEnabledCategoryChild, budgetPeriod, childCategoryIcon, categorySelectorVisibility, '
+            'parentCategoryID) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', child_rows)
+
+    def create_items(self):
+        first = self.next_id('ITEMTABLE', 'itemTableID')
+        self.items = list(range(first, first + self.options['items']))
+        self.connection.executemany('INSERT INTO ITEMTABLE (itemTableID, itemName, itemAutoFillVisibility) '
+                                    'VALUES (?, ?, 1)', [(pk, f'Payee {pk}') for pk in self.items])
+
+    def random_date(self):
+        seconds = self.random.randrange(int((self.end - self.start).total_seconds()))
+        return (self.start + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def transactions(self):
+        """
+        Yields the rows of TRANSACTIONSTABLE, in TRANSACTION_COLUMNS order.
+        """
+        rnd = self.random
+        pk = self.next_id('TRANSACTIONSTABLE', 'transactionsTableID')
+        opening = self.start.strftime('%Y-%m-%d %H:%M:%S')
+        for account in self.accounts:
+            yield (pk, 0, None, rnd.randrange(0, 20000) * 1000000, 'USD', 1.0, opening, NEW_ACCOUNT,
+                   NEW_ACCOUNT_CATEGORY, account, account, '', 2, 3, 6, None, 0)
+            pk += 1
+
+        total = self.options['transactions']
+        # A transfer is two rows: draw it with the probability that makes them transfer_ratio of the rows
+        transfer_ratio = self.options['transfer_ratio'] / (2 - self.options['transfer_ratio'])
+        created = len(self.accounts)
+        while created < total:
+            date = self.random_date()
+            kind = rnd.random()
+            if kind < transfer_ratio and created + 2 <= total and len(self.accounts) > 1:
+                source, target = rnd.sample(self.accounts, 2)
+                amount = rnd.randrange(10, 2000) * 1000000
+                category = self.categories[TRANSFER][0]
+                yield (pk, 1, pk + 1, -amount, 'USD', 1.0, date, TRANSFER, category, source, target,
+                       '', 2, 1, 6, pk, 0)
+                yield (pk + 1, 1, pk, amount, 'USD', 1.0, date, TRANSFER, category, target, source,
+                       '', 2, 2, 6, pk, 0)
+                pk += 2
+                created += 2
+                continue
+            if kind < transfer_ratio + (1 - transfer_ratio) * 0.15:
+                tx_type, amount = INCOME, rnd.randrange(500, 5000) * 1000000
+            else:
+                # Log-uniform between 1 and 1000: many small expenses, a few big ones
+                tx_type, amount = EXPENSE, -int(10 ** rnd.uniform(0, 3) * 100) * 10000
+            yield (pk, rnd.choice(self.items), None, amount, 'USD', 1.0, date, tx_type,
+                   rnd.choice(self.categories[tx_type]), rnd.choice(self.accounts), 0,
+                   '', rnd.choice([0, 2]), 3, 6, None, 0)
+            pk += 1
+            created += 1
+
+    def labels(self, first_id, last_id):
+        """
+        Yields (labelName, transactionIDLabels) rows. Label n is picked with a
+        probability proportional to 1/n, like real tags.
+        """
+        names = [f'Label {n + 1}' for n in range(self.options['labels'])]
+        if not names:
+            return
+        weights = list(accumulate(1 / (n + 1) for n in range(len(names))))
+        ratio = self.options['label_ratio']
+        for tx_id in range(first_id, last_id):
+            if self.random.random() < ratio:
+                picked = set(self.random.choices(names, cum_weights=weights, k=self.random.choice([1, 1, 1, 2, 3])))
+                for name in picked:
+                    yield name, tx_id
+
+
+class Command(BaseCommand):
+    help = ("Writes a synthetic Bluecoins backup with the schema of a real one, "
+            "from thousands to millions of transactions, for benchmarks.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the .fydb file to write")
+        parser.add_argument('--transactions', type=int, default=10000)
+        parser.add_argument('--labels', type=int, default=50, help="Distinct label names")
+        parser.add_argument('--label-ratio', type=float, default=0.5,
+                            help="Fraction of the transactions with labels")
+        parser.add_argument('--categories', type=int, default=100, help="Child categories")
+        parser.add_argument('--accounts', type=int, default=10)
+        parser.add_argument('--items', type=int, default=1000, help="Payees (ITEMTABLE rows)")
+        parser.add_argument('--years', type=int, default=10, help="Years of history, ending on 2025-06-30")
+        parser.add_argument('--transfer-ratio', type=float, default=0.1,
+                            help="Fraction of the transactions that are transfers")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--template', default=os.path.join(settings.BASE_DIR, 'databases', 'bluecoins demo.fydb'),
+                            help="Backup whose schema and lookup tables are copied")
+        parser.add_argument('--force', action='store_true', help="Overwrite the output file")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if os.path.exists(output) and not options['force']:
+            raise CommandError(f"{output} already exists (use --force to overwrite it)")
+        if not os.path.exists(options['template']):
+            raise CommandError(f"Template backup not found: {options['template']}")
+
+        started = time.monotonic()
+        tmp_path = f'{output}.{os.getpid()}.tmp'
+        template = sqlite3.connect(f"file:{options['template']}?mode=ro", uri=True)
+        target = sqlite3.connect(tmp_path)
+        try:
+            # A throwaway file: no journal and no fsync
+            target.execute('PRAGMA journal_mode = OFF')
+            target.execute('PRAGMA synchronous = OFF')
+            copy_schema(template, target)
+            for table in REFERENCE_TABLES:
+                copy_rows(template, target, table)
+            for table, where in SYSTEM_ROWS.items():
+                copy_rows(template, target, table, where)
+
+            generator = BackupGenerator(target, options)
+            generator.create_accounts()
+            generator.create_categories()
+            generator.create_items()
+
+            first_id = generator.next_id('TRANSACTIONSTABLE', 'transactionsTableID')
+            insert = (f'INSERT INTO TRANSACTIONSTABLE ({", ".join(TRANSACTION_COLUMNS)}) '
+                      f'VALUES ({", ".join("?" * len(TRANSACTION_COLUMNS))})')
+            for batch in batched(generator.transactions()):
+                target.executemany(insert, batch)
+            last_id = generator.next_id('TRANSACTIONSTABLE', 'transactionsTableID')
+            for batch in batched(generator.labels(first_id, last_id)):
+                target.executemany('INSERT INTO LABELSTABLE (labelName, transactionIDLabels) VALUES (?, ?)', batch)
+            target.commit()
+
+            counts = {table: target.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                      for table in ('TRANSACTIONSTABLE', 'LABELSTABLE', 'CHILDCATEGORYTABLE', 'ACCOUNTSTABLE')}
+        finally:
+            template.close()
+            target.close()
+        os.replace(tmp_path, output)
+
+        self.stdout.write(', '.join(f'{table}: {count}' for table, count in counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"{output}: {os.path.getsize(output) / 1024 / 1024:.1f} MB in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,50 @@
+# bluecoins_app/management/commands/ingest_backup.py
+
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from BluecoinsWeb_app.ingest import UPLOAD_CHUNK_SIZE, InvalidBackup, ingest_backup, warm_up
+from BluecoinsWeb_app.models import UserBackup
+
+
+class Command(BaseCommand):
+    help = ("Checks a Bluecoins backup, copies it into the backups directory and makes it the active one "
+            "(see BluecoinsWeb_app/ingest.py).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', help="Path of the .fydb backup, or - to read it from stdin")
+        parser.add_argument('--user', help="Copy it into the backups directory of this user (BLUECOINS_TENANTS)")
+        parser.add_argument('--max-bytes', type=int, help="Size limit (BLUECOINS_UPLOAD_MAX_BYTES by default)")
+        parser.add_argument('--no-warmup', action='store_true',
+                            help="Do not compute the rollups, label catalog and balances afterwards")
+
+    def handle(self, *args, **options):
+        user_backup = None
+        if options['user']:
+            try:
+                user_backup = UserBackup.objects.get(user__username=options['user'])
+            except UserBackup.DoesNotExist:
+                if not get_user_model().objects.filter(username=options['user']).exists():
+                    raise CommandError(f"Unknown user {options['user']}")
+                raise CommandError(f"No backups directory registered for {options['user']}")
+        directory = user_backup.directory if user_backup else settings.BLUECOINS_DB_DIR
+
+        try:
+            source = sys.stdin.buffer if options['backup'] == '-' else open(options['backup'], 'rb')
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['backup']}: {e}")
+        with source:
+            try:
+                result = ingest_backup(iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''), directory,
+                                       max_bytes=options['max_bytes'])
+            except InvalidBackup as e:
+                raise CommandError(f"Rejected {options['backup']}: {e}")
+        self.stdout.write(f"{result['path']}: {result['size']} bytes, {result['transactions']} transactions "
+                          f"({result['seconds']:.2f}s)")
+
+        if not options['no_warmup']:
+            warm_up(user_backup)
+            self.stdout.write(self.style.SUCCESS("Active backup warmed up"))
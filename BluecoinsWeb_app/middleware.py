@@ -0,0 +1,192 @@
+# bluecoins_app/middleware.py
+
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.urls import Resolver404, resolve, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.generic.edit import FormMixin
+
+from .backups import get_watcher
+from .caching import request_validators
+from .instrumentation import RequestMetrics, current_metrics
+from .models import UserBackup
+from .tenants import NoBackup, get_pool
+
+request_logger = logging.getLogger('BluecoinsWeb_app.requests')
+
+
+class BackupWatcherMiddleware:
+    """
+    Picks up new Bluecoins backups without restarting the workers. The check
+    itself is rate-limited by BLUECOINS_DB_CHECK_INTERVAL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        watcher = get_watcher()
+        watcher.check()
+        watcher.activate()
+        return self.get_response(request)
+
+
+class TenantMiddleware:
+    """
+    Serves every user their own backups (BLUECOINS_TENANTS, see tenants.py):
+    the Bluecoins models, raw SQL and cache keys of the request use the alias
+    of the user's UserBackup. Anonymous users are sent to the login page and
+    users without a registered backup get a 403. BLUECOINS_TENANT_EXEMPT paths
+    (the admin and the login page) are left alone. The upload page is also
+    reachable before the user's directory has any backup; the UserBackup is
+    set as `request.user_backup` for it.
+    """
+
+    def __init__(self, get_response):
+        if not settings.BLUECOINS_TENANTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.exempt = tuple(settings.BLUECOINS_TENANT_EXEMPT)
+
+    def __call__(self, request):
+        pool = get_pool()
+        pool.close_stale_connections()
+        if request.path.startswith(self.exempt):
+            return self.get_response(request)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        try:
+            request.user_backup = UserBackup.objects.get(user=request.user)
+            watcher = pool.acquire(request.user_backup)
+        except UserBackup.DoesNotExist:
+            raise PermissionDenied("No Bluecoins backup registered for this user") from None
+        except NoBackup as e:
+            if request.path == reverse('upload_backup'):
+                return self.get_response(request)
+            raise Http404(str(e))
+
+        with pool.serving(watcher), ExitStack() as stack:
+            watcher.check()
+            watcher.activate()
+            # InstrumentationMiddleware only wraps the aliases that existed when the request started
+            connection = connections[watcher.alias]
+            metrics = current_metrics()
+            if metrics is not None and metrics not in connection.execute_wrappers:
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+            if response.streaming and not isinstance(response, FileResponse):
+                response.streaming_content = pool.stream(watcher, response.streaming_content)
+        return response
+
+
+class ConditionalGetMiddleware:
+    """
+    Conditional GET for every page: the data only changes with the backup, so
+    the ETag and Last-Modified of a response are known before the view runs
+    (see caching.request_validators). A request whose If-None-Match or
+    If-Modified-Since still matches gets a 304 Not Modified without any query.
+
+    Successful responses are sent with `Cache-Control: no-cache`, so browsers
+    revalidate on every visit, and `X-Accel-Expires`, so nginx's proxy cache
+    serves repeat hits for BLUECOINS_PROXY_CACHE_SECONDS without reaching
+    gunicorn. Responses that set cookies and BLUECOINS_CONDITIONAL_GET_EXEMPT
+    paths are left alone, and so are pages with a CSRF token: form views are
+    known before they run, any other page once it has used the token. The CSRF
+    cookie itself is only set later, by CsrfViewMiddleware's process_response.
+    """
+
+    def __init__(self, get_response):
+        if not settings.BLUECOINS_CONDITIONAL_GET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.exempt = tuple(settings.BLUECOINS_CONDITIONAL_GET_EXEMPT)
+        self.proxy_cache_seconds = settings.BLUECOINS_PROXY_CACHE_SECONDS
+
+    def __call__(self, request):
+        if (request.method not in ('GET', 'HEAD') or request.path.startswith(self.exempt)
+                or self.renders_form(request)):
+            return self.get_response(request)
+
+        etag, last_modified = request_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.get_response(request)
+            if response.status_code != 200 or response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                return response
+            if self.proxy_cache_seconds:
+                response['X-Accel-Expires'] = str(self.proxy_cache_seconds)
+        response.setdefault('ETag', etag)
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('X-Requested-With', 'Accept'))
+        return response
+
+    @staticmethod
+    def renders_form(request):
+        """
+        Whether the request goes to a form view, whose page embeds a CSRF token.
+        """
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        view_class = getattr(match.func, 'view_class', None)
+        return view_class is not None and issubclass(view_class, FormMixin)
+
+
+class InstrumentationMiddleware:
+    """
+    Measures every request: total time, SQL queries and time per database alias,
+    the slowest statements and the template render time (see instrumentation.py).
+
+    The metrics are sent in a Server-Timing header and logged as one JSON line by
+    the BluecoinsWeb_app.requests logger: at DEBUG level, or at WARNING when the
+    request is slower than BLUECOINS_SLOW_REQUEST_MS or repeats a statement more
+    than BLUECOINS_N_PLUS_ONE_THRESHOLD times.
+    """
+
+    def __init__(self, get_response):
+        if not settings.BLUECOINS_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request = settings.BLUECOINS_SLOW_REQUEST_MS / 1000
+        self.n_plus_one = settings.BLUECOINS_N_PLUS_ONE_THRESHOLD
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = metrics.activate()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+
+        response['Server-Timing'] = metrics.server_timing()
+        self.log(request, response, metrics)
+        return response
+
+    def log(self, request, response, metrics):
+        repeated = metrics.repeated_statements(self.n_plus_one)
+        slow = metrics.elapsed() > self.slow_request
+        level = logging.WARNING if slow or repeated else logging.DEBUG
+        if not request_logger.isEnabledFor(level):
+            return
+        record = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'slow': slow,
+            **metrics.as_dict(),
+            'repeated': repeated,
+        }
+        request_logger.log(level, json.dumps(record))
@@ -0,0 +1,298 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account_type_table',
+            fields=[
+                ('account_type_table_id', models.AutoField(db_column='accountTypeTableID', primary_key=True, serialize=False)),
+                ('account_type_name', models.TextField(blank=True, db_column='accountTypeName', null=True)),
+                ('accounting_group_id', models.IntegerField(blank=True, db_column='accountingGroupID', null=True)),
+            ],
+            options={
+                'db_table': 'ACCOUNTTYPETABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Accounting_group_table',
+            fields=[
+                ('accounting_group_table_id', models.AutoField(db_column='accountingGroupTableID', primary_key=True, serialize=False)),
+                ('account_group_name', models.TextField(blank=True, db_column='accountGroupName', null=True)),
+            ],
+            options={
+                'db_table': 'ACCOUNTINGGROUPTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Accounts_table',
+            fields=[
+                ('accounts_table_id', models.AutoField(db_column='accountsTableID', primary_key=True, serialize=False)),
+                ('account_name', models.TextField(blank=True, db_column='accountName', null=True)),
+                ('account_hidden', models.IntegerField(blank=True, db_column='accountHidden', null=True)),
+                ('account_currency', models.TextField(blank=True, db_column='accountCurrency', null=True)),
+                ('account_conversion_rate_new', models.FloatField(blank=True, db_column='accountConversionRateNew', null=True)),
+                ('credit_limit', models.IntegerField(blank=True, db_column='creditLimit', null=True)),
+                ('cut_off_da', models.IntegerField(blank=True, db_column='cutOffDa', null=True)),
+                ('credit_card_due_date', models.IntegerField(blank=True, db_column='creditCardDueDate', null=True)),
+                ('cash_based_accounts', models.IntegerField(blank=True, db_column='cashBasedAccounts', null=True)),
+                ('account_selector_visibility', models.IntegerField(blank=True, db_column='accountSelectorVisibility', null=True)),
+                ('currency_changed', models.IntegerField(blank=True, db_column='currencyChanged', null=True)),
+                ('accounts_extra_column_int1', models.IntegerField(blank=True, db_column='accountsExtraColumnInt1', null=True)),
+                ('accounts_extra_column_int2', models.IntegerField(blank=True, db_column='accountsExtraColumnInt2', null=True)),
+                ('accounts_extra_column_string1', models.TextField(blank=True, db_column='accountsExtraColumnString1', null=True)),
+                ('accounts_extra_column_string2', models.TextField(blank=True, db_column='accountsExtraColumnString2', null=True)),
+            ],
+            options={
+                'db_table': 'ACCOUNTSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AndroidMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('locale', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'android_metadata',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Category_group_table',
+            fields=[
+                ('category_group_table_id', models.AutoField(db_column='categoryGroupTableID', primary_key=True, serialize=False)),
+                ('category_group_name', models.TextField(blank=True, db_column='categoryGroupName', null=True)),
+            ],
+            options={
+                'db_table': 'CATEGORYGROUPTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Child_category_table',
+            fields=[
+                ('category_table_id', models.AutoField(db_column='categoryTableID', primary_key=True, serialize=False)),
+                ('child_category_name', models.TextField(blank=True, db_column='childCategoryName', null=True)),
+                ('budget_amount', models.IntegerField(blank=True, db_column='budgetAmount', null=True)),
+                ('budget_custom_setup', models.TextField(blank=True, db_column='budgetCustomSetup', null=True)),
+                ('budget_enabled_category_child', models.IntegerField(blank=True, db_column='budgetEnabledCategoryChild', null=True)),
+                ('budget_period', models.IntegerField(blank=True, db_column='budgetPeriod', null=True)),
+                ('child_category_icon', models.TextField(blank=True, db_column='childCategoryIcon', null=True)),
+                ('category_selector_visibility', models.IntegerField(blank=True, db_column='categorySelectorVisibility', null=True)),
+                ('category_extra_column_int1', models.IntegerField(blank=True, db_column='categoryExtraColumnInt1', null=True)),
+                ('category_extra_column_int2', models.IntegerField(blank=True, db_column='categoryExtraColumnInt2', null=True)),
+                ('category_extra_column_string1', models.TextField(blank=True, db_column='categoryExtraColumnString1', null=True)),
+                ('category_extra_column_string2', models.TextField(blank=True, db_column='categoryExtraColumnString2', null=True)),
+            ],
+            options={
+                'db_table': 'CHILDCATEGORYTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Filter_stable',
+            fields=[
+                ('filter_stable_id', models.AutoField(db_column='filtersTableID', primary_key=True, serialize=False)),
+                ('filtername', models.TextField(blank=True, null=True)),
+                ('filter_json', models.TextField(blank=True, db_column='filterJSON', null=True)),
+            ],
+            options={
+                'db_table': 'FILTERSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Item_table',
+            fields=[
+                ('item_table_id', models.AutoField(db_column='itemTableID', primary_key=True, serialize=False)),
+                ('item_name', models.TextField(blank=True, db_column='itemName', null=True)),
+                ('item_auto_fill_visibility', models.IntegerField(blank=True, db_column='itemAutoFillVisibility', null=True)),
+            ],
+            options={
+                'db_table': 'ITEMTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Labels_table',
+            fields=[
+                ('labels_table_id', models.AutoField(db_column='labelsTableID', primary_key=True, serialize=False)),
+                ('label_name', models.TextField(blank=True, db_column='labelName', null=True)),
+            ],
+            options={
+                'db_table': 'LABELSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification_table',
+            fields=[
+                ('sms_table_id', models.AutoField(db_column='smsTableID', primary_key=True, serialize=False)),
+                ('notification_package_name', models.TextField(blank=True, db_column='notificationPackageName', null=True)),
+                ('notification_app_name', models.TextField(blank=True, db_column='notificationAppName', null=True)),
+                ('notification_default_name', models.TextField(blank=True, db_column='notificationDefaultName', null=True)),
+                ('notification_sender_account_id', models.IntegerField(blank=True, db_column='notificationSenderAccountID', null=True)),
+                ('notification_sender_category_id', models.IntegerField(blank=True, db_column='notificationSenderCategoryID', null=True)),
+                ('notification_sender_amount_order', models.IntegerField(blank=True, db_column='notificationSenderAmountOrder', null=True)),
+            ],
+            options={
+                'db_table': 'NOTIFICATIONTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Parent_category_table',
+            fields=[
+                ('parent_category_table_id', models.AutoField(db_column='parentCategoryTableID', primary_key=True, serialize=False)),
+                ('parent_category_name', models.TextField(blank=True, db_column='parentCategoryName', null=True)),
+                ('budget_amount_category_parent', models.IntegerField(blank=True, db_column='budgetAmountCategoryParent', null=True)),
+                ('budget_enabled_category_parent', models.IntegerField(blank=True, db_column='budgetEnabledCategoryParent', null=True)),
+                ('budget_period_category_parent', models.IntegerField(blank=True, db_column='budgetPeriodCategoryParent', null=True)),
+                ('budget_custom_setup_parent', models.TextField(blank=True, db_column='budgetCustomSetupParent', null=True)),
+                ('category_parent_extra_column_int1', models.IntegerField(blank=True, db_column='categoryParentExtraColumnInt1', null=True)),
+                ('category_parent_extra_column_int2', models.IntegerField(blank=True, db_column='categoryParentExtraColumnInt2', null=True)),
+                ('category_parent_extra_column_string1', models.TextField(blank=True, db_column='categoryParentExtraColumnString1', null=True)),
+                ('category_parent_extra_column_string2', models.TextField(blank=True, db_column='categoryParentExtraColumnString2', null=True)),
+            ],
+            options={
+                'db_table': 'PARENTCATEGORYTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Picture_table',
+            fields=[
+                ('picture_table_id', models.AutoField(db_column='pictureTableID', primary_key=True, serialize=False)),
+                ('picture_file_name', models.TextField(blank=True, db_column='pictureFileName', null=True)),
+            ],
+            options={
+                'db_table': 'PICTURETABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomMasterTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identity_hash', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'room_master_table',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Settings_table',
+            fields=[
+                ('settings_table_id', models.AutoField(db_column='settingsTableID', primary_key=True, serialize=False)),
+                ('default_settings', models.TextField(blank=True, db_column='defaultSettings', null=True)),
+            ],
+            options={
+                'db_table': 'SETTINGSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Smss_table',
+            fields=[
+                ('sms_table_id', models.AutoField(db_column='smsTableID', primary_key=True, serialize=False)),
+                ('sender_name', models.TextField(blank=True, db_column='senderName', null=True)),
+                ('sender_default_name', models.TextField(blank=True, db_column='senderDefaultName', null=True)),
+                ('sender_account_id', models.IntegerField(blank=True, db_column='senderAccountID', null=True)),
+                ('sender_category_id', models.IntegerField(blank=True, db_column='senderCategoryID', null=True)),
+                ('sender_amount_order', models.IntegerField(blank=True, db_column='senderAmountOrder', null=True)),
+            ],
+            options={
+                'db_table': 'SMSSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Tracking_table',
+            fields=[
+                ('tracking_table_id', models.AutoField(db_column='trackingTableID', primary_key=True, serialize=False)),
+                ('tracking_name', models.TextField(blank=True, db_column='trackingName', null=True)),
+            ],
+            options={
+                'db_table': 'TRACKINGTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction_type_table',
+            fields=[
+                ('transaction_type_table_id', models.AutoField(db_column='transactionTypeTableID', primary_key=True, serialize=False)),
+                ('transaction_type_name', models.TextField(blank=True, db_column='transactionTypeName', null=True)),
+            ],
+            options={
+                'db_table': 'TRANSACTIONTYPETABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Transactions_table',
+            fields=[
+                ('transactions_table_id', models.AutoField(db_column='transactionsTableID', primary_key=True, serialize=False)),
+                ('amount', models.IntegerField(blank=True, null=True)),
+                ('transaction_currency', models.TextField(blank=True, db_column='transactionCurrency', null=True)),
+                ('conversion_rate_new', models.FloatField(blank=True, db_column='conversionRateNew', null=True)),
+                ('date', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('status', models.IntegerField(blank=True, null=True)),
+                ('account_reference', models.IntegerField(blank=True, db_column='accountReference', null=True)),
+                ('account_pair_id', models.IntegerField(blank=True, db_column='accountPairID', null=True)),
+                ('uid_pair_id', models.IntegerField(blank=True, db_column='uidPairID', null=True)),
+                ('deleted_transaction', models.IntegerField(blank=True, db_column='deletedTransaction', null=True)),
+                ('new_split_transaction_id', models.IntegerField(blank=True, db_column='newSplitTransactionID', null=True)),
+                ('transfer_group_id', models.IntegerField(blank=True, db_column='transferGroupID', null=True)),
+                ('reminder_transaction', models.IntegerField(blank=True, db_column='reminderTransaction', null=True)),
+                ('reminder_group_id', models.IntegerField(blank=True, db_column='reminderGroupID', null=True)),
+                ('reminder_frequency', models.IntegerField(blank=True, db_column='reminderFrequency', null=True)),
+                ('reminder_repeat_every', models.IntegerField(blank=True, db_column='reminderRepeatEvery', null=True)),
+                ('reminder_ending_type', models.IntegerField(blank=True, db_column='reminderEndingType', null=True)),
+                ('reminder_start_date', models.TextField(blank=True, db_column='reminderStartDate', null=True)),
+                ('reminder_end_date', models.TextField(blank=True, db_column='reminderEndDate', null=True)),
+                ('reminder_after_no_of_occurences', models.IntegerField(blank=True, db_column='reminderAfterNoOfOccurences', null=True)),
+                ('reminder_automatic_log_transaction', models.IntegerField(blank=True, db_column='reminderAutomaticLogTransaction', null=True)),
+                ('reminder_repeat_by_day_of_month', models.IntegerField(blank=True, db_column='reminderRepeatByDayOfMonth', null=True)),
+                ('reminder_exclude_weekend', models.IntegerField(blank=True, db_column='reminderExcludeWeekend', null=True)),
+                ('reminder_week_day_move_setting', models.IntegerField(blank=True, db_column='reminderWeekDayMoveSetting', null=True)),
+                ('reminder_unbilled', models.IntegerField(blank=True, db_column='reminderUnbilled', null=True)),
+                ('credit_card_installment', models.IntegerField(blank=True, db_column='creditCardInstallment', null=True)),
+                ('reminder_version', models.IntegerField(blank=True, db_column='reminderVersion', null=True)),
+                ('data_extra_column_string1', models.TextField(blank=True, db_column='dataExtraColumnString1', null=True)),
+            ],
+            options={
+                'db_table': 'TRANSACTIONSTABLE',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserBackup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('directory', models.CharField(help_text="Directory with the user's bluecoins*.fydb backups; the newest one is served.", max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bluecoins_backup', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'user backup',
+            },
+        ),
+    ]
@@ -7,6 +7,7 @@
 # Feel free to rename the models, but don't rename db_table values or field names.
 
 
+from django.conf import settings
 from django.db import models
 
 # Default values for the foreign keys
@@ -187,6 +188,27 @@ class Transaction_type_table(models.Model):
         #return f'({self.transaction_type_table_id}) - {self.transaction_type_name}'  # To display the account name in the view
         return f'{self.transaction_type_name}'
     
+class TransactionsQuerySet(models.QuerySet):
+    """
+    Reusable filters for TRANSACTIONSTABLE that run in SQL.
+    """
+
+    def exclude_transfer_mirrors(self):
+        """
+        Keeps one leg per transfer. Bluecoins stores a transfer as two rows that
+        share transferGroupID and point at each other through uidPairID and
+        accountPairID: a negative row in the source account and a positive mirror
+        row in the destination account. The positive mirror is excluded.
+        """
+        return self.exclude(transfer_group_id__isnull=False, uid_pair_id__isnull=False, amount__gt=0)
+
+    def exclude_transfers(self):
+        """
+        Excludes both legs of every transfer (for income/expense totals).
+        """
+        return self.filter(transfer_group_id__isnull=True)
+
+
 class Transactions_table(models.Model):
     transactions_table_id = models.AutoField(db_column='transactionsTableID', primary_key=True)  # Field name made lowercase.
     item_id = models.ForeignKey(Item_table, on_delete=models.SET_NULL, null= True, db_column= 'itemID')  # Field name made lowercase.
@@ -222,6 +244,8 @@ class Transactions_table(models.Model):
     reminder_version = models.IntegerField(db_column='reminderVersion', blank=True, null=True)  # Field name made lowercase.
     data_extra_column_string1 = models.TextField(db_column='dataExtraColumnString1', blank=True, null=True)  # Field name made lowercase.
 
+    objects = TransactionsQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'TRANSACTIONSTABLE'
@@ -265,3 +289,26 @@ class RoomMasterTable(models.Model):
     class Meta:
         managed = False
         db_table = 'room_master_table'
+
+
+class UserBackup(models.Model):
+    """
+    Registry of the users' backups for BLUECOINS_TENANTS (see tenants.py). Unlike
+    the tables above it is managed by Django and lives in the default database.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bluecoins_backup')
+    directory = models.CharField(max_length=500, help_text="Directory with the user's bluecoins*.fydb backups; "
+                                                           "the newest one is served.")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'user backup'
+
+    def __str__(self):
+        return f'{self.user} - {self.directory}'
+
+    @property
+    def alias(self):
+        """Database alias of the user's backups."""
+        return f'bluecoins_{self.pk}'
@@ -0,0 +1,154 @@
+# bluecoins_app/pagination.py
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# Largest offset of a search cursor: OFFSET and LIMIT must stay SQLite integers
+MAX_OFFSET = 2 ** 31 - 1
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded."""
+
+
+def encode_cursor(date, pk):
+    """
+    Encodes the (date, transactionsTableID) keyset position into an opaque token.
+    """
+    payload = {'d': date.isoformat() if date else None, 'i': pk}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decodes a token created by encode_cursor() into a (date, pk) tuple.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        pk = int(payload['i'])
+        date = parse_datetime(payload['d']) if payload['d'] else None
+    except (ValueError, TypeError, KeyError, AttributeError) as exc:
+        raise InvalidCursor(f"Invalid cursor: {token!r}") from exc
+    if payload['d'] and date is None:
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+    return date, pk
+
+
+def encode_offset_cursor(offset):
+    """
+    Encodes a position in a ranked list (search results) into an opaque token.
+    """
+    raw = json.dumps({'o': offset}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_offset_cursor(token):
+    """
+    Decodes a token created by encode_offset_cursor(); an empty token is the start.
+    """
+    if not token:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        offset = int(json.loads(raw)['o'])
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor(f"Invalid cursor: {token!r}") from exc
+    if not 0 <= offset <= MAX_OFFSET:
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+    return offset
+
+
+class KeysetPage:
+    """
+    A page of a keyset-paginated queryset. It mimics the parts of Django's Page
+    API that the templates and views use, but it never knows the total count.
+    """
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return False
+
+    def has_other_pages(self):
+        return self.has_next()
+
+
+def _unfiltered(queryset):
+    return queryset
+
+
+def rows_after(queryset, cursor, limit, date_field='date', pk_field='pk', filters=None):
+    """
+    The first `limit` rows of `queryset` after `cursor` in (-date, -pk) order
+    (from the start without a cursor), with `filters` (a function that adds the
+    caller's WHERE clauses to a queryset, e.g. TransactionFilter.apply) applied.
+
+    Dated rows are read with a range of the date index that starts at the cursor
+    (`date <= cursor date`), so every page costs the same at any depth and with
+    any date filter: the cursor's bound is filtered before `filters`, and of
+    several bounds on the same indexed column SQLite uses the first one. SQLite
+    sorts NULL dates last in descending order, so the undated rows form the
+    tail, read by a second query once the dated ones run out.
+    """
+    filters = filters or _unfiltered
+    queryset = queryset.order_by(f'-{date_field}', f'-{pk_field}')
+    if not cursor:
+        return list(filters(queryset)[:limit])
+    date, pk = decode_cursor(cursor)
+    undated = filters(queryset.filter(**{f'{date_field}__isnull': True}))
+    if date is None:
+        return list(undated.filter(**{f'{pk_field}__lt': pk})[:limit])
+    dated = queryset.filter(Q(**{f'{date_field}__lt': date}) | Q(**{f'{pk_field}__lt': pk}),
+                            **{f'{date_field}__lte': date})
+    rows = list(filters(dated)[:limit])
+    if len(rows) < limit:
+        rows.extend(undated[:limit - len(rows)])
+    return rows
+
+
+def paginate_by_date(queryset, cursor, per_page, date_field='date', pk_field='pk', filters=None):
+    """
+    Returns the KeysetPage that follows `cursor` for a queryset ordered by
+    (-date, -pk), with `filters` applied. Every page costs the same (see
+    rows_after) and no COUNT(*) is needed.
+    """
+    # Fetch one extra row to know whether there is another page
+    rows = rows_after(queryset, cursor, per_page + 1, date_field, pk_field, filters)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), getattr(last, 'pk'))
+    return KeysetPage(rows, next_cursor)
+
+
+def paginate_ranked(queryset, ids, offset, per_page, pk_field='pk'):
+    """
+    KeysetPage of the rows of `queryset` with the given `ids`, in that order.
+    `ids` is the ranked slice that starts at `offset`, with one extra ID when
+    there is another page.
+    """
+    has_more = len(ids) > per_page
+    ids = ids[:per_page]
+    position = {pk: n for n, pk in enumerate(ids)}
+    rows = sorted(queryset.filter(**{f'{pk_field}__in': ids}), key=lambda row: position[row.pk])
+    return KeysetPage(rows, encode_offset_cursor(offset + per_page) if has_more else None)
@@ -0,0 +1,182 @@
+# bluecoins_app/reports.py
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+
+from .analytics import get_store
+from .models import Child_category_table
+from .rollups import rollups_for_range
+
+# IDs and micro-unit amounts are SQLite INTEGERs: signed 64-bit
+SQLITE_INTEGER_MIN, SQLITE_INTEGER_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def parse_report_date(value):
+    """
+    Parses a YYYY-MM-DD query parameter. Returns None if it is empty or invalid.
+    """
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_report_filters(request):
+    """
+    Optional GET filters of the reports: start and end (YYYY-MM-DD, inclusive),
+    account (ID) and label (name).
+    """
+    start = parse_report_date(request.GET.get('start'))
+    end = parse_report_date(request.GET.get('end'))
+    account = request.GET.get('account')
+    account = int(account) if account and account.lstrip('-').isdigit() else None
+    if account is not None and not SQLITE_INTEGER_MIN <= account <= SQLITE_INTEGER_MAX:
+        account = None
+    label = request.GET.get('label') or None
+    return start, end, account, label
+
+
+def filter_transactions(queryset, start=None, end=None, account=None):
+    """
+    Applies the optional report filters. `end` is inclusive.
+    """
+    if start:
+        queryset = queryset.filter(date__gte=make_aware(datetime.combine(start, time.min)))
+    # date.max has no next day: every date is before its end
+    if end and end < date.max:
+        queryset = queryset.filter(date__lt=make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    if account:
+        queryset = queryset.filter(account_id=account)
+    return queryset
+
+
+def use_column_store(label=None):
+    """
+    Whether a report is computed from the columnar store (analytics.py) rather
+    than the monthly rollups: with BLUECOINS_ANALYTICS = 'columnar', and always for
+    label filters, which the rollups cannot answer.
+    """
+    return label is not None or settings.BLUECOINS_ANALYTICS == 'columnar'
+
+
+def category_totals(start=None, end=None, account=None, label=None):
+    """
+    {category_id: (total_amount, count)} of the transactions in the range,
+    from the monthly rollups or the columnar store.
+    """
+    if use_column_store(label):
+        store = get_store()
+        groups = store.group_by_category(store.select(start, end, account, label))
+        return {category_id: (income + expense, count) for category_id, (income, expense, count) in groups.items()}
+
+    totals = defaultdict(lambda: [0, 0])
+    for row in rollups_for_range(start, end, account):
+        total = totals[row.category_id]
+        total[0] += row.income + row.expense
+        total[1] += row.count
+    return {category_id: tuple(total) for category_id, total in totals.items()}
+
+
+def category_report(start=None, end=None, account=None, label=None):
+    """
+    Totals by child category with parent and group subtotals, transfers excluded.
+
+    The totals are summed from the monthly rollups (see rollups.py), or from the
+    columnar store for a label (see analytics.py), and one query
+    reads the names of the categories, their parents and groups. The rollups are
+    then built in a single pass (one row per category, not per transaction).
+    Returns a list of groups, each one with its parents and their children:
+        [{'name', 'total_amount', 'formatted_amount', 'count', 'parents': [{..., 'children': [...]}]}]
+    """
+    totals = category_totals(start, end, account, label)
+    if not totals:
+        return []
+    categories = {
+        row['category_table_id']: row
+        for row in Child_category_table.objects
+        .filter(category_table_id__in=[pk for pk in totals if pk is not None])
+        .values('category_table_id',
+                'child_category_name',
+                'parent_category_id',
+                'parent_category_id__parent_category_name',
+                'parent_category_id__category_group_id',
+                'parent_category_id__category_group_id__category_group_name')
+    }
+
+    groups = {}
+    for category_id, (total_amount, count) in totals.items():
+        # Transactions of a deleted category are reported as "Unknown"
+        row = categories.get(category_id, {})
+
+        group_id = row.get('parent_category_id__category_group_id')
+        group = groups.setdefault(group_id, {
+            'id': group_id,
+            'name': row.get('parent_category_id__category_group_id__category_group_name') or "Unknown",
+            'total_amount': 0, 'count': 0, 'parents': {},
+        })
+        parent_id = row.get('parent_category_id')
+        parent = group['parents'].setdefault(parent_id, {
+            'id': parent_id,
+            'name': row.get('parent_category_id__parent_category_name') or "Unknown",
+            'total_amount': 0, 'count': 0, 'children': [],
+        })
+        parent['children'].append({
+            'id': category_id,
+            'name': row.get('child_category_name') or "Unknown",
+            'total_amount': total_amount,
+            'count': count,
+        })
+        for node in (group, parent):
+            node['total_amount'] += total_amount
+            node['count'] += count
+
+    by_total = itemgetter('total_amount')
+    report = sorted(groups.values(), key=by_total, reverse=True)
+    for group in report:
+        group['parents'] = sorted(group['parents'].values(), key=by_total, reverse=True)
+        for parent in group['parents']:
+            parent['children'].sort(key=by_total, reverse=True)
+            for node in (group, parent, *parent['children']):
+                # Amounts are stored in micro-units
+                node['formatted_amount'] = node['total_amount'] / 1000000
+    return report
+
+
+def monthly_report(start=None, end=None, account=None, label=None):
+    """
+    Income, expense, net and number of transactions per month, oldest first,
+    transfers excluded. Summed from the monthly rollups without any query
+    once they are loaded, except for the partial months at the edges of the range,
+    or from the columnar store (see use_column_store()).
+        [{'month': date, 'income', 'expense', 'net', 'count', 'formatted_income', ...}]
+    """
+    months = defaultdict(lambda: {'income': 0, 'expense': 0, 'count': 0})
+    if use_column_store(label):
+        store = get_store()
+        for key, (income, expense, count) in store.group_by_month(store.select(start, end, account, label)).items():
+            months[key].update(income=income, expense=expense, count=count)
+    else:
+        for row in rollups_for_range(start, end, account):
+            if row.month is None:
+                continue
+            month = months[row.month]
+            month['income'] += row.income
+            month['expense'] += row.expense
+            month['count'] += row.count
+
+    report = []
+    for key in sorted(months):
+        month = months[key]
+        year, number = map(int, key.split('-'))
+        month['month'] = date(year, number, 1)
+        month['net'] = month['income'] + month['expense']
+        for field in ('income', 'expense', 'net'):
+            # Amounts are stored in micro-units
+            month[f'formatted_{field}'] = month[field] / 1000000
+        report.append(month)
+    return report
@@ -0,0 +1,189 @@
+# bluecoins_app/rollups.py
+"""
+Monthly rollups: TRANSACTIONSTABLE pre-aggregated by month, category, account
+and transaction type, with transfers excluded.
+
+The sidecar of each backup gets a web_monthly_rollup table (see sidecar.py);
+without a sidecar the same rows are computed with one grouped query. Either
+way they are loaded once per backup into the cache, so a report over any date
+range sums a few hundred rollup rows, plus the raw rows of the partial months
+at the edges of the range.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+
+from .backups import bluecoins_connection
+from .caching import cached
+from .changes import CHANGES_TABLE
+
+ROLLUP_TABLE = 'web_monthly_rollup'
+
+# income and expense are sums of the positive and negative amounts, in micro-units
+Rollup = namedtuple('Rollup', 'month category_id account_id transaction_type_id income expense count')
+
+ROLLUP_SQL = """
+    SELECT substr(date, 1, 7) AS month,
+           categoryID AS category_id,
+           accountID AS account_id,
+           transactionTypeID AS transaction_type_id,
+           SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS income,
+           SUM(CASE WHEN amount < 0 THEN amount ELSE 0 END) AS expense,
+           COUNT(*) AS count
+    FROM TRANSACTIONSTABLE
+    -- The unary + keeps SQLite off the transferGroupID index: nearly every row is NULL there
+    WHERE +transferGroupID IS NULL {conditions}
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def build_rollup_table(connection):
+    """
+    Sidecar build step: stores the rollups of the whole backup in ROLLUP_TABLE.
+    """
+    connection.execute(f'DROP TABLE IF EXISTS {ROLLUP_TABLE}')
+    connection.execute(f'CREATE TABLE {ROLLUP_TABLE} AS {ROLLUP_SQL.format(conditions="")}')
+    connection.execute(f'CREATE INDEX {ROLLUP_TABLE}_month ON {ROLLUP_TABLE} (month)')
+
+
+# Contribution of the changed transactions of {schema} to the rollups, times {sign}
+ROLLUP_DELTA_SQL = """
+    SELECT substr(date, 1, 7) AS month,
+           categoryID AS category_id,
+           accountID AS account_id,
+           transactionTypeID AS transaction_type_id,
+           {sign} * CASE WHEN amount > 0 THEN amount ELSE 0 END AS income,
+           {sign} * CASE WHEN amount < 0 THEN amount ELSE 0 END AS expense,
+           {sign} AS count
+    FROM {schema}.TRANSACTIONSTABLE
+    WHERE transactionsTableID IN (SELECT id FROM main.{changes}) AND transferGroupID IS NULL
+"""
+
+ROLLUP_KEY = 'month', 'category_id', 'account_id', 'transaction_type_id'
+
+
+def update_rollup_table(connection):
+    """
+    Sidecar update step: subtracts the changed transactions as they were and adds them as they are.
+    """
+    connection.execute(f"""
+        CREATE TEMP TABLE web_rollup_delta AS
+        SELECT month, category_id, account_id, transaction_type_id,
+               SUM(income) AS income, SUM(expense) AS expense, SUM(count) AS count
+        FROM ({ROLLUP_DELTA_SQL.format(schema='previous', sign=-1, changes=CHANGES_TABLE)}
+              UNION ALL
+              {ROLLUP_DELTA_SQL.format(schema='main', sign=1, changes=CHANGES_TABLE)})
+        GROUP BY 1, 2, 3, 4
+    """)
+    same_key = ' AND '.join(f'r.{column} IS d.{column}' for column in ROLLUP_KEY)
+    connection.execute(f"""
+        UPDATE {ROLLUP_TABLE} AS r
+        SET income = r.income + d.income, expense = r.expense + d.expense, count = r.count + d.count
+        FROM temp.web_rollup_delta d WHERE {same_key}
+    """)
+    connection.execute(f"""
+        INSERT INTO {ROLLUP_TABLE} ({', '.join(Rollup._fields)})
+        SELECT * FROM temp.web_rollup_delta d
+        WHERE NOT EXISTS (SELECT 1 FROM {ROLLUP_TABLE} r WHERE {same_key})
+    """)
+    connection.execute(f'DELETE FROM {ROLLUP_TABLE} WHERE count = 0')
+    connection.execute('DROP TABLE temp.web_rollup_delta')
+
+
+def _query_rollups(conditions='', params=()):
+    connection = bluecoins_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(ROLLUP_SQL.format(conditions=conditions), params)
+        return [Rollup(*row) for row in cursor.fetchall()]
+
+
+def _load_rollups():
+    connection = bluecoins_connection()
+    with connection.cursor() as cursor:
+        if ROLLUP_TABLE in connection.introspection.table_names(cursor):
+            cursor.execute(f'SELECT {", ".join(Rollup._fields)} FROM {ROLLUP_TABLE}')
+            return [Rollup(*row) for row in cursor.fetchall()]
+    # Backup without sidecar (still being built, or disabled)
+    return _query_rollups()
+
+
+def monthly_rollups():
+    """
+    All the rollups of the active backup, loaded once per backup.
+    """
+    return cached('monthly_rollups', (), _load_rollups)
+
+
+def _first_of_next_month(day):
+    return date(day.year, day.month, calendar.monthrange(day.year, day.month)[1]) + timedelta(days=1)
+
+
+def split_range(start=None, end=None):
+    """
+    Splits the inclusive range [start, end] into whole months and partial months.
+    Returns (full_from, full_to, edges): the whole months are those with
+    full_from <= first day < full_to (None is unbounded), and edges are the
+    (from, to) day ranges, `to` exclusive (None is unbounded), that have to be
+    read from raw rows.
+    """
+    # date.max has no next day: the range is unbounded above
+    stop = end + timedelta(days=1) if end and end < date.max else None
+    if start is not None and start.day != 1 and start.replace(day=1) == date.max.replace(day=1):
+        # No month starts after it
+        return start, start, [(start, stop)]
+
+    full_from = start if start is None or start.day == 1 else _first_of_next_month(start)
+    if stop is None:
+        full_to = None
+    elif stop == _first_of_next_month(end):
+        full_to = stop
+    else:
+        full_to = end.replace(day=1)
+
+    if full_from is not None and full_to is not None and full_from >= full_to:
+        # The range is inside a single month
+        return full_from, full_from, [(start, stop)]
+
+    edges = []
+    if start is not None and start < full_from:
+        edges.append((start, full_from))
+    if stop is not None and full_to < stop:
+        edges.append((full_to, stop))
+    return full_from, full_to, edges
+
+
+def rollups_for_range(start=None, end=None, account=None):
+    """
+    Rollups covering the inclusive range [start, end] (dates), optionally for a
+    single account. Whole months come from monthly_rollups(), partial months
+    from one grouped query over their raw rows. Rows without a date are only
+    included when the range is unbounded.
+    """
+    full_from, full_to, edges = split_range(start, end)
+    bounded = start is not None or end is not None
+    low = full_from.strftime('%Y-%m') if full_from else None
+    high = full_to.strftime('%Y-%m') if full_to else None
+
+    rows = [row for row in monthly_rollups()
+            if (account is None or row.account_id == account)
+            and (row.month is not None or not bounded)
+            and (low is None or (row.month is not None and row.month >= low))
+            and (high is None or (row.month is not None and row.month < high))]
+
+    if edges:
+        ranges = []
+        params = []
+        for edge_from, edge_to in edges:
+            if edge_to is None:
+                ranges.append('(date >= %s)')
+                params.append(edge_from.isoformat())
+            else:
+                ranges.append('(date >= %s AND date < %s)')
+                params += [edge_from.isoformat(), edge_to.isoformat()]
+        conditions = f"AND ({' OR '.join(ranges)})"
+        if account is not None:
+            conditions += ' AND accountID = %s'
+            params.append(account)
+        rows += _query_rollups(conditions, params)
+    return rows
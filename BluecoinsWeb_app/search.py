@@ -0,0 +1,234 @@
+# bluecoins_app/search.py
+"""
+Full-text search over the transactions: notes, item name, labels, category
+and account names.
+
+Every sidecar gets an FTS5 index, web_search, with one row per transaction
+(rowid = transactionsTableID). It is contentless: it only stores the index,
+and results are the ranked transaction IDs, which the list view loads like
+any other page. Without a sidecar (still being built, or disabled) the same
+search runs as LIKE filters, ordered by date.
+
+Queries are searched as you type: every word must match, the last one as a
+prefix. The prefix is expanded into the indexed words that start with it
+(web_search_terms), which FTS5 reads much faster than a long prefix query.
+Up to SEARCH_RANK_LIMIT matches are ranked with bm25; larger result sets are
+returned in descending transactionsTableID (rowid) order, which FTS5 reads at
+the same cost at any size. IDs follow the order in which the transactions were
+entered in Bluecoins, not their date: a transaction entered late with an old
+date comes among the recent ones. Ordering them by date would read and sort
+every match.
+"""
+
+import re
+import unicodedata
+
+from django.db.models import Q
+
+from .backups import bluecoins_connection
+from .changes import CHANGES_TABLE
+from .models import Transactions_table
+
+SEARCH_TABLE = 'web_search'
+SEARCH_TERMS_TABLE = 'web_search_terms'
+
+# bm25 weights of the indexed columns: notes, item, labels, category, account
+SEARCH_COLUMNS = ('notes', 'item', 'labels', 'category', 'account')
+SEARCH_WEIGHTS = (1.0, 2.0, 2.0, 1.0, 0.5)
+
+# Words of a query that are searched; the rest are ignored
+MAX_SEARCH_TERMS = 8
+
+# A last word with more completions than this is searched as an FTS5 prefix query
+SEARCH_PREFIX_EXPANSION = 32
+
+# Result sets up to this size are ranked by relevance, larger ones are returned newest first
+SEARCH_RANK_LIMIT = 1000
+
+_TERM = re.compile(r'\w+')
+
+# The indexed text of the transactions of `schema`. The index stores no content, so
+# removing a transaction takes the same text again: the labels are always in the same order.
+SEARCH_ROWS_SQL = """
+    SELECT t.transactionsTableID, t.notes, i.itemName,
+           (SELECT group_concat(labelName, ' ') FROM (
+                SELECT labelName FROM {schema}.LABELSTABLE
+                WHERE transactionIDLabels = t.transactionsTableID ORDER BY labelName)),
+           c.childCategoryName || ' ' || COALESCE(p.parentCategoryName, ''),
+           a.accountName
+    FROM {schema}.TRANSACTIONSTABLE t
+    LEFT JOIN {schema}.ITEMTABLE i ON i.itemTableID = t.itemID
+    LEFT JOIN {schema}.CHILDCATEGORYTABLE c ON c.categoryTableID = t.categoryID
+    LEFT JOIN {schema}.PARENTCATEGORYTABLE p ON p.parentCategoryTableID = c.parentCategoryID
+    LEFT JOIN {schema}.ACCOUNTSTABLE a ON a.accountsTableID = t.accountID
+    {conditions}
+"""
+
+# Items, categories and accounts renamed (or deleted) since the previous backup
+RENAMED_SQL = {
+    'itemID': """
+        SELECT o.itemTableID FROM previous.ITEMTABLE o
+        LEFT JOIN main.ITEMTABLE n ON n.itemTableID = o.itemTableID
+        WHERE n.itemName IS NOT o.itemName
+    """,
+    'categoryID': """
+        SELECT o.categoryTableID FROM previous.CHILDCATEGORYTABLE o
+        LEFT JOIN main.CHILDCATEGORYTABLE n ON n.categoryTableID = o.categoryTableID
+        LEFT JOIN previous.PARENTCATEGORYTABLE op ON op.parentCategoryTableID = o.parentCategoryID
+        LEFT JOIN main.PARENTCATEGORYTABLE np ON np.parentCategoryTableID = n.parentCategoryID
+        WHERE n.childCategoryName IS NOT o.childCategoryName OR np.parentCategoryName IS NOT op.parentCategoryName
+    """,
+    'accountID': """
+        SELECT o.accountsTableID FROM previous.ACCOUNTSTABLE o
+        LEFT JOIN main.ACCOUNTSTABLE n ON n.accountsTableID = o.accountsTableID
+        WHERE n.accountName IS NOT o.accountName
+    """,
+}
+
+
+def build_search_index(connection):
+    """
+    Sidecar build step: indexes every transaction in SEARCH_TABLE and stores
+    the indexed words in SEARCH_TERMS_TABLE.
+    """
+    connection.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    connection.execute(f'DROP TABLE IF EXISTS {SEARCH_TERMS_TABLE}')
+    connection.execute(
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({', '.join(SEARCH_COLUMNS)}, content='', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4')"
+    )
+    connection.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES "
+                       f"('rank', 'bm25({', '.join(map(str, SEARCH_WEIGHTS))})')")
+    connection.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_COLUMNS)}) '
+                       f'{SEARCH_ROWS_SQL.format(schema="main", conditions="")}')
+    connection.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    connection.execute(f'CREATE TABLE {SEARCH_TERMS_TABLE} (term TEXT PRIMARY KEY) WITHOUT ROWID')
+    _store_terms(connection)
+
+
+def _store_terms(connection):
+    connection.execute(f'CREATE VIRTUAL TABLE temp.{SEARCH_TABLE}_vocab USING fts5vocab(main, {SEARCH_TABLE}, row)')
+    connection.execute(f'DELETE FROM {SEARCH_TERMS_TABLE}')
+    connection.execute(f'INSERT INTO {SEARCH_TERMS_TABLE} SELECT term FROM temp.{SEARCH_TABLE}_vocab')
+    connection.execute(f'DROP TABLE temp.{SEARCH_TABLE}_vocab')
+
+
+def update_search_index(connection):
+    """
+    Sidecar update step: indexes the changed transactions again, and those
+    whose item, category or account was renamed.
+    """
+    connection.execute('CREATE TEMP TABLE web_search_changed (id INTEGER PRIMARY KEY)')
+    connection.execute(f'INSERT INTO web_search_changed SELECT id FROM {CHANGES_TABLE}')
+    for column, sql in RENAMED_SQL.items():
+        renamed = [row[0] for row in connection.execute(sql)]
+        if renamed:
+            connection.execute(
+                f'INSERT OR IGNORE INTO web_search_changed SELECT transactionsTableID FROM main.TRANSACTIONSTABLE '
+                f'WHERE {column} IN ({", ".join("?" * len(renamed))})', renamed)
+
+    columns = ', '.join(SEARCH_COLUMNS)
+    conditions = 'WHERE t.transactionsTableID IN (SELECT id FROM temp.web_search_changed)'
+    connection.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, {columns}) SELECT 'delete', * FROM "
+                       f"({SEARCH_ROWS_SQL.format(schema='previous', conditions=conditions)})")
+    connection.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) '
+                       f'{SEARCH_ROWS_SQL.format(schema="main", conditions=conditions)}')
+    connection.execute('DROP TABLE temp.web_search_changed')
+    _store_terms(connection)
+
+
+def search_terms(query):
+    """
+    The words of `query` as the index stores them: lowercase, without
+    diacritics, FTS5 operators or quotes.
+    """
+    query = unicodedata.normalize('NFKD', query or '')
+    query = ''.join(char for char in query if not unicodedata.combining(char)).lower()
+    return _TERM.findall(query)[:MAX_SEARCH_TERMS]
+
+
+def match_expression(terms, completions=None):
+    """
+    FTS5 query matching every term, the last one as a prefix: through its
+    `completions` (indexed words starting with it) when given.
+    """
+    phrases = [f'"{term}"' for term in terms[:-1]]
+    if completions:
+        phrases.append('(' + ' OR '.join(f'"{word}"' for word in completions) + ')')
+    else:
+        phrases.append(f'"{terms[-1]}"*')
+    return ' AND '.join(phrases)
+
+
+def has_search_index():
+    connection = bluecoins_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _completions(cursor, prefix):
+    """
+    Indexed words starting with `prefix`, or None if there are more than SEARCH_PREFIX_EXPANSION.
+    """
+    cursor.execute(f'SELECT term FROM {SEARCH_TERMS_TABLE} WHERE term >= %s AND term < %s LIMIT %s',
+                   [prefix, prefix + '￿', SEARCH_PREFIX_EXPANSION + 1])
+    words = [row[0] for row in cursor.fetchall()]
+    return words if len(words) <= SEARCH_PREFIX_EXPANSION else None
+
+
+def _fts_search(terms, filters, offset, limit):
+    with bluecoins_connection().cursor() as cursor:
+        completions = _completions(cursor, terms[-1])
+        if completions == []:
+            return []
+        conditions, params = '', [match_expression(terms, completions)]
+        if filters:
+            # The filters stay in SQL, as a subquery of the matching IDs
+            sql, filter_params = (filters.apply(Transactions_table.objects.all())
+                                  .values('transactions_table_id').query.sql_with_params())
+            conditions = f'AND rowid IN ({sql})'
+            params.extend(filter_params)
+        search = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s {conditions} ORDER BY '
+
+        # FTS5 returns matches in rowid order without reading them all: find out
+        # cheaply whether there are few enough to rank. Beyond that they stay in
+        # rowid order (order of entry, not of date, see the module docstring)
+        cursor.execute(search + 'rowid DESC LIMIT %s', params + [SEARCH_RANK_LIMIT + 1])
+        newest = [row[0] for row in cursor.fetchall()]
+        if len(newest) <= SEARCH_RANK_LIMIT:
+            cursor.execute(search + 'rank, rowid DESC LIMIT %s OFFSET %s', params + [limit, offset])
+        elif offset + limit <= len(newest):
+            return newest[offset:offset + limit]
+        else:
+            cursor.execute(search + 'rowid DESC LIMIT %s OFFSET %s', params + [limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _like_search(terms, filters, offset, limit):
+    queryset = filters.apply(Transactions_table.objects.all()) if filters else Transactions_table.objects.all()
+    for term in terms:
+        queryset = queryset.filter(
+            Q(notes__icontains=term)
+            | Q(item_id__item_name__icontains=term)
+            | Q(category_id__child_category_name__icontains=term)
+            | Q(account_id__account_name__icontains=term)
+            | Q(transactions_table_id__in=Transactions_table.objects
+                .filter(labels_table__label_name__icontains=term).values('transactions_table_id'))
+        )
+    return list(queryset.order_by('-date', '-transactions_table_id')
+                .values_list('transactions_table_id', flat=True)
+                .distinct()[offset:offset + limit])
+
+
+def search_transactions(query, filters=None, offset=0, limit=50):
+    """
+    IDs of the transactions matching `query`, best matches first, optionally
+    restricted by a TransactionFilter. Empty for a query without words.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if has_search_index():
+        return _fts_search(terms, filters, offset, limit)
+    return _like_search(terms, filters, offset, limit)
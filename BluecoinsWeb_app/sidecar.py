@@ -0,0 +1,282 @@
+# bluecoins_app/sidecar.py
+"""
+Read-optimized copies ("sidecars") of the Bluecoins backups.
+
+The .fydb written by the Android app only has a handful of indexes and must not
+be modified, so each backup is copied into databases/sidecar/<fingerprint>.sqlite3,
+where the indexes needed by the web queries are added and ANALYZE is run.
+The backup watcher points the `bluecoins` connection to the sidecar once it exists.
+
+Backups outside BLUECOINS_DB_DIR (those of other users, see tenants.py) get
+a subdirectory per backups directory, so each keeps its own SIDECARS_TO_KEEP.
+
+When the directory already has a sidecar, the next one is built from it:
+the file is copied, the transactions changed since its backup are replaced
+(see changes.py) and the registered update_steps bring the derived tables up
+to date, in time proportional to the change rather than to the backup.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+
+from .backups import backup_fingerprint
+from .changes import TRANSACTIONS, apply_changes, compare_backups, same_schema
+from .db_backend.base import database_uri
+
+logger = logging.getLogger(__name__)
+
+# (name, table, columns) of the indexes added to every sidecar
+SIDECAR_INDEXES = [
+    ('web_labels_name', 'LABELSTABLE', 'labelName, transactionIDLabels'),
+    ('web_labels_transaction', 'LABELSTABLE', 'transactionIDLabels, labelName'),
+    ('web_transactions_date', 'TRANSACTIONSTABLE', 'date, transactionsTableID'),
+    ('web_transactions_category', 'TRANSACTIONSTABLE', 'categoryID, date'),
+    ('web_transactions_account', 'TRANSACTIONSTABLE', 'accountID, date'),
+    ('web_transactions_transfer', 'TRANSACTIONSTABLE', 'transferGroupID'),
+]
+
+# Sidecars kept on disk: the active one and the previous one
+SIDECARS_TO_KEEP = 2
+
+# A build lock older than this is considered abandoned by a dead process
+STALE_LOCK_SECONDS = 60 * 60
+
+# Older sidecars are only deleted this long after a newer one replaced them, so
+# workers that have not switched yet (see BLUECOINS_DB_CHECK_INTERVAL) can still open them
+PRUNE_GRACE_SECONDS = 10 * 60
+
+# Functions run on the sidecar connection after the indexes, before ANALYZE.
+# Other modules register here the derived tables they want in every sidecar.
+build_steps = []
+
+# Functions that update those tables when a sidecar is built from the previous
+# one: run after apply_changes, with the previous sidecar attached as
+# `previous`, the backup as `backup` and the changed transactions in CHANGES_TABLE.
+update_steps = []
+
+# Version of the sidecar contents: only sidecars of the same version are updated incrementally
+SIDECAR_META_TABLE = 'web_sidecar_meta'
+SIDECAR_FORMAT = '1'
+
+# Above this share of changed transactions, a sidecar is built from scratch
+MAX_INCREMENTAL_CHANGES = 0.2
+
+
+def get_sidecar_dir(backup_path=None):
+    """
+    Directory of the sidecars of the backups in the same directory as `backup_path`.
+    """
+    base = Path(settings.BLUECOINS_SIDECAR_DIR)
+    if backup_path is None:
+        return base
+    directory = Path(backup_path).resolve().parent
+    if directory == Path(settings.BLUECOINS_DB_DIR).resolve():
+        return base
+    return base / hashlib.sha1(str(directory).encode()).hexdigest()[:12]
+
+
+def sidecar_path(backup_path, source=None):
+    return get_sidecar_dir(backup_path) / f'{backup_fingerprint(backup_path, source)}.sqlite3'
+
+
+def find_sidecar(backup_path):
+    """
+    Path of the sidecar of `backup_path`, or None if it has not been built.
+    """
+    path = sidecar_path(backup_path)
+    return str(path) if path.exists() else None
+
+
+def build_sidecar(backup_path, force=False, source=None):
+    """
+    Builds the sidecar of `backup_path`: from the previous sidecar of its
+    directory when possible, otherwise by copying the backup, adding
+    SIDECAR_INDEXES and running the registered build_steps and ANALYZE.
+    The file is built under a temporary name and renamed into place, so
+    readers never see a half-built sidecar. With `source`, the sidecar of a
+    file about to be renamed to `backup_path` is built from it. `force`
+    rebuilds it from scratch. Returns the sidecar path.
+    """
+    path = sidecar_path(backup_path, source)
+    if path.exists() and not force:
+        return str(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+
+    started = time.monotonic()
+    base = None if force else find_base_sidecar(path)
+    meta = {'format': SIDECAR_FORMAT, 'backup': str(backup_path)}
+    changes = None
+    if base:
+        try:
+            changes = _update_sidecar(base, source or backup_path, tmp_path)
+        except sqlite3.DatabaseError:
+            logger.exception("Could not update the Bluecoins sidecar %s, building it from scratch", base)
+    if changes is None:
+        tmp_path.unlink(missing_ok=True)
+        _build_from_scratch(source or backup_path, tmp_path)
+    else:
+        meta['previous_backup'] = read_meta(base)['backup']
+    with sqlite3.connect(tmp_path) as connection:
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {SIDECAR_META_TABLE} (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute(f'DELETE FROM {SIDECAR_META_TABLE}')
+        connection.executemany(f'INSERT INTO {SIDECAR_META_TABLE} VALUES (?, ?)', meta.items())
+    connection.close()
+    os.replace(tmp_path, path)
+
+    if changes is None:
+        logger.info("Bluecoins sidecar built: %s -> %s in %.2fs", backup_path, path, time.monotonic() - started)
+    else:
+        logger.info("Bluecoins sidecar updated from %s: %s -> %s (%s) in %.2fs", base, backup_path, path,
+                    ', '.join(f'{count} {change}' for change, count in changes.items()), time.monotonic() - started)
+    prune_sidecars(keep=str(path))
+    return str(path)
+
+
+def _build_from_scratch(backup_file, tmp_path):
+    connection = sqlite3.connect(database_uri(backup_file, immutable=False), uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # The backup API copies page by page without loading the file in memory
+        connection.backup(target)
+        for name, table, columns in SIDECAR_INDEXES:
+            target.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+        for step in build_steps:
+            step(target)
+        target.execute('ANALYZE')
+        target.commit()
+    finally:
+        connection.close()
+        target.close()
+
+
+def _update_sidecar(base, backup_file, tmp_path):
+    """
+    Writes to `tmp_path` the sidecar of `backup_file` from the sidecar `base`
+    of a previous backup. Returns the number of changes of each kind, or None
+    (and writes nothing) if the schemas differ or too much has changed.
+    """
+    shutil.copyfile(base, tmp_path)
+    # Opened as a URI, so that the ATTACH statements accept URIs too
+    connection = sqlite3.connect(f'file:{quote(str(tmp_path))}', uri=True)
+    try:
+        connection.execute('ATTACH ? AS previous', [database_uri(base)])
+        connection.execute('ATTACH ? AS backup', [database_uri(backup_file)])
+        if not same_schema(connection, 'main', 'backup'):
+            logger.info("Bluecoins sidecar of %s built from scratch: schema changed", backup_file)
+            return None
+        changes = compare_backups(connection)
+        total = connection.execute(f'SELECT COUNT(*) FROM backup.{TRANSACTIONS}').fetchone()[0]
+        if sum(changes.values()) > MAX_INCREMENTAL_CHANGES * total:
+            logger.info("Bluecoins sidecar of %s built from scratch: %d of %d transactions changed",
+                        backup_file, sum(changes.values()), total)
+            return None
+        apply_changes(connection)
+        for step in update_steps:
+            step(connection)
+        connection.commit()
+        # Keeps the statistics of ANALYZE current for the tables that changed enough
+        connection.execute('PRAGMA optimize')
+        return changes
+    finally:
+        connection.close()
+
+
+def read_meta(sidecar):
+    """
+    The SIDECAR_META_TABLE of a sidecar (a path or an open sqlite3
+    connection) as a dict, empty if it has none.
+    """
+    connection = sidecar if isinstance(sidecar, sqlite3.Connection) else \
+        sqlite3.connect(database_uri(sidecar), uri=True)
+    try:
+        return dict(connection.execute(f'SELECT key, value FROM {SIDECAR_META_TABLE}'))
+    except sqlite3.DatabaseError:
+        return {}
+    finally:
+        if connection is not sidecar:
+            connection.close()
+
+
+def find_base_sidecar(path):
+    """
+    The newest sidecar of the directory of `path` (another backup's) that
+    the sidecar `path` can be built from, or None.
+    """
+    sidecars = sorted(Path(path).parent.glob('*.sqlite3'), key=os.path.getmtime, reverse=True)
+    for sidecar in sidecars:
+        if sidecar != Path(path) and read_meta(sidecar).get('format') == SIDECAR_FORMAT:
+            return str(sidecar)
+    return None
+
+
+def prune_sidecars(keep):
+    """
+    Deletes all but the SIDECARS_TO_KEEP most recent sidecars of the directory
+    of `keep`, which is never deleted, once the next newer one is older than
+    PRUNE_GRACE_SECONDS.
+    """
+    sidecars = sorted(Path(keep).parent.glob('*.sqlite3'), key=os.path.getmtime, reverse=True)
+    replaced_before = time.time() - PRUNE_GRACE_SECONDS
+    for newer, old in zip(sidecars[SIDECARS_TO_KEEP - 1:], sidecars[SIDECARS_TO_KEEP:]):
+        if str(old) != keep and os.path.getmtime(newer) < replaced_before:
+            old.unlink(missing_ok=True)
+
+
+# Sidecar paths (one per backup fingerprint) whose background build failed
+_failed_builds = set()
+
+
+def _acquire_build_lock(lock_path):
+    """
+    Cross-process lock, so only one gunicorn worker builds a given sidecar.
+    """
+    try:
+        if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+            os.unlink(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def build_in_background(backup_path):
+    """
+    Starts building the sidecar of `backup_path` in a daemon thread, unless
+    another thread or process is already building it, or a build of this
+    backup (same fingerprint) already failed in this process. Requests keep
+    reading the backup itself meanwhile.
+    """
+    path = sidecar_path(backup_path)
+    if str(path) in _failed_builds:
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = path.with_name(f'{path.name}.lock')
+    if not _acquire_build_lock(lock_path):
+        return None
+
+    def run():
+        try:
+            build_sidecar(backup_path)
+        except Exception:
+            # Not retried on every check of the watcher: a new backup gets a new fingerprint
+            _failed_builds.add(str(path))
+            logger.exception("Could not build the Bluecoins sidecar of %s", backup_path)
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    thread = threading.Thread(target=run, name='bluecoins-sidecar', daemon=True)
+    thread.start()
+    return thread
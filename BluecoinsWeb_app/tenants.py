@@ -0,0 +1,194 @@
+# bluecoins_app/tenants.py
+"""
+Backups of several users served by one deployment (BLUECOINS_TENANTS).
+
+The UserBackup registry, in the default database, maps each user to a
+directory with their backups. The newest one matching BLUECOINS_DB_PATTERN is
+served through a database alias of its own, `bluecoins_<id>`, watched by its
+own BackupWatcher: new backups and sidecars are picked up as for the main one.
+TenantMiddleware serves the backup of the request's user (backups.serving),
+so the router, the raw SQL and the cache keys of the request all follow it.
+
+Each worker process keeps at most BLUECOINS_MAX_OPEN_BACKUPS aliases. When
+another one is needed, the least recently used alias that no request is
+reading is dropped, and every thread closes its SQLite connection to it the
+next time it serves a backup.
+"""
+
+import copy
+import logging
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.connection import ConnectionDoesNotExist
+
+from .backups import BLUECOINS_ALIAS, BackupWatcher, find_latest_backup, serving as serve_backup
+
+logger = logging.getLogger(__name__)
+
+# Aliases this thread has connected to: alias -> watcher
+_local = threading.local()
+
+
+class NoBackup(Exception):
+    """The user's directory has no backup."""
+
+
+def _close_connection(alias):
+    """
+    Closes and forgets the current thread's connection to `alias`.
+    """
+    try:
+        connection = connections[alias]
+    except ConnectionDoesNotExist:
+        return
+    connection.close()
+    del connections[alias]
+
+
+class TenantPool:
+    """
+    The open aliases of the users' backups in this process, least recently used first.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self._watchers = OrderedDict()  # alias -> BackupWatcher
+        self._busy = Counter()  # alias -> requests and jobs reading it
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._watchers)
+
+    def __contains__(self, alias):
+        return alias in self._watchers
+
+    def current(self, alias):
+        return self._watchers.get(alias)
+
+    def acquire(self, backup):
+        """
+        Watcher of a UserBackup, opened if needed, held until release().
+        Raises NoBackup if its directory has no backup.
+        """
+        with self._lock:
+            watcher = self._watchers.get(backup.alias)
+            if watcher is None or watcher.directory != backup.directory:
+                path = find_latest_backup(backup.directory, settings.BLUECOINS_DB_PATTERN)
+                if path is None:
+                    raise NoBackup(f"No Bluecoins backup found in {backup.directory}")
+                watcher = BackupWatcher(path, backup.directory, settings.BLUECOINS_DB_PATTERN,
+                                        settings.BLUECOINS_DB_CHECK_INTERVAL,
+                                        use_sidecar=settings.BLUECOINS_SIDECAR, alias=backup.alias)
+            self._hold(watcher)
+        return watcher
+
+    def hold(self, watcher):
+        """
+        Holds a watcher obtained from acquire() again, e.g. from an export thread.
+        """
+        with self._lock:
+            self._hold(watcher)
+
+    def release(self, watcher):
+        with self._lock:
+            self._busy[watcher.alias] -= 1
+            if self._busy[watcher.alias] <= 0:
+                del self._busy[watcher.alias]
+
+    def _hold(self, watcher):
+        alias = watcher.alias
+        if self._watchers.get(alias) is not watcher:
+            # The connections are configured like the main one, on another file
+            connections.settings[alias] = {**copy.deepcopy(connections.settings[BLUECOINS_ALIAS]),
+                                           'NAME': watcher.database_path}
+            self._watchers[alias] = watcher
+            logger.info("Opened Bluecoins backup %s as %s", watcher.path, alias)
+        self._watchers.move_to_end(alias)
+        self._busy[alias] += 1
+        for idle in [alias for alias in self._watchers if not self._busy[alias]]:
+            if len(self._watchers) <= self.max_open:
+                break
+            self._drop(idle)
+
+    def _drop(self, alias):
+        del self._watchers[alias]
+        connections.settings.pop(alias, None)
+        logger.info("Closed Bluecoins backup %s (more than %d open)", alias, self.max_open)
+
+    def clear(self):
+        """
+        Drops every alias.
+        """
+        with self._lock:
+            for alias in list(self._watchers):
+                self._drop(alias)
+            self._busy.clear()
+        self.close_stale_connections()
+
+    def close_stale_connections(self):
+        """
+        Closes the current thread's connections to aliases dropped from the pool
+        (or opened again on another backup) since it last used them.
+        """
+        opened = _opened()
+        for alias, watcher in list(opened.items()):
+            if self.current(alias) is not watcher:
+                _close_connection(alias)
+                del opened[alias]
+
+    @contextmanager
+    def serving(self, watcher):
+        """
+        Serves a held watcher's backup in the current context and releases it afterwards.
+        """
+        self.close_stale_connections()
+        try:
+            with serve_backup(watcher):
+                _opened()[watcher.alias] = watcher
+                yield watcher
+        finally:
+            self.release(watcher)
+
+    def stream(self, watcher, content):
+        """
+        Streamed response `content` generated while serving the backup of
+        `watcher`: the generator runs after the middleware has returned.
+        """
+        iterator = iter(content)
+        self.hold(watcher)
+        try:
+            while True:
+                with serve_backup(watcher):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.release(watcher)
+
+
+def _opened():
+    if not hasattr(_local, 'opened'):
+        _local.opened = {}
+    return _local.opened
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    The per-process TenantPool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = TenantPool(settings.BLUECOINS_MAX_OPEN_BACKUPS)
+    return _pool
+
@@ -1,3 +1,1456 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import OperationalError, connections
+from django.db.models import Count, Sum
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.http import FileResponse, QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+from django.utils.timezone import override as timezone_override
+from openpyxl import load_workbook
+
+from .analytics import ColumnStore, clear_store, get_store
+from .backups import BackupWatcher, backup_changed
+from .balances import balance_timeline, net_worth_series, period_ends
+from .caching import get_cache, request_validators
+from .dates import day_heading, group_by_day
+from .exports import write_label_report
+from .filters import TransactionFilter
+from .dbrouters import BluecoinsDBRouter
+from .instrumentation import sql_shape
+from .jobs import cleanup_jobs, get_job, result_path, submit_label_report
+from .db_backend.base import DatabaseWrapper
+from .labels import LABEL_CATALOG_TABLE, label_catalog
+from .management.commands.build_sidecar import time_label_filters
+from .pagination import MAX_OFFSET, encode_cursor, encode_offset_cursor, rows_after
+from .search import SEARCH_TABLE, build_search_index, has_search_index, search_terms, search_transactions
+from .sidecar import (
+    PRUNE_GRACE_SECONDS, SIDECAR_INDEXES, _failed_builds, build_in_background, build_sidecar, find_sidecar,
+    prune_sidecars, read_meta,
+)
+from .tenants import get_pool
+from .models import (
+    Accounts_table, Category_group_table, Child_category_table, Item_table, Labels_table,
+    Parent_category_table, Transaction_type_table, Transactions_table, UserBackup,
+)
+from .reports import category_report, category_totals, filter_transactions, monthly_report
+from .rollups import ROLLUP_TABLE, monthly_rollups, rollups_for_range, split_range
+
+
+def create_bluecoins_tables():
+    """
+    The Bluecoins models are unmanaged, so the test database has no tables for
+    them. Create them once, outside of any transaction.
+    """
+    connection = connections['bluecoins']
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('BluecoinsWeb_app').get_models():
+            if not model._meta.managed and model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def modified_copy(source, path, mtime):
+    """
+    A later backup: one transaction updated, one deleted with its labels,
+    one inserted with a new label and an item renamed.
+    """
+    shutil.copy(source, path)
+    with sqlite3.connect(path) as backup:
+        ids = [row[0] for row in backup.execute(
+            'SELECT transactionsTableID FROM TRANSACTIONSTABLE WHERE transactionsTableID IN '
+            '(SELECT transactionIDLabels FROM LABELSTABLE) ORDER BY transactionsTableID LIMIT 2')]
+        backup.execute("UPDATE TRANSACTIONSTABLE SET amount = -7000000, notes = 'Zebra' "
+                       "WHERE transactionsTableID = ?", [ids[0]])
+        backup.execute('DELETE FROM LABELSTABLE WHERE transactionIDLabels = ?', [ids[1]])
+        backup.execute('DELETE FROM TRANSACTIONSTABLE WHERE transactionsTableID = ?', [ids[1]])
+        backup.execute("""
+            INSERT INTO TRANSACTIONSTABLE (transactionsTableID, itemID, amount, date, categoryID, accountID)
+            SELECT MAX(transactionsTableID) + 1, itemID, -5000000, '2030-01-01 00:00:00', categoryID, accountID
+            FROM TRANSACTIONSTABLE
+        """)
+        backup.execute("INSERT INTO LABELSTABLE (labelName, transactionIDLabels) "
+                       "SELECT 'Quokka', MAX(transactionsTableID) FROM TRANSACTIONSTABLE")
+        backup.execute("UPDATE ITEMTABLE SET itemName = 'Wombat' "
+                       "WHERE itemTableID = (SELECT MAX(itemID) FROM TRANSACTIONSTABLE)")
+    backup.close()
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class BluecoinsTestCase(TestCase):
+    databases = {'default', 'bluecoins'}
+
+    @classmethod
+    def setUpClass(cls):
+        create_bluecoins_tables()
+        super().setUpClass()
+
+    def setUp(self):
+        # The test database keeps the same fingerprint while its rows change
+        get_cache().clear()
+        clear_store()
+
+    @classmethod
+    def create_transactions(cls, count, label=None, start=None):
+        """
+        Creates `count` expense transactions, one per hour, each with its own
+        item, plus an optional label on every one of them.
+        """
+        account, _ = Accounts_table.objects.get_or_create(account_name='Checking')
+        category, _ = Child_category_table.objects.get_or_create(child_category_name='Food')
+        tx_type, _ = Transaction_type_table.objects.get_or_create(transaction_type_name='Expense')
+        start = start or datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+        transactions = []
+        for n in range(count):
+            item = Item_table.objects.create(item_name=f'Item {n}')
+            tx = Transactions_table.objects.create(
+                item_id=item, amount=-(n + 1) * 1000000, date=start + timedelta(hours=n),
+                transaction_type_id=tx_type, category_id=category, account_id=account,
+            )
+            if label:
+                Labels_table.objects.create(label_name=label, transaction_id_labels=tx)
+            transactions.append(tx)
+        return transactions
+
+
+class TransactionsListQueryCountTests(BluecoinsTestCase):
+    """
+    The number of queries of a list page must not depend on how many rows it shows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(60)
+        cls.create_transactions(3, label='Vacation', start=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    def count_queries(self, params, ajax=False):
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        get_cache().clear()
+        label_catalog()  # Read once per backup, by the label filter and the dropdown
+        with CaptureQueriesContext(connections['bluecoins']) as queries:
+            response = self.client.get(reverse('transactions_list'), params, **headers)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_full_page_costs_the_same_as_a_short_page(self):
+        # 50 rows against 3 rows
+        self.assertEqual(self.count_queries({}), self.count_queries({'label': 'Vacation'}))
+        self.assertEqual(self.count_queries({}, ajax=True),
+                         self.count_queries({'label': 'Vacation'}, ajax=True))
+
+    def test_legacy_page_costs_the_same_as_a_short_page(self):
+        self.assertEqual(self.count_queries({'page': 1}), self.count_queries({'page': 1, 'label': 'Vacation'}))
+
+    def test_page_query_count(self):
+        # Transactions with their foreign keys, labels prefetch, label dropdown (table lookup and catalog)
+        with self.assertNumQueries(4, using='bluecoins'):
+            self.client.get(reverse('transactions_list'))
+        # The AJAX JSON does not use the label dropdown
+        with self.assertNumQueries(2, using='bluecoins'):
+            self.client.get(reverse('transactions_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+
+class CacheTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(5, label='Vacation')
+
+    def test_pages_and_reports_are_served_from_cache(self):
+        requests = [
+            (reverse('transactions_list'), {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}, 0),
+            (reverse('report_by_category'), {}, 1),  # only the account selector
+            (reverse('report_by_label'), {}, 0),
+        ]
+        for url, headers, num_queries in requests:
+            first = self.client.get(url, **headers)
+            with self.assertNumQueries(num_queries, using='bluecoins'):
+                second = self.client.get(url, **headers)
+            self.assertEqual(second.getvalue() if second.streaming else second.content,
+                             first.getvalue() if first.streaming else first.content)
+
+        stats = self.client.get(reverse('cache_stats')).json()['namespaces']
+        for namespace in ('transactions_page', 'category_report', 'label_report'):
+            self.assertEqual((stats[namespace]['hits'], stats[namespace]['misses']), (1, 1))
+
+    def test_new_backup_invalidates_the_cache(self):
+        self.client.get(reverse('report_by_category'))
+        with mock.patch('BluecoinsWeb_app.caching.backup_fingerprint', return_value='new-backup'):
+            # rollups and label catalog (table lookup and rows), category names and account selector
+            with self.assertNumQueries(6, using='bluecoins'):
+                self.client.get(reverse('report_by_category'))
+
+
+class DayHeadingTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Three transactions a day over two days, plus one without date
+        cls.create_transactions(6, start=datetime(2025, 3, 1, 9, tzinfo=timezone.utc))
+        for tx in Transactions_table.objects.filter(amount__lt=-3000000):
+            tx.date += timedelta(days=1)
+            tx.save()
+        Transactions_table.objects.create(amount=-1000000)
+
+    def setUp(self):
+        super().setUp()
+        day_heading.cache_clear()
+
+    def test_each_day_is_formatted_once(self):
+        rows = list(Transactions_table.objects.order_by('-date'))
+        with translation.override('es'):
+            groups = group_by_day(rows)
+        self.assertEqual({heading: len(txs) for heading, txs in groups.items()},
+                         {'Dom, 02 de marzo de 2025': 3, 'Sáb, 01 de marzo de 2025': 3, 'Sin fecha': 1})
+        self.assertEqual(day_heading.cache_info().misses, 3)
+        with translation.override('en'):
+            self.assertEqual(list(group_by_day(rows)),
+                             ['Sun, March 2, 2025', 'Sat, March 1, 2025', 'No date'])
+        # The local day, not the UTC one
+        with translation.override('en'), timezone_override('America/Bogota'):
+            self.assertEqual(list(group_by_day(rows[:1])), ['Sun, March 2, 2025'])
+            self.assertEqual(list(group_by_day(rows[3:4])), ['Sat, March 1, 2025'])
+
+    def test_languages_in_parallel_threads(self):
+        rows = list(Transactions_table.objects.order_by('-date'))
+
+        def headings(language):
+            day_heading.cache_clear()
+            with translation.override(language):
+                return tuple(group_by_day(rows))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(headings, ['es', 'en'] * 20))
+        self.assertEqual(set(results[0::2]), {('Dom, 02 de marzo de 2025', 'Sáb, 01 de marzo de 2025', 'Sin fecha')})
+        self.assertEqual(set(results[1::2]), {('Sun, March 2, 2025', 'Sat, March 1, 2025', 'No date')})
+
+    def test_list_page_language(self):
+        self.assertContains(self.client.get(reverse('transactions_list'), HTTP_ACCEPT_LANGUAGE='es'),
+                            'Dom, 02 de marzo de 2025')
+        response = self.client.get(reverse('transactions_list'), HTTP_ACCEPT_LANGUAGE='en')
+        self.assertContains(response, 'Sun, March 2, 2025')
+        self.assertContains(response, '<html lang="en">')
+        self.assertIn('Accept-Language', response['Vary'])
+
+
+class TransactionsListCursorTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transactions = cls.create_transactions(120)
+
+    def test_cursor_walks_every_transaction_once(self):
+        expected = [tx.pk for tx in sorted(self.transactions, key=lambda tx: tx.date, reverse=True)]
+        seen = []
+        cursor = None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            response = self.client.get(reverse('transactions_list'), params,
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            data = response.json()
+            seen.extend(int(pk) for pk in re.findall(r"/transactions/(\d+)/'", data['transactions_html']))
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_more'], cursor is not None)
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('transactions_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_rows_after_with_ties_undated_rows_and_filters(self):
+        tied = self.transactions[:10]
+        Transactions_table.objects.filter(pk__in=[tx.pk for tx in tied[:5]]).update(date=tied[5].date)
+        Transactions_table.objects.filter(pk__in=[tx.pk for tx in tied[6:]]).update(date=None)
+        for queryset in (Transactions_table.objects.all(),
+                         filter_transactions(Transactions_table.objects.all(), end=datetime(2025, 1, 3).date())):
+            seen, cursor = [], None
+            while True:
+                rows = rows_after(queryset, cursor, 7)
+                seen.extend(tx.pk for tx in rows)
+                if len(rows) < 7:
+                    break
+                cursor = encode_cursor(rows[-1].date, rows[-1].pk)
+            self.assertEqual(seen, list(queryset.order_by('-date', '-pk').values_list('pk', flat=True)))
+        # Undated rows come last
+        self.assertEqual(rows_after(Transactions_table.objects.all(), cursor=None, limit=200)[-4:], tied[6:][::-1])
+
+    def test_cursor_bound_precedes_the_filters(self):
+        end = datetime(2025, 1, 3).date()
+        cursor = encode_cursor(self.transactions[30].date, self.transactions[30].pk)
+        with CaptureQueriesContext(connections['bluecoins']) as queries:
+            rows = rows_after(Transactions_table.objects.all(), cursor, 10,
+                              filters=lambda queryset: filter_transactions(queryset, end=end))
+        self.assertEqual([tx.pk for tx in rows], [tx.pk for tx in self.transactions[29:19:-1]])
+        # SQLite reads the date index from the first bound on the column: the cursor's
+        where = queries[0]['sql'].split('WHERE', 1)[1]
+        self.assertLess(where.index('"date" <= '), where.rindex('"date" < '))
+
+    def test_last_representable_end_date(self):
+        self.assertEqual(filter_transactions(Transactions_table.objects.all(), end=date.max).count(), 120)
+        for url in (reverse('transactions_list'), reverse('api_transactions')):
+            self.assertEqual(self.client.get(url, {'end': '9999-12-31'}).status_code, 200, url)
+
+
+class CompactPageTests(BluecoinsTestCase):
+    """
+    The ?format=compact infinite-scroll pages rendered by the browser.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transactions = cls.create_transactions(70, start=datetime(2025, 3, 1, tzinfo=timezone.utc))
+        for tx in cls.transactions[-2:]:
+            Labels_table.objects.create(label_name='Vacation', transaction_id_labels=tx)
+        Labels_table.objects.create(label_name='Beach', transaction_id_labels=cls.transactions[-1])
+        cls.transactions[-3].item_id.item_name = ''
+        cls.transactions[-3].item_id.save()
+
+    def get_page(self, params, **headers):
+        response = self.client.get(reverse('transactions_list'), {'format': 'compact', **params},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rows_and_label_names(self):
+        newest = self.transactions[::-1]
+        data = self.get_page({}, HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual(data['ids'], [tx.pk for tx in newest[:50]])
+        self.assertEqual(data['label_names'], ['Beach', 'Vacation'])
+        self.assertEqual(data['labels'][:3], [[1, 0], [1], []])
+        self.assertEqual(data['items'][:3], ['Item 69', 'Item 68', f'Item {newest[2].item_id.pk}'])
+        self.assertEqual(data['categories'][0], 'Food')
+        self.assertEqual(data['amounts'][:2], [-70000000, -69000000])
+        self.assertEqual(data['days'][0], '2025-03-03')
+        self.assertEqual(data['day_names'], {'2025-03-03': 'Mon, March 3, 2025', '2025-03-02': 'Sun, March 2, 2025',
+                                             '2025-03-01': 'Sat, March 1, 2025'})
+        self.assertTrue(data['has_more'])
+
+        # The browser keeps the label names: later pages only send them for another backup
+        page_2 = self.get_page({'cursor': data['next_cursor'], 'labels_version': data['labels_version']})
+        self.assertNotIn('label_names', page_2)
+        self.assertEqual(page_2['ids'], [tx.pk for tx in newest[50:]])
+        self.assertFalse(page_2['has_more'])
+        self.assertIn('label_names', self.get_page({'cursor': data['next_cursor'], 'labels_version': 'old'}))
+
+    def test_smaller_and_cheaper_than_html(self):
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        html = self.client.get(reverse('transactions_list'), **headers)
+        label_catalog()
+        # Transactions with their item and category, labels prefetch
+        with self.assertNumQueries(2, using='bluecoins'):
+            compact = self.client.get(reverse('transactions_list'), {'format': 'compact'}, **headers)
+        self.assertLess(len(compact.content) * 5, len(html.content))
+
+
+class TransactionFilterTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transactions = cls.create_transactions(40)
+        parent = Parent_category_table.objects.create(parent_category_name='Leisure')
+        cls.travel = Child_category_table.objects.create(child_category_name='Travel', parent_category_id=parent)
+        cls.savings = Accounts_table.objects.create(account_name='Savings')
+        for tx in cls.transactions[:20]:
+            Labels_table.objects.create(label_name='Trip', transaction_id_labels=tx)
+        for tx in cls.transactions[10:30]:
+            Labels_table.objects.create(label_name='Family, friends', transaction_id_labels=tx)
+        Transactions_table.objects.filter(pk__in=[tx.pk for tx in cls.transactions[::4]]).update(
+            category_id=cls.travel, account_id=cls.savings)
+
+    def matching(self, transaction_filter):
+        return set(transaction_filter.apply(Transactions_table.objects.all()).values_list('pk', flat=True))
+
+    def test_from_query(self):
+        query = QueryDict('label=Trip&label=Family, friends&label_mode=all&start=2025-01-01&end=bad'
+                          '&min_amount=-10.5&max_amount=x&category=3,1&category=z&account=2&type=')
+        transaction_filter = TransactionFilter.from_query(query)
+        self.assertEqual(transaction_filter.labels, ('Trip', 'Family, friends'))
+        self.assertEqual(transaction_filter.label_mode, 'all')
+        self.assertEqual((transaction_filter.start, transaction_filter.end), (datetime(2025, 1, 1).date(), None))
+        self.assertEqual((transaction_filter.min_amount, transaction_filter.max_amount), (-10500000, None))
+        self.assertEqual((transaction_filter.categories, transaction_filter.accounts, transaction_filter.types),
+                         ((1, 3), (2,), ()))
+        self.assertFalse(TransactionFilter.from_query(QueryDict('label_mode=all&category=x')))
+        # Values SQLite cannot compare with are ignored too
+        self.assertFalse(TransactionFilter.from_query(QueryDict(
+            'min_amount=inf&max_amount=-Infinity&account=99999999999999999999999&type=-9223372036854775809')))
+        # Rejected before scaling: the first overflows, the second would take ages to convert
+        self.assertFalse(TransactionFilter.from_query(QueryDict('min_amount=1e999999999&max_amount=-1e999990')))
+        for url in (reverse('transactions_list'), reverse('api_transactions'), reverse('report_by_label')):
+            response = self.client.get(url, {'min_amount': 'inf', 'max_amount': 'NaN', 'account': '9' * 23},
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 200, url)
+            response = self.client.get(url, {'min_amount': '1e999999999', 'max_amount': '1e999990'},
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 200, url)
+        # The mode only matters for more than one label
+        self.assertEqual(TransactionFilter(labels=['Trip'], label_mode='all'), TransactionFilter(labels=['Trip']))
+
+    def test_labels(self):
+        trip, family = set(tx.pk for tx in self.transactions[:20]), set(tx.pk for tx in self.transactions[10:30])
+        labels = ['Trip', 'Family, friends']
+        self.assertEqual(self.matching(TransactionFilter(labels=labels)), trip | family)
+        self.assertEqual(self.matching(TransactionFilter(labels=labels, label_mode='all')), trip & family)
+        self.assertEqual(self.matching(TransactionFilter(labels=['Trip', 'Missing'], label_mode='all')), set())
+        # Common labels take the EXISTS path, with the same result
+        with mock.patch('BluecoinsWeb_app.filters.LABEL_SCAN_ROWS', 0):
+            get_cache().clear()
+            self.assertEqual(self.matching(TransactionFilter(labels=labels)), trip | family)
+            self.assertEqual(self.matching(TransactionFilter(labels=labels, label_mode='all')), trip & family)
+
+    def test_columns_match_the_orm(self):
+        transactions = Transactions_table.objects.all()
+        cases = [
+            (TransactionFilter(min_amount=-10000000, max_amount=-5000000),
+             transactions.filter(amount__range=(-10000000, -5000000))),
+            (TransactionFilter(categories=[self.travel.pk]), transactions.filter(category_id=self.travel)),
+            (TransactionFilter(parents=[self.travel.parent_category_id_id]), transactions.filter(category_id=self.travel)),
+            (TransactionFilter(accounts=[self.savings.pk], labels=['Trip']),
+             transactions.filter(account_id=self.savings, labels_table__label_name='Trip')),
+            (TransactionFilter(types=[self.transactions[0].transaction_type_id_id], end=datetime(2025, 1, 1).date()),
+             transactions.filter(date__lt=datetime(2025, 1, 2, tzinfo=timezone.utc))),
+        ]
+        for transaction_filter, expected in cases:
+            with self.subTest(transaction_filter=transaction_filter):
+                self.assertEqual(self.matching(transaction_filter), set(expected.values_list('pk', flat=True)))
+
+    def test_list_view(self):
+        params = {'label': ['Trip', 'Family, friends'], 'label_mode': 'all', 'account': self.savings.pk}
+        response = self.client.get(reverse('transactions_list'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        shown = {int(pk) for pk in re.findall(r"/transactions/(\d+)/'", response.json()['transactions_html'])}
+        self.assertEqual(shown, {tx.pk for tx in self.transactions[12:20:4]})
+
+    def test_excel_report(self):
+        response = self.client.get(reverse('report_by_label'), {'label': ['Trip', 'Family, friends'], 'label_mode': 'all'})
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="report_by_label_Trip_Family, friends.xlsx"')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sum(ws.max_row - 1 for ws in workbook.worksheets), 10)
+
+
+class ApiTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transactions = cls.create_transactions(25)
+        for tx in cls.transactions[:5]:
+            Labels_table.objects.create(label_name='Trip', transaction_id_labels=tx)
+
+    def test_cursor_pages(self):
+        url, params, seen = reverse('api_transactions'), {'limit': 10, 'fields': 'id,amount,labels'}, []
+        while True:
+            response = self.client.get(url, params).json()
+            self.assertTrue(all(set(row) == {'id', 'amount', 'labels'} for row in response['transactions']))
+            seen.extend(response['transactions'])
+            if not response['next_cursor']:
+                break
+            params['cursor'] = response['next_cursor']
+        self.assertEqual([row['id'] for row in seen], [tx.pk for tx in reversed(self.transactions)])
+        self.assertEqual(seen[-1], {'id': self.transactions[0].pk, 'amount': -1000000, 'labels': ['Trip']})
+
+    def test_filters_and_errors(self):
+        response = self.client.get(reverse('api_transactions'), {'label': 'Trip', 'fields': 'id'})
+        self.assertEqual(len(response.json()['transactions']), 5)
+        for params in ({'fields': 'id,password'}, {'limit': 0}, {'cursor': 'nope'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('api_transactions'), params).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_transaction', args=[0])).status_code, 404)
+
+    def test_ndjson_stream(self):
+        with mock.patch('BluecoinsWeb_app.api.NDJSON_BATCH_SIZE', 10):
+            response = self.client.get(reverse('api_transactions'), {'fields': 'id,date'},
+                                       HTTP_ACCEPT='application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [tx.pk for tx in reversed(self.transactions)])
+        self.assertEqual(rows[-1]['date'], '2025-01-01T00:00:00Z')
+
+    def test_etag(self):
+        url = reverse('api_transactions')
+        etag = self.client.get(url, {'limit': 5})['ETag']
+        self.assertNotEqual(self.client.get(url, {'limit': 6})['ETag'], etag)
+        with self.assertNumQueries(0, using='bluecoins'):
+            response = self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with mock.patch('BluecoinsWeb_app.caching.backup_fingerprint', return_value='new backup'):
+            self.assertEqual(self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_catalog_endpoints(self):
+        self.assertEqual(self.client.get(reverse('api_labels'), {'fields': 'name,count'}).json(),
+                         {'labels': [{'name': 'Trip', 'count': 5}]})
+        accounts = self.client.get(reverse('api_accounts')).json()['accounts']
+        self.assertEqual(accounts[0]['balance'], -sum(range(1, 26)) * 1000000)
+        self.assertEqual(self.client.get(reverse('api_categories'), {'fields': 'name'}).json(),
+                         {'categories': [{'name': 'Food'}]})
+        months = self.client.get(reverse('api_monthly_totals')).json()['months']
+        self.assertEqual(months, [{'month': '2025-01', 'income': 0, 'expense': -325000000,
+                                   'net': -325000000, 'count': 25}])
+        groups = self.client.get(reverse('api_category_totals'), {'label': 'Trip'}).json()['groups']
+        self.assertEqual(groups[0]['parents'][0]['categories'][0]['total'], -15000000)
+
+
+class ConditionalGetTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(5)
+
+    def test_validators(self):
+        response = self.client.get(reverse('transactions_list'))
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['X-Accel-Expires'], str(settings.BLUECOINS_PROXY_CACHE_SECONDS))
+        self.assertIn('X-Requested-With', response['Vary'])
+        ajax = self.client.get(reverse('transactions_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertNotEqual(ajax['ETag'], response['ETag'])
+        self.assertNotEqual(self.client.get(reverse('transactions_list'), {'label': 'x'})['ETag'], response['ETag'])
+
+    def test_unchanged_page_runs_no_query(self):
+        url = reverse('report_by_month')
+        response = self.client.get(url)
+        with self.assertNumQueries(0, using='bluecoins'), self.assertNumQueries(0, using='default'):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        with mock.patch('BluecoinsWeb_app.caching.backup_fingerprint', return_value='new backup'):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_exempt_and_failed_responses(self):
+        self.assertNotIn('ETag', self.client.get(reverse('cache_stats')))
+        self.assertNotIn('ETag', self.client.get(reverse('transactions_list'), {'cursor': 'bad'}))
+        self.assertNotIn('ETag', self.client.post(reverse('transactions_list')))
+
+    def test_form_pages(self):
+        # Their CSRF token and cookie are never cached nor revalidated
+        tx = Transactions_table.objects.first()
+        for url in (reverse('transaction_create'), reverse('transaction_delete', args=[tx.pk]), reverse('login')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+                for header in ('ETag', 'Last-Modified', 'X-Accel-Expires'):
+                    self.assertNotIn(header, response)
+                etag, _ = request_validators(response.wsgi_request)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag,
+                                           HTTP_IF_MODIFIED_SINCE='Fri, 31 Dec 9999 23:59:59 GMT')
+                self.assertEqual(response.status_code, 200)
+
+
+class SearchTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transactions = cls.create_transactions(80)
+        for tx in cls.transactions[:30]:
+            tx.notes = f'Café con leche {tx.pk}'
+            tx.save()
+        for tx in cls.transactions[20:40]:
+            Labels_table.objects.create(label_name='Vacaciones', transaction_id_labels=tx)
+
+    def walk(self, params):
+        """
+        Transaction IDs of every infinite-scroll page of a search.
+        """
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('transactions_list'), {**params, **({'cursor': cursor} if cursor else {})},
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+            seen.extend(int(pk) for pk in re.findall(r"/transactions/(\d+)/'", response['transactions_html']))
+            cursor = response['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_search_terms(self):
+        self.assertEqual(search_terms('Café, "Leche" OR vaca*'), ['cafe', 'leche', 'or', 'vaca'])
+        self.assertEqual(search_transactions(' "* '), [])
+
+    def test_like_fallback(self):
+        self.assertFalse(has_search_index())
+        self.assertEqual(len(search_transactions('leche', limit=100)), 30)
+        self.assertEqual(len(search_transactions('vaca', limit=100)), 20)
+        self.assertEqual(len(search_transactions('leche vacaciones', limit=100)), 10)
+
+    def test_index_matches_the_fallback(self):
+        queries = ['leche', 'vaca', 'leche vacaciones', 'food', 'check', 'nothing']
+        like = {query: sorted(search_transactions(query, limit=100)) for query in queries}
+        build_search_index(connections['bluecoins'].connection)
+        self.assertTrue(has_search_index())
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(sorted(search_transactions(query, limit=100)), like[query])
+        self.assertEqual(len(search_transactions('item', TransactionFilter(labels=['Vacaciones']), limit=100)), 20)
+        # Words match from their start, without diacritics
+        self.assertEqual(len(search_transactions('cafe', limit=100)), 30)
+        items = {tx.pk for tx in self.transactions if tx.item_id.item_name.startswith('Item 7')}
+        self.assertEqual(len(items), 11)  # Item 7, Item 70..79
+        self.assertEqual(set(search_transactions('item 7', limit=100)) - items,
+                         {tx.pk for tx in self.transactions[:30] if str(tx.pk).startswith('7')})
+
+    def test_ranking(self):
+        Transactions_table.objects.filter(pk=self.transactions[50].pk).update(notes='Vacaciones')
+        build_search_index(connections['bluecoins'].connection)
+        # A match in the labels weighs more than one in the notes
+        ranked = search_transactions('vacaciones', limit=100)
+        self.assertEqual(len(ranked), 21)
+        self.assertEqual(ranked[-1], self.transactions[50].pk)
+
+    def test_list_view(self):
+        build_search_index(connections['bluecoins'].connection)
+        response = self.client.get(reverse('transactions_list'), {'q': 'leche'})
+        self.assertContains(response, 'value="leche"')
+        self.assertEqual(len(response.context['object_list']), 30)
+        seen = self.walk({'q': 'item'})
+        self.assertEqual(sorted(seen), sorted(tx.pk for tx in self.transactions))
+        self.assertEqual(sorted(self.walk({'q': 'item', 'label': 'Vacaciones'})),
+                         sorted(tx.pk for tx in self.transactions[20:40]))
+
+    def test_cursor_offset_out_of_range(self):
+        for index in (False, True):
+            if index:
+                build_search_index(connections['bluecoins'].connection)
+            for offset in (-1, MAX_OFFSET + 1, 2 ** 70):
+                response = self.client.get(reverse('transactions_list'),
+                                           {'q': 'item', 'cursor': encode_offset_cursor(offset)})
+                self.assertEqual(response.status_code, 404, (index, offset))
+            response = self.client.get(reverse('transactions_list'),
+                                       {'q': 'item', 'cursor': encode_offset_cursor(MAX_OFFSET)})
+            self.assertEqual(len(response.context['object_list']), 0)
+
+
+class ReportByCategoryTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        expense = Category_group_table.objects.create(category_group_name='Expense')
+        cls.accounts = [Accounts_table.objects.create(account_name=name) for name in ('Checking', 'Wallet')]
+        day = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        for p in range(5):
+            parent = Parent_category_table.objects.create(parent_category_name=f'Parent {p}',
+                                                          category_group_id=expense)
+            for c in range(10):
+                child = Child_category_table.objects.create(child_category_name=f'Child {p}.{c}',
+                                                            parent_category_id=parent)
+                for n, account in enumerate(cls.accounts):
+                    Transactions_table.objects.create(amount=-1000000, category_id=child, account_id=account,
+                                                      date=day + timedelta(days=n * 31))
+
+    def test_reads_the_monthly_rollups(self):
+        with self.assertNumQueries(3, using='bluecoins'):  # table lookup, rollups and category names
+            report = category_report()
+        self.assertEqual(len(report), 1)
+        group = report[0]
+        self.assertEqual((group['name'], group['total_amount'], group['count']), ('Expense', -100000000, 100))
+        self.assertEqual(len(group['parents']), 5)
+        for parent in group['parents']:
+            self.assertEqual(parent['total_amount'], -20000000)
+            self.assertEqual(sum(child['total_amount'] for child in parent['children']), parent['total_amount'])
+
+    def test_date_and_account_filters(self):
+        march = category_report(start=datetime(2025, 3, 1).date(), end=datetime(2025, 3, 31).date())
+        self.assertEqual(march[0]['count'], 50)
+        wallet = category_report(account=self.accounts[1].pk)
+        self.assertEqual(wallet[0]['count'], 50)
+        self.assertEqual(category_report(account=self.accounts[1].pk, end=datetime(2025, 3, 31).date()), [])
+        # An account ID beyond SQLite integers is ignored, like any invalid one
+        for url in (reverse('report_by_category'), reverse('report_by_month'), reverse('api_category_totals')):
+            response = self.client.get(url, {'account': '9' * 23, 'start': '2025-03-10'})
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_view(self):
+        monthly_rollups()
+        label_catalog()
+        with self.assertNumQueries(2, using='bluecoins'):  # category names and account selector
+            response = self.client.get(reverse('report_by_category'), {'start': '2025-03-01'})
+        self.assertContains(response, 'Child 4.9')
+
+
+class MonthlyRollupTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accounts = [Accounts_table.objects.create(account_name=name) for name in ('Checking', 'Wallet')]
+        categories = [Child_category_table.objects.create(child_category_name=name) for name in ('Food', 'Salary')]
+        day = datetime(2024, 11, 3, 12, tzinfo=timezone.utc)
+        for n in range(120):
+            Transactions_table.objects.create(amount=(n % 7 - 4) * 1000000, date=day + timedelta(days=n),
+                                              category_id=categories[n % 2], account_id=cls.accounts[n % 3 // 2])
+        Transactions_table.objects.create(amount=-9000000, date=day, account_id=cls.accounts[0],
+                                          category_id=categories[0], transfer_group_id=1)
+
+    def raw_totals(self, start=None, end=None, account=None):
+        qs = filter_transactions(Transactions_table.objects.exclude_transfers(), start, end, account)
+        return {row['category_id']: (row['total'], row['count'])
+                for row in qs.values('category_id').annotate(total=Sum('amount'), count=Count('pk')).order_by()}
+
+    def test_split_range(self):
+        d = lambda *args: datetime(*args).date()
+        self.assertEqual(split_range(), (None, None, []))
+        self.assertEqual(split_range(d(2025, 1, 1), d(2025, 2, 28)), (d(2025, 1, 1), d(2025, 3, 1), []))
+        self.assertEqual(split_range(d(2025, 1, 10), d(2025, 3, 5)),
+                         (d(2025, 2, 1), d(2025, 3, 1), [(d(2025, 1, 10), d(2025, 2, 1)), (d(2025, 3, 1), d(2025, 3, 6))]))
+        self.assertEqual(split_range(d(2025, 1, 10), d(2025, 1, 20))[2], [(d(2025, 1, 10), d(2025, 1, 21))])
+        # date.max has no next day
+        self.assertEqual(split_range(d(2025, 1, 10), date.max), (d(2025, 2, 1), None, [(d(2025, 1, 10), d(2025, 2, 1))]))
+        self.assertEqual(split_range(end=date.max), (None, None, []))
+        self.assertEqual(split_range(d(9999, 12, 5)), (d(9999, 12, 5), d(9999, 12, 5), [(d(9999, 12, 5), None)]))
+        self.assertEqual(rollups_for_range(d(9999, 12, 5), date.max), [])
+        self.assertEqual(self.client.get(reverse('report_by_category'), {'end': '9999-12-31'}).status_code, 200)
+
+    def test_ranges_match_the_raw_rows(self):
+        d = lambda *args: datetime(*args).date()
+        ranges = [(None, None), (d(2024, 12, 1), None), (None, d(2025, 1, 15)), (d(2024, 11, 20), d(2025, 2, 10)),
+                  (d(2025, 1, 1), d(2025, 1, 31)), (d(2025, 1, 5), d(2025, 1, 6)), (d(2025, 2, 1), d(2024, 12, 1))]
+        for start, end in ranges:
+            for account in (None, self.accounts[1].pk):
+                with self.subTest(start=start, end=end, account=account):
+                    self.assertEqual(category_totals(start, end, account), self.raw_totals(start, end, account))
+
+    def test_whole_months_need_no_query(self):
+        monthly_rollups()
+        with self.assertNumQueries(0, using='bluecoins'):
+            report = monthly_report(start=datetime(2024, 12, 1).date(), end=datetime(2025, 1, 31).date())
+        self.assertEqual([month['month'] for month in report],
+                         [datetime(2024, 12, 1).date(), datetime(2025, 1, 1).date()])
+        self.assertEqual(sum(month['count'] for month in report), 62)
+        for month in report:
+            self.assertEqual(month['net'], month['income'] + month['expense'])
+
+    def test_view(self):
+        response = self.client.get(reverse('report_by_month'), {'account': self.accounts[0].pk})
+        self.assertContains(response, 'February 2025')
+        report = response.context['report']
+        self.assertEqual(len(report), 5)  # November 2024 to March 2025
+        self.assertEqual(sum(month['count'] for month in report), 80)
+
+
+class ColumnStoreTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accounts = [Accounts_table.objects.create(account_name=name) for name in ('Checking', 'Wallet')]
+        categories = [Child_category_table.objects.create(child_category_name=name) for name in ('Food', 'Salary')]
+        day = datetime(2024, 11, 3, 12, tzinfo=timezone.utc)
+        for n in range(90):
+            tx = Transactions_table.objects.create(amount=(n % 7 - 4) * 1000000, date=day + timedelta(days=n),
+                                                   category_id=categories[n % 2], account_id=cls.accounts[n % 3 // 2])
+            if n % 4 == 0:
+                Labels_table.objects.create(label_name='Trip', transaction_id_labels=tx)
+        Transactions_table.objects.create(amount=-9000000, date=day, account_id=cls.accounts[0],
+                                          category_id=categories[0], transfer_group_id=1)
+
+    def raw_totals(self, start=None, end=None, account=None, label=None):
+        qs = filter_transactions(Transactions_table.objects.exclude_transfers(), start, end, account)
+        if label:
+            qs = qs.filter(labels_table__label_name=label)
+        return {row['category_id']: (row['total'], row['count'])
+                for row in qs.values('category_id').annotate(total=Sum('amount'), count=Count('pk')).order_by()}
+
+    def test_totals_match_the_raw_rows(self):
+        d = lambda *args: datetime(*args).date()
+        for use_numpy in (True, False):
+            store = ColumnStore.load(get_store().fingerprint, use_numpy=use_numpy)
+            for start, end in [(None, None), (d(2024, 12, 1), d(2025, 1, 15)), (d(2025, 1, 5), d(2025, 1, 5))]:
+                for account in (None, self.accounts[1].pk):
+                    for label in (None, 'Trip', 'Unknown'):
+                        with self.subTest(numpy=store.use_numpy, start=start, end=end, account=account, label=label):
+                            totals = store.group_by_category(store.select(start, end, account, label))
+                            self.assertEqual({category: (income + expense, count)
+                                              for category, (income, expense, count) in totals.items()},
+                                             self.raw_totals(start, end, account, label))
+
+    def test_ids_beyond_32_bits(self):
+        category = Child_category_table.objects.create(pk=2 ** 40, child_category_name='Big')
+        account = Accounts_table.objects.create(pk=2 ** 33, account_name='Big')
+        Transactions_table.objects.create(amount=-5000000, date=datetime(2025, 1, 1, tzinfo=timezone.utc),
+                                          category_id=category, account_id=account)
+        for use_numpy in (True, False):
+            store = ColumnStore.load('large ids', use_numpy=use_numpy)
+            with self.subTest(numpy=store.use_numpy):
+                totals = store.group_by_category(store.select(account=account.pk))
+                self.assertEqual(totals, {category.pk: (0, -5000000, 1)})
+
+    def test_engines_agree(self):
+        rollups = monthly_report()
+        with override_settings(BLUECOINS_ANALYTICS='columnar'):
+            self.assertEqual(monthly_report(), rollups)
+
+    def test_store_is_loaded_once_per_backup(self):
+        with self.assertNumQueries(2, using='bluecoins'):
+            store = get_store()
+            self.assertIs(get_store(), store)
+        self.assertEqual(len(store), 91)
+        self.assertLess(store.nbytes(), 91 * 64)
+
+    def test_running_balance(self):
+        store = get_store()
+        ids, balances = store.running_balance(store.select(account=self.accounts[0].pk, exclude_transfers=False))
+        amounts = dict(Transactions_table.objects.filter(account_id=self.accounts[0]).values_list('pk', 'amount'))
+        self.assertEqual(sorted(ids), sorted(amounts))
+        self.assertEqual(balances[-1], sum(amounts.values()))
+        self.assertEqual(balances[1] - balances[0], amounts[ids[1]])
+
+    def test_label_filter_in_views(self):
+        response = self.client.get(reverse('report_by_month'), {'label': 'Trip'})
+        self.assertEqual(sum(month['count'] for month in response.context['report']), 23)
+        self.assertContains(response, '<option value="Trip" selected>')
+        response = self.client.get(reverse('report_by_category'), {'label': 'Trip'})
+        self.assertEqual(sorted(amount for _, amount in response.context['categories_data']),
+                         sorted(total for total, _ in self.raw_totals(label='Trip').values()))
+        response = self.client.get(reverse('report_by_category'), {'label': 'Trip', 'end': '9999-12-31'})
+        self.assertEqual(len(response.context['categories_data']), len(self.raw_totals(label='Trip')))
+
+
+class AccountBalanceTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.checking = Accounts_table.objects.create(account_name='Checking', account_currency='USD',
+                                                     account_conversion_rate_new=1.0)
+        cls.euros = Accounts_table.objects.create(account_name='Euros', account_currency='EUR',
+                                                  account_conversion_rate_new=1.25)
+        day = datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+        for n in range(60):
+            account, rate = (cls.checking, 1.0) if n % 3 else (cls.euros, 1.25)
+            Transactions_table.objects.create(amount=(n % 5 - 2) * 1000000, date=day + timedelta(hours=n * 9),
+                                              account_id=account, conversion_rate_new=rate)
+
+    def naive_balances(self, until):
+        return {account.pk: round(sum(tx.amount * (tx.conversion_rate_new or 1)
+                                      for tx in Transactions_table.objects.filter(account_id=account, date__lte=until)))
+                for account in (self.checking, self.euros)}
+
+    def test_balances_match_the_raw_rows(self):
+        timeline = balance_timeline()
+        for moment in (datetime(2024, 12, 31, tzinfo=timezone.utc), datetime(2025, 1, 5, 12, tzinfo=timezone.utc),
+                       datetime(2025, 1, 10, 23, 59, 59, tzinfo=timezone.utc), datetime(2025, 3, 1, tzinfo=timezone.utc)):
+            with self.subTest(moment=moment):
+                self.assertEqual(timeline.balances_at(moment), self.naive_balances(moment))
+        end_of_day = datetime(2025, 1, 10, 23, 59, 59, tzinfo=timezone.utc)
+        self.assertEqual(timeline.balances_at(end_of_day.date()), self.naive_balances(end_of_day))
+
+    def test_dates_need_no_query_once_cached(self):
+        balance_timeline()
+        with self.assertNumQueries(0, using='bluecoins'):
+            balance_timeline().balances_at(datetime(2025, 1, 7).date())
+            net_worth_series(interval='week')
+        with self.assertNumQueries(1, using='bluecoins'):
+            balance_timeline().balances_at(datetime(2025, 1, 7, 12, tzinfo=timezone.utc))
+
+    def test_account_currency(self):
+        accounts = {account['id']: account for account in balance_timeline().account_balances(datetime(2025, 3, 1).date())}
+        euros = accounts[self.euros.pk]
+        self.assertEqual(euros['currency'], 'EUR')
+        self.assertEqual(euros['balance'], round(euros['default_currency_balance'] / 1.25))
+
+    def test_period_ends(self):
+        d = lambda *args: datetime(*args).date()
+        self.assertEqual(period_ends(d(2025, 1, 15), d(2025, 3, 10)), [d(2025, 1, 31), d(2025, 2, 28), d(2025, 3, 10)])
+        self.assertEqual(period_ends(d(2025, 1, 1), d(2025, 1, 10), 'week'), [d(2025, 1, 7), d(2025, 1, 10)])
+        self.assertEqual(period_ends(d(2025, 1, 1), d(2025, 1, 1), 'day'), [d(2025, 1, 1)])
+        # The periods end on date.max, which has no next day
+        self.assertEqual(period_ends(d(9999, 12, 20), date.max, 'week'), [d(9999, 12, 26), date.max])
+        self.assertEqual(period_ends(d(9999, 11, 15), date.max), [d(9999, 11, 30), date.max])
+        self.assertEqual(period_ends(d(9999, 12, 30), date.max, 'day'), [d(9999, 12, 30), date.max])
+        # Counted while generated, not after looping through every period
+        with self.assertRaises(ValueError):
+            period_ends(date.min, date.max, 'day', limit=3)
+        self.assertEqual(len(period_ends(d(2025, 1, 1), d(2025, 1, 3), 'day', limit=3)), 3)
+
+    def test_views(self):
+        response = self.client.get(reverse('account_balances'), {'date': '2025-01-05T12:00:00'}).json()
+        self.assertEqual(response['net_worth'], sum(self.naive_balances(datetime(2025, 1, 5, 12, tzinfo=timezone.utc)).values()))
+        series = self.client.get(reverse('net_worth'), {'interval': 'day'}).json()['series']
+        self.assertEqual(series[0]['date'], '2025-01-01')
+        self.assertEqual(series[-1]['net_worth'], sum(self.naive_balances(datetime(2025, 3, 1, tzinfo=timezone.utc)).values()))
+        self.assertEqual(self.client.get(reverse('net_worth'), {'interval': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('account_balances'), {'date': 'soon'}).status_code, 400)
+        for interval in ('day', 'week', 'month'):
+            response = self.client.get(reverse('net_worth'), {'end': '9999-12-31', 'interval': interval})
+            self.assertEqual(response.status_code, 400, interval)  # too many points
+            response = self.client.get(reverse('net_worth'), {'start': '9999-12-01', 'end': '9999-12-31',
+                                                              'interval': interval})
+            self.assertEqual(response.json()['series'][-1]['date'], '9999-12-31')
+        for value in ('0001-01-01T00:00:00+01:00', '9999-12-31T23:59:59-01:00'):
+            self.assertEqual(self.client.get(reverse('account_balances'), {'date': value}).status_code, 400)
+
+
+class LabelCatalogTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(4, label='Vacation', start=datetime(2024, 7, 1, tzinfo=timezone.utc))
+        cls.create_transactions(2, label='Gift', start=datetime(2024, 12, 24, tzinfo=timezone.utc))
+
+    def test_catalog_is_computed_once_per_backup(self):
+        with self.assertNumQueries(2, using='bluecoins'):  # table lookup and catalog
+            catalog = label_catalog()
+            label_catalog()
+        self.assertEqual([(label['name'], label['count']) for label in catalog], [('Gift', 2), ('Vacation', 4)])
+        self.assertEqual(catalog[1]['first_date'], datetime(2024, 7, 1, tzinfo=timezone.utc))
+        self.assertEqual(catalog[1]['last_date'], datetime(2024, 7, 1, 3, tzinfo=timezone.utc))
+
+    def test_ajax_pages_skip_the_catalog(self):
+        self.client.get(reverse('transactions_list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(self.client.get(reverse('cache_stats')).json()['namespaces']['label_catalog']['misses'], 0)
+
+    def test_json_endpoint(self):
+        labels = self.client.get(reverse('labels_json')).json()['labels']
+        self.assertEqual(labels[0], {'name': 'Gift', 'count': 2, 'first_date': '2024-12-24T00:00:00+00:00',
+                                     'last_date': '2024-12-24T01:00:00+00:00'})
+
+    def test_unknown_label_report_runs_no_transaction_query(self):
+        label_catalog()
+        with self.assertNumQueries(0, using='bluecoins'):
+            response = self.client.get(reverse('report_by_label'), {'label': 'Missing'})
+        self.assertTemplateUsed(response, 'no_transactions_report.html')
+
+
+class TransferMirrorTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        item = Item_table.objects.create(item_name='Coffee')
+        day = datetime(2025, 5, 1, tzinfo=timezone.utc)
+        # The same item bought twice and refunded once is not a transfer
+        cls.purchases = [Transactions_table.objects.create(item_id=item, amount=amount, date=day)
+                         for amount in (-3000000, -3000000, 3000000)]
+        checking = Accounts_table.objects.create(account_name='Checking')
+        savings = Accounts_table.objects.create(account_name='Savings')
+        cls.outgoing = Transactions_table.objects.create(amount=-50000000, date=day, account_id=checking,
+                                                         account_pair_id=savings.pk, transfer_group_id=100)
+        cls.incoming = Transactions_table.objects.create(amount=50000000, date=day, account_id=savings,
+                                                         account_pair_id=checking.pk, transfer_group_id=100,
+                                                         uid_pair_id=cls.outgoing.pk)
+        cls.outgoing.uid_pair_id = cls.incoming.pk
+        cls.outgoing.save()
+
+    def test_exclude_transfer_mirrors(self):
+        self.assertCountEqual(Transactions_table.objects.exclude_transfer_mirrors(),
+                              self.purchases + [self.outgoing])
+
+    def test_exclude_transfers(self):
+        self.assertCountEqual(Transactions_table.objects.exclude_transfers(), self.purchases)
+
+
+class ReportByLabelExcelTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(30, label='Vacation', start=datetime(2025, 1, 20, tzinfo=timezone.utc))
+        for tx in cls.create_transactions(30, start=datetime(2025, 1, 20, tzinfo=timezone.utc)):
+            # One day apart, so the export spans two months
+            tx.date += timedelta(days=tx.pk % 30)
+            tx.save()
+
+    def test_streams_one_sheet_per_month(self):
+        with self.assertNumQueries(1, using='bluecoins'):  # the joined rows, transfer mirrors excluded in SQL
+            response = self.client.get(reverse('report_by_label'))
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="report_by_label_all.xlsx"')
+        workbook = load_workbook(io.BytesIO(content))
+        self.assertEqual(workbook.sheetnames, ['January 2025', 'February 2025'])
+        rows = [row for ws in workbook.worksheets for row in ws.iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(len(rows), 60)
+        self.assertEqual(rows[0][2:6], ('Item 0', None, 1.0, 'Expense'))
+
+    def test_sheet_names_follow_the_language(self):
+        response = self.client.get(reverse('report_by_label'), HTTP_ACCEPT_LANGUAGE='es')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['enero 2025', 'febrero 2025'])
+
+    def test_label_without_transactions(self):
+        response = self.client.get(reverse('report_by_label'), {'label': 'Missing'})
+        self.assertTemplateUsed(response, 'no_transactions_report.html')
+
+
+class ExportJobTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(5, label='Vacation')
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # No worker threads: the job is written during the request, in the test transaction
+        override = override_settings(BLUECOINS_EXPORT_WORKERS=0, BLUECOINS_EXPORT_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_job_is_written_and_downloaded(self):
+        response = self.client.get(reverse('label_report_job'), {'label': 'Vacation'})
+        self.assertEqual(response.status_code, 200)
+        job = response.json()
+        self.assertEqual((job['status'], job['rows'], job['progress']), ('done', 5, 1))
+
+        self.assertEqual(self.client.get(job['status_url']).json()['status'], 'done')
+        response = self.client.get(job['download_url'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="report_by_label_Vacation.xlsx"')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sum(ws.max_row - 1 for ws in workbook.worksheets), 5)
+
+        # The synchronous report serves the same file
+        response = self.client.get(reverse('report_by_label'), {'label': 'Vacation'})
+        self.assertIsInstance(response, FileResponse)
+
+    def test_identical_requests_share_the_job(self):
+        first = self.client.get(reverse('label_report_job'), {'label': 'Vacation'}).json()
+        with mock.patch('BluecoinsWeb_app.jobs.write_label_report') as write:
+            second = self.client.get(reverse('label_report_job'), {'label': 'Vacation'}).json()
+        write.assert_not_called()
+        self.assertEqual(first['id'], second['id'])
+
+    def test_empty_report(self):
+        job = self.client.get(reverse('label_report_job'), {'label': 'Missing'}).json()
+        self.assertEqual((job['status'], job['download_url']), ('empty', None))
+        self.assertEqual(self.client.get(reverse('export_job_download', args=[job['id']])).status_code, 404)
+
+    def test_progress_is_reported(self):
+        calls = []
+        with mock.patch('BluecoinsWeb_app.exports.EXPORT_CHUNK_SIZE', 2):
+            write_label_report(io.BytesIO(), TransactionFilter(), progress=lambda *args: calls.append(args))
+        self.assertEqual(calls, [(2, 5), (4, 5)])
+
+    def test_expired_jobs_are_deleted(self):
+        job_id = submit_label_report(TransactionFilter(), 'report.xlsx')['id']
+        self.assertTrue(result_path(job_id).exists())
+        self.assertEqual(cleanup_jobs(ttl=-1), 1)
+        self.assertIsNone(get_job(job_id))
+        self.assertFalse(result_path(job_id).exists())
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get(reverse('export_job_status', args=['0' * 20])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_job_status', args=['settings'])).status_code, 404)
+
+
+class BackupWatcherTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.first = self.make_backup('bluecoins_1.fydb', mtime=1000)
+        self.watcher = BackupWatcher(self.first, self.tmp.name, 'bluecoins*.fydb', interval=60)
+        self.events = []
+
+        def receiver(old_path, new_path, **kwargs):
+            self.events.append((old_path, new_path))
+        backup_changed.connect(receiver, weak=False)
+        self.addCleanup(backup_changed.disconnect, receiver)
+
+    def make_backup(self, name, mtime):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_check_is_rate_limited(self):
+        self.make_backup('bluecoins_2.fydb', mtime=2000)
+        self.assertEqual(self.watcher.check(), self.first)
+        self.assertEqual(self.events, [])
+
+    def test_switches_to_newer_backup(self):
+        second = self.make_backup('bluecoins_2.fydb', mtime=2000)
+        self.make_backup('other.fydb', mtime=3000)
+        self.assertEqual(self.watcher.check(force=True), second)
+        self.assertEqual(self.watcher.generation, 1)
+        self.assertEqual(self.events, [(self.first, second)])
+        # Nothing changed since
+        self.watcher.check(force=True)
+        self.assertEqual(self.watcher.generation, 1)
+
+    def test_detects_backup_replaced_in_place(self):
+        os.replace(self.make_backup('upload.tmp', mtime=5000), self.first)
+        self.watcher.check(force=True)
+        self.assertEqual(self.watcher.generation, 1)
+        self.assertEqual(self.events, [(self.first, self.first)])
+
+
+class SidecarTests(TestCase):
+    demo_backup = os.path.join(settings.BASE_DIR, 'databases', 'bluecoins demo.fydb')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.backup = shutil.copy(self.demo_backup, os.path.join(self.tmp.name, 'bluecoins_1.fydb'))
+        sidecar_dir = os.path.join(self.tmp.name, 'sidecar')
+        override = override_settings(BLUECOINS_SIDECAR_DIR=sidecar_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_build_adds_indexes_and_statistics(self):
+        self.assertIsNone(find_sidecar(self.backup))
+        path = build_sidecar(self.backup)
+        self.assertEqual(find_sidecar(self.backup), path)
+
+        connection = sqlite3.connect(path)
+        self.addCleanup(connection.close)
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({name for name, _, _ in SIDECAR_INDEXES} <= indexes)
+        self.assertTrue(connection.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0])
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT transactionIDLabels FROM LABELSTABLE WHERE labelName = 'Utilities'"
+        ).fetchall()
+        self.assertIn('web_labels_name', str(plan))
+        self.assertIn(ROLLUP_TABLE, {row[0] for row in connection.execute("SELECT name FROM sqlite_master")})
+        self.assertEqual(connection.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}_docsize').fetchone(),
+                         connection.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone())
+
+        # The backup itself is not modified
+        backup = sqlite3.connect(f'file:{self.backup}?mode=ro', uri=True)
+        self.addCleanup(backup.close)
+        self.assertEqual(backup.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone(),
+                         connection.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone())
+        self.assertNotIn('web_labels_name', str(backup.execute('SELECT name FROM sqlite_master').fetchall()))
+
+    def test_paths_with_uri_characters(self):
+        directory = os.path.join(self.tmp.name, 'backups #1 ?50%')
+        os.mkdir(directory)
+        backup = shutil.copy(self.backup, os.path.join(directory, 'bluecoins_1.fydb'))
+        with override_settings(BLUECOINS_SIDECAR_DIR=os.path.join(directory, 'sidecar #2')):
+            path = build_sidecar(backup)
+            self.assertGreater(time_label_filters(path, 1), 0)
+            newer = modified_copy(backup, os.path.join(directory, 'bluecoins_2.fydb'), os.path.getmtime(backup) + 60)
+            with sqlite3.connect(build_sidecar(newer)) as connection:
+                self.assertEqual(connection.execute('SELECT COUNT(*) FROM web_changes').fetchone(), (3,))
+            connection.close()
+
+    def test_old_sidecars_are_pruned(self):
+        paths = []
+        for n in range(3):
+            os.utime(self.backup, (1000 + n, 1000 + n))  # a new fingerprint each time
+            paths.append(build_sidecar(self.backup))
+            os.utime(paths[-1], (2000 + n, 2000 + n))
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True])
+
+    def test_recently_replaced_sidecars_are_kept(self):
+        # Workers that have not switched yet may still open them
+        paths = []
+        for n in range(3):
+            os.utime(self.backup, (1000 + n, 1000 + n))
+            paths.append(build_sidecar(self.backup))
+        self.assertEqual([os.path.exists(path) for path in paths], [True, True, True])
+        replaced = time.time() - PRUNE_GRACE_SECONDS - 1
+        os.utime(paths[0], (replaced - 1, replaced - 1))
+        os.utime(paths[1], (replaced, replaced))
+        prune_sidecars(keep=paths[2])
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True])
+
+    def test_failed_background_build_is_not_retried(self):
+        self.addCleanup(_failed_builds.clear)
+        with mock.patch('BluecoinsWeb_app.sidecar.build_sidecar', side_effect=sqlite3.DatabaseError) as build, \
+                self.assertLogs('BluecoinsWeb_app.sidecar', 'ERROR'):
+            build_in_background(self.backup).join()
+            self.assertIsNone(build_in_background(self.backup))
+        self.assertEqual(build.call_count, 1)
+        # A new backup has a new fingerprint
+        os.utime(self.backup, (1000, 1000))
+        build_in_background(self.backup).join()
+        self.assertTrue(find_sidecar(self.backup))
+
+
+    def test_incremental_build_matches_full_build(self):
+        os.utime(self.backup, (1000, 1000))
+        build_sidecar(self.backup)
+        second = modified_copy(self.backup, os.path.join(self.tmp.name, 'bluecoins_2.fydb'), mtime=2000)
+        updated = sqlite3.connect(build_sidecar(second))
+        self.addCleanup(updated.close)
+        self.assertEqual(read_meta(updated)['previous_backup'], self.backup)
+        self.assertEqual(updated.execute('SELECT change, COUNT(*) FROM web_changes GROUP BY 1 ORDER BY 1').fetchall(),
+                         [('deleted', 1), ('inserted', 1), ('updated', 1)])
+
+        with override_settings(BLUECOINS_SIDECAR_DIR=os.path.join(self.tmp.name, 'full')):
+            full = sqlite3.connect(build_sidecar(second))
+        self.addCleanup(full.close)
+        self.assertNotIn('previous_backup', read_meta(full))
+        for query in [f'SELECT * FROM {ROLLUP_TABLE} ORDER BY 1, 2, 3, 4', f'SELECT * FROM {LABEL_CATALOG_TABLE}',
+                      'SELECT * FROM web_search_terms', 'SELECT * FROM TRANSACTIONSTABLE ORDER BY 1',
+                      'SELECT * FROM LABELSTABLE ORDER BY 1', 'SELECT * FROM ITEMTABLE ORDER BY 1']:
+            with self.subTest(query=query):
+                self.assertEqual(updated.execute(query).fetchall(), full.execute(query).fetchall())
+        for term in ('zebra', 'quokka', 'wombat', 'food'):
+            query = f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ? ORDER BY rowid"
+            with self.subTest(term=term):
+                self.assertEqual(updated.execute(query, [term]).fetchall(), full.execute(query, [term]).fetchall())
+        updated.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('integrity-check')")
+
+
+class IngestTests(BluecoinsTestCase):
+    demo_backup = SidecarTests.demo_backup
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = os.path.join(self.tmp.name, 'backups')
+        override = override_settings(BLUECOINS_DB_DIR=self.directory,
+                                     BLUECOINS_SIDECAR_DIR=os.path.join(self.tmp.name, 'sidecar'))
+        override.enable()
+        self.addCleanup(override.disable)
+        with open(self.demo_backup, 'rb') as f:
+            self.demo = f.read()
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+    def upload(self, data):
+        return self.client.post(reverse('upload_backup'), data, content_type='application/octet-stream')
+
+    def backups(self):
+        return sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []
+
+    def test_upload_is_checked_and_swapped_in(self):
+        response = self.upload(self.demo)
+        self.assertEqual(response.status_code, 201)
+        name = response.json()['path']
+        self.assertEqual(self.backups(), [name])
+        self.assertTrue(name.startswith('bluecoins_upload_') and name.endswith('.fydb'))
+        path = os.path.join(self.directory, name)
+        demo = sqlite3.connect(f'file:{self.demo_backup}?mode=ro', uri=True)
+        self.addCleanup(demo.close)
+        self.assertEqual(response.json()['transactions'],
+                         demo.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone()[0])
+        # The sidecar is ready before the backup appears
+        self.assertIsNotNone(find_sidecar(path))
+        self.assertEqual(self.client.get(reverse('upload_backup')).status_code, 200)
+
+    def test_invalid_uploads_are_rejected(self):
+        renamed = os.path.join(self.tmp.name, 'other_version.fydb')
+        shutil.copy(self.demo_backup, renamed)
+        with sqlite3.connect(renamed) as backup:
+            backup.execute("UPDATE room_master_table SET identity_hash = '0' WHERE id = 42")
+        backup.close()
+        with open(renamed, 'rb') as f:
+            other_version = f.read()
+
+        for data, error in [(b'not a backup' * 100, 'Not a SQLite database'),
+                            (self.demo[:-100], 'Truncated database'),
+                            (other_version, 'Unsupported Bluecoins version')]:
+            response = self.upload(data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.json()['error'])
+        with override_settings(BLUECOINS_UPLOAD_MAX_BYTES=1000):
+            self.assertEqual(self.upload(self.demo).status_code, 413)
+        # Nothing is left behind
+        self.assertEqual(self.backups(), [])
+
+        self.client.force_login(User.objects.create_user('guest'))
+        self.assertEqual(self.upload(self.demo).status_code, 403)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('ingest_backup', self.demo_backup, '--no-warmup', stdout=out)
+        self.assertEqual(len(self.backups()), 1)
+        self.assertIn(self.backups()[0], out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('ingest_backup', self.demo_backup, '--max-bytes', '1000', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('ingest_backup', self.demo_backup, '--user', 'nobody', stdout=io.StringIO())
+
+
+@override_settings(BLUECOINS_TENANTS=True, BLUECOINS_SIDECAR=False)
+class TenantTests(BluecoinsTestCase):
+    demo_backup = os.path.join(settings.BASE_DIR, 'databases', 'bluecoins demo.fydb')
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = get_pool()
+        self.addCleanup(self.pool.clear)
+        self.alice = self.register('alice')
+        self.bob = self.register('bob', keep=3)
+
+    def register(self, username, keep=None):
+        directory = os.path.join(self.tmp.name, username)
+        os.mkdir(directory)
+        path = shutil.copy(self.demo_backup, os.path.join(directory, 'bluecoins_1.fydb'))
+        if keep is not None:
+            with sqlite3.connect(path) as backup:
+                backup.execute('DELETE FROM TRANSACTIONSTABLE WHERE transactionsTableID NOT IN '
+                               '(SELECT transactionsTableID FROM TRANSACTIONSTABLE ORDER BY date DESC LIMIT ?)', [keep])
+            backup.close()
+        user = User.objects.create_user(username)
+        alias = UserBackup.objects.create(user=user, directory=directory).alias
+        # The users' aliases are only defined once their backups are opened
+        self.addCleanup(setattr, type(self), 'databases', self.databases)
+        type(self).databases = self.databases | {alias}
+        return user
+
+    def transaction_count(self, user, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('api_transactions'), {'fields': 'id', 'limit': 500, **params})
+        if params.get('format') == 'ndjson':
+            return len(b''.join(response.streaming_content).splitlines())
+        return len(response.json()['transactions'])
+
+    def test_each_user_reads_own_backup(self):
+        self.assertEqual(BluecoinsDBRouter().db_for_read(UserBackup), 'default')
+        self.assertEqual(self.transaction_count(self.bob), 3)
+        self.assertGreater(self.transaction_count(self.alice), 3)
+        # Streams are generated after the middleware returns
+        self.assertEqual(self.transaction_count(self.bob, format='ndjson'), 3)
+        self.assertEqual(BluecoinsDBRouter().db_for_read(Transactions_table), 'bluecoins')
+
+    def test_users_without_backup(self):
+        response = self.client.get(reverse('transactions_list'))
+        self.assertRedirects(response, '/accounts/login/?next=/transactions/', fetch_redirect_response=False)
+        self.client.force_login(User.objects.create_user('carol'))
+        self.assertEqual(self.client.get(reverse('transactions_list')).status_code, 403)
+
+    def test_first_upload_into_own_directory(self):
+        carol = User.objects.create_user('carol')
+        directory = os.path.join(self.tmp.name, 'carol')
+        alias = UserBackup.objects.create(user=carol, directory=directory).alias
+        self.addCleanup(setattr, type(self), 'databases', self.databases)
+        type(self).databases = self.databases | {alias}
+        self.client.force_login(carol)
+        self.assertEqual(self.client.get(reverse('transactions_list')).status_code, 404)
+
+        with open(self.demo_backup, 'rb') as f:
+            response = self.client.post(reverse('upload_backup'), f.read(), content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(os.listdir(directory), [response.json()['path']])
+        self.assertGreater(self.transaction_count(carol), 3)
+
+    def test_changes_since_previous_backup(self):
+        directory = UserBackup.objects.get(user=self.alice).directory
+        first = os.path.join(directory, 'bluecoins_1.fydb')
+        os.utime(first, (1000, 1000))
+        second = modified_copy(first, os.path.join(directory, 'bluecoins_2.fydb'), mtime=2000)
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('backup_changes'))
+        self.assertEqual(response.context['previous'], 'bluecoins_1.fydb')
+        self.assertEqual([(section['kind'], section['count']) for section in response.context['sections']],
+                         [('inserted', 1), ('updated', 1), ('deleted', 1)])
+        self.assertContains(response, 'Zebra')
+        self.assertContains(response, '$-7.00')
+
+        os.unlink(first)
+        os.utime(second, (3000, 3000))  # a new fingerprint: not cached
+        self.assertContains(self.client.get(reverse('backup_changes')), 'This is the first backup')
+
+    def test_least_recently_used_backup_is_closed(self):
+        self.pool.max_open = 1
+        self.addCleanup(setattr, self.pool, 'max_open', settings.BLUECOINS_MAX_OPEN_BACKUPS)
+        alice, bob = UserBackup.objects.get(user=self.alice).alias, UserBackup.objects.get(user=self.bob).alias
+        self.transaction_count(self.alice)
+        self.assertIn(alice, self.pool)
+        self.assertEqual(self.transaction_count(self.bob), 3)
+        self.assertNotIn(alice, self.pool)
+        self.assertNotIn(alice, connections.settings)
+        self.assertGreater(self.transaction_count(self.alice), 3)
+        self.assertEqual(len(self.pool), 1)
+
+
+class ReadOnlyProfileTests(BluecoinsTestCase):
+    demo_backup = os.path.join(settings.BASE_DIR, 'databases', 'bluecoins demo.fydb')
+
+    def test_backup_is_opened_read_only(self):
+        wrapper = DatabaseWrapper({**connections['bluecoins'].settings_dict, 'NAME': self.demo_backup}, 'demo')
+        self.addCleanup(wrapper.close)
+        self.assertTrue(wrapper.get_connection_params()['database'].endswith('?mode=ro&immutable=1'))
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone(), (1,))
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone(), (2,))  # MEMORY
+            with self.assertRaises(OperationalError):
+                cursor.execute('DELETE FROM LABELSTABLE')
+
+    def test_in_memory_database_is_writable(self):
+        self.assertEqual(connections['bluecoins'].tuned_pragmas, [])
+        self.create_transactions(1)
+
+    @override_settings(BLUECOINS_DB_READ_ONLY=True)
+    def test_write_views_are_forbidden(self):
+        tx, = self.create_transactions(1)
+        self.assertEqual(self.client.post(reverse('transaction_delete', args=[tx.pk])).status_code, 403)
+        self.assertTrue(Transactions_table.objects.filter(pk=tx.pk).exists())
+
+
+class GenerateBackupTests(SimpleTestCase):
+    demo_backup = SidecarTests.demo_backup
+
+    def test_backup_has_the_schema_of_a_real_one(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        output = os.path.join(tmp.name, 'synthetic.fydb')
+        call_command('generate_backup', output, transactions=500, labels=5, accounts=3, stdout=io.StringIO())
+
+        generated = sqlite3.connect(output)
+        self.addCleanup(generated.close)
+        demo = sqlite3.connect(f'file:{self.demo_backup}?mode=ro', uri=True)
+        self.addCleanup(demo.close)
+        schema = "SELECT name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY name"
+        self.assertEqual(generated.execute(schema).fetchall(), demo.execute(schema).fetchall())
+        self.assertEqual(generated.execute('SELECT * FROM room_master_table').fetchall(),
+                         demo.execute('SELECT * FROM room_master_table').fetchall())
+
+        self.assertEqual(generated.execute('SELECT COUNT(*) FROM TRANSACTIONSTABLE').fetchone(), (500,))
+        legs, unpaired = generated.execute(
+            'SELECT COUNT(*), SUM(p.transactionsTableID IS NULL) FROM TRANSACTIONSTABLE t '
+            'LEFT JOIN TRANSACTIONSTABLE p ON p.transactionsTableID = t.uidPairID AND p.uidPairID = t.transactionsTableID '
+            'AND p.transferGroupID = t.transferGroupID AND p.amount = -t.amount '
+            'WHERE t.transferGroupID IS NOT NULL').fetchone()
+        self.assertTrue(legs)
+        self.assertEqual(unpaired, 0)
+        self.assertEqual(generated.execute('SELECT COUNT(DISTINCT labelName) FROM LABELSTABLE').fetchone(), (5,))
+        with self.assertRaises(CommandError):
+            call_command('generate_backup', output, stdout=io.StringIO())
+
+
+class InstrumentationTests(BluecoinsTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_transactions(3, label='Vacation')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('transactions_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+')
+        self.assertIn('db-bluecoins;dur=', timing)
+        self.assertIn('desc="4 queries"', timing)
+        self.assertRegex(timing, r'template;dur=[\d.]+')
+
+    def test_sql_shape(self):
+        self.assertEqual(sql_shape("SELECT * FROM T WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+                         sql_shape("SELECT * FROM T WHERE id IN (%s, %s) AND name = 'y' LIMIT 50"))
+
+    @override_settings(BLUECOINS_N_PLUS_ONE_THRESHOLD=1)
+    def test_repeated_statements_are_logged(self):
+        tx = Transactions_table.objects.first()
+        with self.assertLogs('BluecoinsWeb_app.requests', 'WARNING') as logs:
+            # The detail view reads the transaction and its type twice
+            self.client.get(reverse('transaction_detail', args=[tx.pk]))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('transaction_detail', args=[tx.pk]))
+        self.assertFalse(record['slow'])
+        self.assertIn('TRANSACTIONSTABLE', record['repeated'][0]['sql'])
+        self.assertEqual(record['repeated'][0]['count'], 2)
+        self.assertTrue(record['slowest'])
+
+    @override_settings(BLUECOINS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('BluecoinsWeb_app.requests', 'WARNING') as logs:
+            self.client.get(reverse('report_by_category'))
+        self.assertTrue(json.loads(logs.records[0].getMessage())['slow'])
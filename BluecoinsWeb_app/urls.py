@@ -1,7 +1,7 @@
 # bluecoins_app/urls.py
 
 from django.urls import path
-from . import views
+from . import api, views
 from .views import report_by_label_excel
 
 
@@ -13,5 +13,22 @@ urlpatterns = [
     path('transactions/<int:pk>/edit/', views.TransactionUpdateView.as_view(), name='transaction_update'),
     path('transactions/<int:pk>/delete/', views.TransactionDeleteView.as_view(), name='transaction_delete'),
     path('reports_by_category/', views.ReportByCategoryView,  name='report_by_category'),
+    path('reports_by_month/', views.ReportByMonthView, name='report_by_month'),
     path('reports_by_label/', report_by_label_excel, name='report_by_label'),
+    path('exports/label_report/', views.label_report_job, name='label_report_job'),
+    path('exports/<str:job_id>/', views.export_job_status, name='export_job_status'),
+    path('exports/<str:job_id>/download/', views.export_job_download, name='export_job_download'),
+    path('labels/', views.labels_json, name='labels_json'),
+    path('accounts/balances/', views.account_balances_json, name='account_balances'),
+    path('accounts/net_worth/', views.net_worth_json, name='net_worth'),
+    path('backups/upload/', views.upload_backup, name='upload_backup'),
+    path('backups/changes/', views.backup_changes_view, name='backup_changes'),
+    path('cache/stats/', views.cache_stats_view, name='cache_stats'),
+    path('api/v1/transactions/', api.transactions, name='api_transactions'),
+    path('api/v1/transactions/<int:pk>/', api.transaction, name='api_transaction'),
+    path('api/v1/accounts/', api.accounts, name='api_accounts'),
+    path('api/v1/categories/', api.categories, name='api_categories'),
+    path('api/v1/labels/', api.labels, name='api_labels'),
+    path('api/v1/reports/monthly/', api.monthly_totals, name='api_monthly_totals'),
+    path('api/v1/reports/categories/', api.category_totals, name='api_category_totals'),
 ]
@@ -1,53 +1,42 @@
 # bluecoins_app/views.py
 # Create your views here.
 
-import locale
+import io
+import os
+import tempfile
 from datetime import datetime
+from django.conf import settings
 from django.shortcuts import render
-from collections import defaultdict, Counter
-from django.urls import reverse_lazy
+from collections import defaultdict
+from django.urls import reverse, reverse_lazy
 from django.http import JsonResponse
-from django.http import HttpResponse
+from django.http import FileResponse
+from django.http import Http404
+from django.core.exceptions import PermissionDenied
 from django.db.models import Prefetch
-from django.db.models import Sum, Case, When
-from django.core.paginator import Paginator
-from django.utils.timezone import localtime
-from django.utils.formats import date_format
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_aware, localdate, make_aware
+from django.utils.translation import get_language
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from openpyxl import Workbook
 import calendar
 
-from .models import Accounts_table, Transactions_table, Child_category_table, Labels_table
-
-
-# Set the local language for month names to Spanish (with fallback)
-def set_spanish_locale():
-    """
-    Try to set Spanish locale for month names, fallback to default if not available.
-    """
-    spanish_locales = [
-        'es_ES.UTF-8',      # Linux/Mac
-        'es_ES',            # Linux/Mac alternative
-        'Spanish_Spain.1252', # Windows
-        'Spanish',          # Windows alternative
-        'esp',              # Some systems
-    ]
-    
-    for locale_name in spanish_locales:
-        try:
-            locale.setlocale(locale.LC_TIME, locale_name)
-            print(f"Successfully set locale to: {locale_name}")
-            return locale_name
-        except locale.Error:
-            continue
-    
-    # If no Spanish locale is available, keep the default
-    print("Warning: No Spanish locale available, using system default")
-    return None
-
-# Attempt to set Spanish locale
-set_spanish_locale()
+from .models import Accounts_table, Transactions_table, Labels_table
+from .balances import balance_timeline, net_worth_series
+from .caching import backup_fingerprint, cache_stats, cached, lookup, store
+from .changes import DELETED, INSERTED, UPDATED, backup_changes
+from .dates import day_keys, group_by_day
+from .filters import TransactionFilter
+from .ingest import UPLOAD_CHUNK_SIZE, InvalidBackup, ingest_backup, warm_up
+from .exports import (
+    LABEL_REPORT_CACHE_MAX_BYTES, XLSX_CONTENT_TYPE, label_report_filename, label_report_parts, write_label_report,
+)
+from .jobs import DONE, FINISHED, get_job, job_id_for, result_path, submit_label_report
+from .labels import get_label, label_catalog, label_names
+from .pagination import InvalidCursor, decode_offset_cursor, paginate_by_date, paginate_ranked
+from .reports import category_report, monthly_report, parse_report_date, parse_report_filters
+from .search import search_transactions
 
 
 class TransactionsListView(ListView):
@@ -55,107 +44,176 @@ class TransactionsListView(ListView):
     template_name = 'transactions_list.html'
     context_object_name = 'transactions'
     paginate_by = 50  # A lower value can give better visual feedback
+    # Foreign keys loaded in the same query as the transactions (one JOIN instead of one query per row)
+    related_fields = ('item_id', 'category_id', 'account_id', 'transaction_type_id')
+    # The only columns read by a ?format=compact page
+    compact_fields = ('transactions_table_id', 'date', 'amount', 'item_id__item_name',
+                      'category_id__child_category_name')
+    # Infinite-scroll JSON without the spaces of json.dumps and with UTF-8 instead of \u escapes
+    json_dumps_params = {'separators': (',', ':'), 'ensure_ascii': False}
+
+    def is_ajax(self):
+        return self.request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+    def is_compact(self):
+        """
+        Infinite-scroll pages asked with ?format=compact are column arrays
+        rendered by the browser (see get_compact_payload) instead of HTML.
+        """
+        return self.is_ajax() and self.request.GET.get('format') == 'compact'
+
+    def uses_cursor(self):
+        """
+        Cursor (keyset) pagination is the default. A ?page=N parameter keeps the
+        legacy offset pagination working for old links, except for searches.
+        """
+        return 'page' not in self.request.GET or bool(self.search_query())
+
+    def search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_filter(self):
+        if not hasattr(self, '_filter'):
+            self._filter = TransactionFilter.from_query(self.request.GET)
+        return self._filter
 
     def get_queryset(self):
         """
-        Returns the queryset of transactions. If there is a label, pagination is
-        handled right here. If not, the full queryset is returned for ListView to paginate.
+        Returns the filtered queryset of transactions (see filters.py), newest first.
+        Both pagination modes slice it in SQL.
         """
-        label = self.request.GET.get('label')
+        return self.get_filter().apply(self.get_unfiltered_queryset())
 
+    def get_unfiltered_queryset(self):
+        """
+        Every transaction, newest first, with the related rows the page shows.
+        """
+        labels = Labels_table.objects.all()
+        qs = Transactions_table.objects.order_by('-date')
+        if self.is_compact():
+            # Compact pages only need the names of the item, category and labels
+            labels = labels.only('label_name', 'transaction_id_labels')
+            qs = qs.select_related('item_id', 'category_id').only(*self.compact_fields)
+        else:
+            # The foreign keys rendered by transactions_partial.html are joined with select_related.
+            qs = qs.select_related(*self.related_fields)
         # Optimization: We use prefetch_related to avoid N+1 queries to the labels table.
         labels_prefetch = Prefetch(
             'labels_table_set',
-            queryset=Labels_table.objects.all(),
+            queryset=labels,
             to_attr='prefetched_labels'
         )
+        return qs.prefetch_related(labels_prefetch)
 
-        if label:
-            tx_ids_qs = (Labels_table.objects
-                         .filter(label_name=label)
-                         .values_list('transaction_id_labels', flat=True)
-                         .distinct())
-
-            # We order the IDs by transaction date (most recent first)
-            tx_ids = list(Transactions_table.objects.filter(transactions_table_id__in=tx_ids_qs).order_by(
-                '-date').values_list('transactions_table_id', flat=True))
-
-            paginator = Paginator(tx_ids, self.paginate_by)
-            page_number = self.request.GET.get('page', 1)
-            page_obj = paginator.get_page(page_number)
-
-            # We save the page_obj to use it in get_context_data and render_to_response
-            self._label_page_obj = page_obj
-
-            page_tx_ids = list(page_obj.object_list)
-
-            if not page_tx_ids:
-                return Transactions_table.objects.none()
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Seeks to the ?cursor= position instead of counting and offsetting, so
+        deep infinite-scroll pages cost the same as the first one.
+        """
+        if not self.uses_cursor():
+            return super().paginate_queryset(queryset, page_size)
 
-            # We keep the correct order using Case/When
-            preserved_order = Case(
-                *[When(transactions_table_id=pk, then=pos) for pos, pk in enumerate(page_tx_ids)])
-            qs = Transactions_table.objects.filter(transactions_table_id__in=page_tx_ids).order_by(
-                preserved_order).prefetch_related(labels_prefetch)
-            return qs
-        else:
-            # If there is no filter, we return the full queryset and let ListView paginate
-            return Transactions_table.objects.all().order_by('-date').prefetch_related(labels_prefetch)
+        try:
+            query = self.search_query()
+            if query:
+                # Ranked search results: the cursor is an offset in the ranking
+                offset = decode_offset_cursor(self.request.GET.get('cursor'))
+                ids = search_transactions(query, self.get_filter(), offset, page_size + 1)
+                page = paginate_ranked(queryset, ids, offset, page_size)
+            else:
+                # The filters go after the cursor's bound (see rows_after)
+                page = paginate_by_date(self.get_unfiltered_queryset(), self.request.GET.get('cursor'), page_size,
+                                        pk_field='transactions_table_id', filters=self.get_filter().apply)
+        except InvalidCursor as exc:
+            raise Http404(str(exc))
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         """
-        Builds the context. Prevents double pagination when filtering by label.
+        Groups the page by day and adds the filter dropdown data.
         """
         label = self.request.GET.get('label')
+        context = super().get_context_data(**kwargs)
 
-        if label:
-            # Manual pagination for label filter
-            queryset = self.get_queryset()
-            label_page_obj = getattr(self, '_label_page_obj', None)
-            context = {
-                'object_list': queryset,
-                'transactions': queryset,
-                'page_obj': label_page_obj,
-                'is_paginated': bool(label_page_obj and label_page_obj.has_other_pages()),
-                'paginator': label_page_obj.paginator if label_page_obj else None,
-            }
-        else:
-            # If there is no label, we use the normal and efficient ListView behavior.
-            context = super().get_context_data(**kwargs)
-
-        # This processing is common for both cases
-        transactions_by_date = defaultdict(list)
         for tx in context['object_list']:
-            date_obj = localtime(tx.date) if tx.date else None
-            formatted_date = date_format(
-                date_obj, format='D, d \\d\\e F \\d\\e Y', use_l10n=True).capitalize() if date_obj else "Sin fecha"
-
             tx.formatted_amount = (tx.amount or 0) / 1000000
 
             # Thanks to prefetch, this no longer makes a new DB query for each transaction
             tx.labels = tx.prefetched_labels
 
-            transactions_by_date[formatted_date].append(tx)
-
-        context['transactions_by_date'] = dict(transactions_by_date)
-        context['all_labels'] = Labels_table.objects.values_list(
-            'label_name', flat=True).distinct().order_by('label_name')
+        if not self.is_compact():
+            # Each distinct day is formatted once (see dates.py)
+            context['transactions_by_date'] = group_by_day(context['object_list'])
+        if not self.is_ajax():
+            # The infinite-scroll JSON never uses the label dropdown
+            context['all_labels'] = label_catalog()
         context['selected_label'] = label or ''
+        context['query'] = self.search_query()
+        context['next_cursor'] = getattr(context['page_obj'], 'next_cursor', None)
 
         return context
 
-    def render_to_response(self, context, **response_kwargs):
+    def get(self, request, *args, **kwargs):
         """
-        Handles AJAX responses for infinite scroll.
+        Infinite-scroll pages are served from the cache while the backup does not change.
+        """
+        if not self.is_ajax():
+            return super().get(request, *args, **kwargs)
+
+        def build_payload():
+            self.object_list = self.get_queryset()
+            return self.get_json_payload(self.get_context_data())
+
+        parts = (sorted(request.GET.lists()), get_language())
+        return JsonResponse(cached('transactions_page', parts, build_payload),
+                            json_dumps_params=self.json_dumps_params)
+
+    def get_json_payload(self, context):
         """
-        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            transactions_html = self.render_partial(context)
+        The partial HTML (or the compact rows), whether there are more pages and where the next one starts.
+        """
+        page_obj = context.get('page_obj')
+        if self.is_compact():
+            payload = self.get_compact_payload(context['object_list'])
+        else:
+            payload = {'transactions_html': self.render_partial(context)}
+        payload['has_more'] = page_obj.has_next() if page_obj else False
+        payload['next_cursor'] = context.get('next_cursor')
+        return payload
 
-            page_obj = context.get('page_obj')
-            has_more = page_obj.has_next() if page_obj else False
+    def get_compact_payload(self, transactions):
+        """
+        The page as column arrays, one entry per transaction, rendered by
+        transactions_list.html: ids, local day keys (with the heading of each
+        day in `day_names`), item and category names, amounts in micro-units
+        and label ids. A label id is the index of its name in `label_names`,
+        the label catalog of the backup, sent only when the ?labels_version=
+        of the browser is not `labels_version`.
+        """
+        names = label_names()
+        label_ids = {name: index for index, name in enumerate(names)}
+        days, day_names = day_keys(transactions)
+        payload = {
+            'ids': [tx.pk for tx in transactions],
+            'days': days,
+            'day_names': day_names,
+            'items': [str(tx.item_id) if tx.item_id else None for tx in transactions],
+            'categories': [str(tx.category_id) if tx.category_id else None for tx in transactions],
+            'amounts': [tx.amount or 0 for tx in transactions],
+            'labels': [[label_ids[label.label_name] for label in tx.prefetched_labels if label.label_name in label_ids]
+                       for tx in transactions],
+            'labels_version': backup_fingerprint(),
+        }
+        if self.request.GET.get('labels_version') != payload['labels_version']:
+            payload['label_names'] = names
+        return payload
 
-            # We return the partial HTML and whether there are more pages.
-            return JsonResponse({'transactions_html': transactions_html, 'has_more': has_more})
+    def render_to_response(self, context, **response_kwargs):
+        """
+        Handles AJAX responses for infinite scroll.
+        """
+        if self.is_ajax():
+            return JsonResponse(self.get_json_payload(context), json_dumps_params=self.json_dumps_params)
 
         return super().render_to_response(context, **response_kwargs)
 
@@ -195,7 +253,19 @@ class TransactionDetailView(DetailView):
         return context
     
 
-class TransactionCreateView(CreateView):
+class WritableBackupMixin:
+    """
+    Refuses to save changes while the backups are opened read-only
+    (BLUECOINS_DB_READ_ONLY), instead of failing on the write.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if settings.BLUECOINS_DB_READ_ONLY:
+            raise PermissionDenied("The Bluecoins backup is opened read-only.")
+        return super().post(request, *args, **kwargs)
+
+
+class TransactionCreateView(WritableBackupMixin, CreateView):
     model = Transactions_table
     # Add here all the fields you want to handle in the form:
     # For example:
@@ -214,7 +284,7 @@ class TransactionCreateView(CreateView):
     success_url = reverse_lazy('transactions_list')
 
 
-class TransactionUpdateView(UpdateView):
+class TransactionUpdateView(WritableBackupMixin, UpdateView):
     model = Transactions_table
     fields = [
         'item_id',
@@ -229,7 +299,7 @@ class TransactionUpdateView(UpdateView):
     template_name = 'transaction_detail.html'
     success_url = reverse_lazy('transactions_list')
 
-class TransactionDeleteView(DeleteView):
+class TransactionDeleteView(WritableBackupMixin, DeleteView):
     model = Transactions_table
     template_name = 'transaction_confirm_delete.html'
     success_url = reverse_lazy('transactions_list')
@@ -271,25 +341,51 @@ class AccountDetailView(DetailView):
 # Other views of reports, analytics, etc.
 
 def ReportByCategoryView(request):
-    data = (Transactions_table.objects
-            .values('category_id')
-            .annotate(total_amount=Sum('amount'))
-            .order_by('-total_amount'))
-    
-    # Get the category names
-    # (Assuming category:id of Transactions_table is FK to Child_category_table)
-    # To map to the names, we do something like:
-    categories_data = []
-    for item in data:
-        category_id = item['category_id']
-        total_amount = item['total_amount'] or 0
-        try:
-            category_name = Child_category_table.objects.get(pk=category_id).child_category_name
-        except Child_category_table.DoesNotExist:
-            category_name = "Unknown"
-        categories_data.append((category_name, total_amount))
-        #print(f'Category: {category_name} - Total amount: {total_amount}')
-    return render(request, 'report_by_category.html', {'categories_data': categories_data})
+    """
+    Category report with parent and group subtotals, summed from the monthly rollups
+    (from the columnar store with a label filter).
+    Optional GET filters: start and end (YYYY-MM-DD, inclusive), account (ID) and label (name).
+    """
+    start, end, account, label = parse_report_filters(request)
+
+    report = cached('category_report', (start, end, account, label),
+                    lambda: category_report(start=start, end=end, account=account, label=label))
+    categories_data = [(child['name'], child['total_amount'])
+                       for group in report
+                       for parent in group['parents']
+                       for child in parent['children']]
+    context = {
+        'report': report,
+        'categories_data': categories_data,
+        'accounts': Accounts_table.objects.values('accounts_table_id', 'account_name').order_by('account_name'),
+        'start': start,
+        'end': end,
+        'selected_account': account,
+        'labels': label_names(),
+        'selected_label': label,
+    }
+    return render(request, 'report_by_category.html', context)
+
+
+def ReportByMonthView(request):
+    """
+    Income, expense and net per month, summed from the monthly rollups.
+    Same GET filters as ReportByCategoryView.
+    """
+    start, end, account, label = parse_report_filters(request)
+
+    report = cached('monthly_report', (start, end, account, label),
+                    lambda: monthly_report(start=start, end=end, account=account, label=label))
+    context = {
+        'report': report,
+        'accounts': Accounts_table.objects.values('accounts_table_id', 'account_name').order_by('account_name'),
+        'start': start,
+        'end': end,
+        'selected_account': account,
+        'labels': label_names(),
+        'selected_label': label,
+    }
+    return render(request, 'report_by_month.html', context)
 
 
 
@@ -299,67 +395,230 @@ def home_view(request):
 
 def report_by_label_excel(request):
     """
-    Generates an Excel report of transactions filtered by label, grouped by month in separate sheets.
+    Generates an Excel report of transactions filtered by label (or any filter
+    of filters.py), grouped by month in separate sheets.
+    The workbook is streamed into a temporary file that is sent with a FileResponse,
+    so the worker memory does not grow with the number of transactions.
+    Reports up to LABEL_REPORT_CACHE_MAX_BYTES are cached until the backup changes.
+    Big reports should rather be written in the background (label_report_job).
     """
-    label = request.GET.get('label')
-    
-    # Filter transactions by label if provided
-    if label and label.strip():  # Check that label is not empty or whitespace
-        tx_ids = Labels_table.objects.filter(label_name=label) \
-            .values_list('transaction_id_labels', flat=True).distinct()
-        qs = Transactions_table.objects.filter(transactions_table_id__in=tx_ids).order_by('date')
-    else:
-        qs = Transactions_table.objects.all().order_by('date')
-
-    # Identify duplicates by item_id for transfer handling
-    item_counts = Counter(qs.values_list('item_id', flat=True))
-
-    # Group transactions by month-year
-    data_by_month = {}
-    for tx in qs:
-        # For transfers with duplicates, include only the negative record
-        if item_counts[tx.item_id] > 1 and (tx.amount or 0) > 0:
-            continue
-        date = tx.date
-        sheet_name = date.strftime('%B %Y') if date else 'Undated'
-        data_by_month.setdefault(sheet_name, []).append(tx)    # Check if there are any transactions to process
-    if not data_by_month:
+    filters = TransactionFilter.from_query(request.GET)
+    label = ', '.join(filters.labels)
+    filename = label_report_filename(filters)
+
+    known = [get_label(name) is not None for name in filters.labels]
+    if known and not (all(known) if filters.label_mode == 'all' else any(known)):
+        # The label catalog already knows that no transaction has these labels
+        return render(request, 'no_transactions_report.html', {'label': label})
+
+    job = get_job(job_id_for('label_report', label_report_parts(filters)))
+    if job and job['status'] == DONE:
+        # Already written by a background job (see label_report_job)
+        try:
+            return FileResponse(open(result_path(job['id']), 'rb'), as_attachment=True, filename=filename,
+                                content_type=XLSX_CONTENT_TYPE)
+        except FileNotFoundError:
+            pass
+
+    content = lookup('label_report', label_report_parts(filters))
+    if content is None:
+        # The temporary file is deleted as soon as the response closes it
+        tmp = tempfile.TemporaryFile(suffix='.xlsx')
+        if not write_label_report(tmp, filters):
+            content = b''
+        elif tmp.tell() > LABEL_REPORT_CACHE_MAX_BYTES:
+            # Too big to keep in the cache: stream it from disk
+            tmp.seek(0)
+            return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+        else:
+            tmp.seek(0)
+            content = tmp.read()
+        tmp.close()
+        store('label_report', label_report_parts(filters), content)
+
+    if not content:
         # If no transactions found, render a template with the message instead of downloading a file
         return render(request, 'no_transactions_report.html', {'label': label})
-    
-    # Build Excel workbook only if there are transactions
-    wb = Workbook()
-    # Remove default sheet safely
-    first_sheet = wb.active
-    if first_sheet:
-        wb.remove(first_sheet)
-    
-    for sheet_name, transactions in data_by_month.items():
-        ws = wb.create_sheet(title=sheet_name)        
-        # Header row
-        ws.append(['ID Transaction', 'Date', 'Transaction name', 'Income', 'Expense', 'Transaction type'])
-        for tx in transactions:
-            # Convert amount from micro-units
-            amt = (tx.amount or 0) / 1000000
-            income = amt if amt > 0 else ''
-            expense = -amt if amt < 0 else ''            # Convert model objects to strings safely
-            transaction_name = str(tx.item_id) if tx.item_id else ''
-            transaction_type = str(tx.transaction_type_id) if tx.transaction_type_id else ''
-            
-            ws.append([
-                tx.transactions_table_id,
-                tx.date.strftime('%d/%m/%Y') if tx.date else '',
-                transaction_name,
-                income,
-                expense,
-                transaction_type,
-            ])
-
-    # Prepare HTTP response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    filename = f"report_by_label_{label or 'all'}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
\ No newline at end of file
+
+    return FileResponse(io.BytesIO(content), as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def export_job_response(job):
+    """
+    Public state of an export job as JSON: 202 while it runs, 200 once finished.
+    """
+    data = {key: job.get(key) for key in ('id', 'status', 'progress', 'rows', 'total', 'error')}
+    data['status_url'] = reverse('export_job_status', args=[job['id']])
+    data['download_url'] = reverse('export_job_download', args=[job['id']]) if job['status'] == DONE else None
+    return JsonResponse(data, status=200 if job['status'] in FINISHED else 202)
+
+
+def label_report_job(request):
+    """
+    Starts the label report of the GET filters (those of report_by_label_excel)
+    as a background job, or finds the one already started, and returns its state.
+    """
+    filters = TransactionFilter.from_query(request.GET)
+    return export_job_response(submit_label_report(filters, label_report_filename(filters)))
+
+
+def export_job_status(request, job_id):
+    job = get_job(job_id)
+    if job is None:
+        raise Http404("Unknown or expired export")
+    return export_job_response(job)
+
+
+def export_job_download(request, job_id):
+    """
+    The file written by a finished export job.
+    """
+    job = get_job(job_id)
+    if job is None or job['status'] != DONE:
+        raise Http404("Unknown, unfinished or expired export")
+    try:
+        fileobj = open(result_path(job_id), 'rb')
+    except FileNotFoundError:
+        raise Http404("Expired export")
+    return FileResponse(fileobj, as_attachment=True, filename=job['filename'], content_type=XLSX_CONTENT_TYPE)
+
+
+def labels_json(request):
+    """
+    Label catalog for the label dropdown, as JSON.
+    """
+    labels = [
+        {'name': label['name'], 'count': label['count'],
+         'first_date': label['first_date'].isoformat() if label['first_date'] else None,
+         'last_date': label['last_date'].isoformat() if label['last_date'] else None}
+        for label in label_catalog()
+    ]
+    return JsonResponse({'labels': labels})
+
+
+def account_balances_json(request):
+    """
+    Balance of every account, in micro-units, as JSON. GET `date`: a date
+    (YYYY-MM-DD, end of that day) or an ISO datetime; today by default.
+    """
+    value = request.GET.get('date')
+    when = parse_report_date(value) if value else localdate()
+    if when is None:
+        try:
+            when = parse_datetime(value)
+        except ValueError:
+            pass
+        if when is None:
+            return JsonResponse({'error': f"Invalid date: {value}"}, status=400)
+        if not is_aware(when):
+            when = make_aware(when)
+
+    timeline = balance_timeline()
+    try:
+        accounts = timeline.account_balances(when)
+    except OverflowError:
+        # An aware datetime whose UTC time is before date.min or after date.max
+        return JsonResponse({'error': f"Invalid date: {value}"}, status=400)
+    return JsonResponse({
+        'date': when.isoformat(),
+        'accounts': accounts,
+        'net_worth': sum(account['default_currency_balance'] for account in accounts),
+    })
+
+
+def net_worth_json(request):
+    """
+    Net worth over time, in micro-units of the default currency, as JSON.
+    GET filters: start and end (YYYY-MM-DD) and interval (day, week or month).
+    """
+    start = parse_report_date(request.GET.get('start'))
+    end = parse_report_date(request.GET.get('end'))
+    interval = request.GET.get('interval', 'month')
+    try:
+        series = net_worth_series(start, end, interval)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'interval': interval,
+        'series': [{'date': day.isoformat(), 'net_worth': net_worth} for day, net_worth in series],
+    })
+
+
+def cache_stats_view(request):
+    """
+    Hit/miss counters of the Bluecoins cache, as JSON.
+    """
+    return JsonResponse(cache_stats())
+
+
+@require_http_methods(['GET', 'POST'])
+def upload_backup(request):
+    """
+    GET: the upload page. POST: a .fydb backup as the raw request body
+    (application/octet-stream, not a form), streamed to disk, checked and made
+    the active backup (see ingest.py). Returns its path and size as JSON, with
+    a 201, or the reason it was rejected, with a 400.
+    Staff users upload the main backups; with BLUECOINS_TENANTS every user
+    uploads into their own backups directory.
+    """
+    user_backup = getattr(request, 'user_backup', None)
+    if user_backup is None and not request.user.is_staff:
+        raise PermissionDenied("Only staff users can upload backups.")
+    if request.method == 'GET':
+        return render(request, 'upload_backup.html', {'max_bytes': settings.BLUECOINS_UPLOAD_MAX_BYTES})
+
+    if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        return JsonResponse({'error': "Send the backup as the request body, not as a form."}, status=400)
+    length = request.META.get('CONTENT_LENGTH')
+    if length and length.isdigit() and int(length) > settings.BLUECOINS_UPLOAD_MAX_BYTES:
+        return JsonResponse({'error': f"The backup is larger than {settings.BLUECOINS_UPLOAD_MAX_BYTES} bytes"},
+                            status=413)
+
+    directory = user_backup.directory if user_backup else settings.BLUECOINS_DB_DIR
+    try:
+        result = ingest_backup(iter(lambda: request.read(UPLOAD_CHUNK_SIZE), b''), directory)
+    except InvalidBackup as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    warm_up(user_backup)
+    return JsonResponse({'path': os.path.basename(result['path']), 'size': result['size'],
+                         'transactions': result['transactions'], 'fingerprint': backup_fingerprint(result['path'])},
+                        status=201)
+
+
+# Transactions of each kind of change shown on the changes page
+CHANGES_PAGE_LIMIT = 100
+
+
+def backup_changes_view(request):
+    """
+    The transactions inserted, updated and deleted since the previous backup
+    (see changes.py): the current row of the inserted and updated ones, the
+    row before the change of the updated and deleted ones.
+    """
+    changes = backup_changes()
+    context = {'previous': None, 'sections': []}
+    if changes is None:
+        return render(request, 'backup_changes.html', context)
+
+    by_kind = defaultdict(list)
+    for change in changes['changes']:
+        by_kind[change['change']].append(change)
+    shown = [change['id'] for kind in (INSERTED, UPDATED) for change in by_kind[kind][:CHANGES_PAGE_LIMIT]]
+    current = Transactions_table.objects.select_related('item_id').in_bulk(shown)
+    for tx in current.values():
+        tx.formatted_amount = (tx.amount or 0) / 1000000
+
+    for kind, title in ((INSERTED, 'Inserted'), (UPDATED, 'Updated'), (DELETED, 'Deleted')):
+        rows = []
+        for change in by_kind[kind][:CHANGES_PAGE_LIMIT]:
+            before = None
+            if kind != INSERTED:
+                date = parse_datetime(change['date']) if change['date'] else None
+                before = {'date': make_aware(date) if date and not is_aware(date) else date,
+                          'amount': change['amount'] / 1000000 if change['amount'] is not None else None,
+                          'item': change['item'], 'notes': change['notes']}
+            rows.append({'id': change['id'], 'before': before, 'after': current.get(change['id'])})
+        context['sections'].append({'kind': kind, 'title': title, 'count': len(by_kind[kind]), 'rows': rows,
+                                    'more': len(by_kind[kind]) - len(rows)})
+    context['previous'] = os.path.basename(changes['previous'])
+    return render(request, 'backup_changes.html', context)
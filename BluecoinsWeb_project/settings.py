@@ -23,22 +23,77 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+# Directory where bluecoins databases are stored (For example, Google Drive for PC)
+#BLUECOINS_DB_DIR = r'C:/Users/JuliansCastro/Mi unidad/Bluecoins/QuickSync/'
+BLUECOINS_DB_DIR = os.environ.get('BLUECOINS_DB_DIR', BASE_DIR / 'databases/')
+
+# Pattern to match bluecoins*.fydb files
+BLUECOINS_DB_PATTERN = 'bluecoins*.fydb'
+
+# Seconds between checks for a newer backup in BLUECOINS_DB_DIR (see BackupWatcherMiddleware)
+BLUECOINS_DB_CHECK_INTERVAL = float(os.environ.get('BLUECOINS_DB_CHECK_INTERVAL', '5'))
+
+# Read from an indexed copy of each backup (built automatically, see BluecoinsWeb_app/sidecar.py)
+BLUECOINS_SIDECAR = os.environ.get('BLUECOINS_SIDECAR', 'True').lower() == 'true'
+BLUECOINS_SIDECAR_DIR = os.environ.get('BLUECOINS_SIDECAR_DIR', BASE_DIR / 'databases/sidecar/')
+
+# Open the backups read-only and immutable (see BluecoinsWeb_app/db_backend).
+# Set to 'false' to create, edit or delete transactions from the web.
+BLUECOINS_DB_READ_ONLY = os.environ.get('BLUECOINS_DB_READ_ONLY', 'True').lower() == 'true'
+
+# Request instrumentation (see BluecoinsWeb_app/instrumentation.py): Server-Timing headers and
+# a JSON log line per request, at WARNING level for slow requests and repeated statements (N+1)
+BLUECOINS_INSTRUMENTATION = os.environ.get('BLUECOINS_INSTRUMENTATION', 'True').lower() == 'true'
+BLUECOINS_SLOW_REQUEST_MS = float(os.environ.get('BLUECOINS_SLOW_REQUEST_MS', '500'))
+BLUECOINS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('BLUECOINS_N_PLUS_ONE_THRESHOLD', '10'))
+
+# Multi-tenant mode (see BluecoinsWeb_app/tenants.py): every user reads the backups of the
+# directory registered for them (UserBackup, in the admin), through a database alias of its own.
+# Each worker keeps at most BLUECOINS_MAX_OPEN_BACKUPS of them open; the least recently used is closed.
+BLUECOINS_TENANTS = os.environ.get('BLUECOINS_TENANTS', 'False').lower() == 'true'
+BLUECOINS_MAX_OPEN_BACKUPS = int(os.environ.get('BLUECOINS_MAX_OPEN_BACKUPS', '8'))
+# Path prefixes that keep the main backup and need no login
+BLUECOINS_TENANT_EXEMPT = ('/admin/', '/accounts/login/', '/accounts/logout/', '/static/')
+LOGIN_REDIRECT_URL = '/'
+LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# Engine of the category and monthly reports: 'rollups' (monthly rollups, see BluecoinsWeb_app/rollups.py)
+# or 'columnar' (in-memory arrays, see BluecoinsWeb_app/analytics.py). Label filters always use 'columnar'.
+BLUECOINS_ANALYTICS = os.environ.get('BLUECOINS_ANALYTICS', 'rollups')
+
+
+# Conditional GET (see BluecoinsWeb_app/middleware.py): ETag and Last-Modified from the backup,
+# 304 Not Modified for unchanged pages, and X-Accel-Expires so nginx can serve repeat hits from its
+# proxy cache for BLUECOINS_PROXY_CACHE_SECONDS (0 disables it). BLUECOINS_RELEASE identifies the
+# deployed code in the ETags (by default the newest mtime of the app's files).
+BLUECOINS_CONDITIONAL_GET = os.environ.get('BLUECOINS_CONDITIONAL_GET', 'True').lower() == 'true'
+BLUECOINS_PROXY_CACHE_SECONDS = int(os.environ.get('BLUECOINS_PROXY_CACHE_SECONDS', '30'))
+BLUECOINS_RELEASE = os.environ.get('BLUECOINS_RELEASE', '')
+# Path prefixes never answered with 304 (live or per-user pages)
+BLUECOINS_CONDITIONAL_GET_EXEMPT = ('/admin/', '/cache/stats/', '/exports/', '/backups/upload/')
+
+
+# Background exports (see BluecoinsWeb_app/jobs.py): threads per worker process (0 writes them
+# in the request), directory of their state and results, and seconds they are kept after finishing
+BLUECOINS_EXPORT_WORKERS = int(os.environ.get('BLUECOINS_EXPORT_WORKERS', '1'))
+BLUECOINS_EXPORT_DIR = os.environ.get('BLUECOINS_EXPORT_DIR', BASE_DIR / 'cache/exports/')
+BLUECOINS_EXPORT_TTL = int(os.environ.get('BLUECOINS_EXPORT_TTL', '3600'))
+
+# Largest backup accepted by the upload page and the ingest_backup command (see BluecoinsWeb_app/ingest.py)
+BLUECOINS_UPLOAD_MAX_BYTES = int(os.environ.get('BLUECOINS_UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+
+
 def find_bluecoins_database():
     """
     Find the most recent bluecoins database file in the specified directory.
     Returns the path to the database file that starts with 'bluecoins' and ends with '.fydb'
+    This only picks the initial database; newer backups are picked up at runtime
+    by BluecoinsWeb_app.backups.BackupWatcher.
     """
-    # Directory where bluecoins databases are stored (For example, Google Drive for PC)
-    #bluecoins_dir = r'C:/Users/JuliansCastro/Mi unidad/Bluecoins/QuickSync/'
-    
-    # If the above path doesn't exist, fallback to local database
-    bluecoins_dir = BASE_DIR / 'databases/'
-    
-    # Pattern to match bluecoins*.fydb files
-    pattern = os.path.join(bluecoins_dir, 'bluecoins*.fydb')
+    bluecoins_dir = BLUECOINS_DB_DIR
     
     # Find all matching files
-    matching_files = glob.glob(pattern)
+    matching_files = glob.glob(os.path.join(bluecoins_dir, BLUECOINS_DB_PATTERN))
     
     if not matching_files:
         # Fallback to local database if no files found
@@ -82,21 +137,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "BluecoinsWeb_app.middleware.InstrumentationMiddleware",  # First, so it measures the whole request
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Add WhiteNoise for static files
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.locale.LocaleMiddleware",  # Language of each request, from Accept-Language
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "BluecoinsWeb_app.middleware.BackupWatcherMiddleware",  # Switch to newer backups at runtime
+    "BluecoinsWeb_app.middleware.TenantMiddleware",  # The user's own backups, with BLUECOINS_TENANTS
+    "BluecoinsWeb_app.middleware.ConditionalGetMiddleware",  # After the watchers: validators of the active backup
 ]
 
 ROOT_URLCONF = "BluecoinsWeb_project.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "BluecoinsWeb_app.instrumentation.DjangoTemplates",  # Records the render time
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -123,8 +183,14 @@ DATABASES = {
         'NAME': BASE_DIR / 'databases/bluecoins_admin.db',  # the DB that Django will manage for users, auth, etc.
     },    # Bluecoins Database (for your original backup)
     'bluecoins': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'BluecoinsWeb_app.db_backend',  # sqlite3 with a read-only, memory-mapped profile
         'NAME': find_bluecoins_database(),  # Dynamically find the most recent bluecoins database in app backup locations
+        # One connection per worker, reused between requests (reopened when the backup changes)
+        'CONN_MAX_AGE': int(os.environ.get('BLUECOINS_DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'read_only': BLUECOINS_DB_READ_ONLY,
+        },
     }
 }
 
@@ -132,6 +198,30 @@ DATABASE_ROUTERS = [
     'BluecoinsWeb_app.dbrouters.BluecoinsDBRouter',
 ]
 
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The 'bluecoins' cache holds report results and rendered pages. Its keys include a
+# fingerprint of the active backup, so a new backup invalidates it automatically.
+# Use BLUECOINS_CACHE=file to share it between the gunicorn workers.
+
+BLUECOINS_CACHE = os.environ.get('BLUECOINS_CACHE', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'bluecoins': {
+        'BACKEND': ('django.core.cache.backends.filebased.FileBasedCache' if BLUECOINS_CACHE == 'file'
+                    else 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': BASE_DIR / 'cache' if BLUECOINS_CACHE == 'file' else 'bluecoins',
+        'TIMEOUT': 60 * 60 * 24,  # Entries of an old backup simply age out
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -156,6 +246,12 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = "en-us"
 
+# Languages of the month and day names (Django's own translations, see BluecoinsWeb_app/dates.py)
+LANGUAGES = [
+    ("es", "Español"),
+    ("en", "English"),
+]
+
 TIME_ZONE = "UTC"
 
 USE_I18N = True
@@ -255,5 +351,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # One JSON line per request; DEBUG logs every request, not only the slow ones
+        'BluecoinsWeb_app.requests': {
+            'handlers': ['console', 'file'],
+            'level': os.environ.get('BLUECOINS_REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
     },
 }